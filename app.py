@@ -1,22 +1,48 @@
 # app.py
 
 # Required imports
+import time
+IMPORT_STARTED = time.perf_counter()
 import os
+import copy
 import uuid
-from flask import Flask, request, jsonify, Blueprint,current_app
-from firebase_admin import credentials, firestore, initialize_app
+import threading
+from flask import Flask, request, jsonify, Blueprint,current_app, Response, stream_with_context
 from datetime import datetime, timedelta
-import pyrebase
 from firebaseConfig import config
 from functools import wraps
-from flasgger import Swagger
-from jsonschema import validate, ValidationError
-import time
+from schemas import TODO_SCHEMA, SIGNUP_SCHEMA, SERVICE_SCHEMA
+from validators import SERVICE_VALIDATOR, validation_errors, field_errors, signup_error_body, service_error_body, todo_error_body
+from token_verifier import TokenVerifier, GOOGLE_CERTS_URL
+from identity_toolkit import IdentityToolkit
+from cache import InMemoryBackend
+from doc_cache import DocumentCache
+from helpers import (
+    DOCUMENT_ID, NDJSON_MIMETYPE, parse_limit, decode_page_token, parse_fields, with_id, page_of,
+    user_todos_query, build_service_body, build_todo_body, build_user_document, parse_service_search, services_search_query,
+    matches_filters, parse_patch, FieldErrors, apply_field_updates, field_paths_overlap, parse_batch_get, batch_get_results
+)
+from search_index import ServiceSearchIndex, SearchIndexNotReady
+from change_feed import ChangeFeed
+from service_stats import ServiceStats, DIMENSIONS
+from versions import CollectionVersions, make_etag, owner_marker
+import metrics
+from metrics import stage, current_route
+import compression
+from json_provider import TimedFastJSONProvider
+import ratelimit
+from idempotency import IdempotencyStore, IdempotencyKeyError
+from ratelimit import InMemoryBucketBackend, RateLimiter, too_many_requests
+from startup import LazyClient, startup_timer
+from pipeline import Pipeline, DeadlineExceeded
+from google.api_core import exceptions
+from singleflight import SingleFlight
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize Flask app
-app = Flask(__name__)
+# Routes live on a blueprint, create_app() builds the Flask app around it
+api = Blueprint('api', __name__)
 
-app.config['SWAGGER'] = {
+SWAGGER_CONFIG = {
     'title': 'SureFix API',
     'description': 'API for SureFix',
     'contact': {
@@ -33,161 +59,126 @@ app.config['SWAGGER'] = {
     }
 }
 
-swagger = Swagger(
-    app)
+# The Firebase clients (and their imports) are created on first use so a cold start can serve
+# requests sooner, see startup.py. GET /_ah/warmup creates them ahead of traffic. The helpers built
+# on a collection below (search index, stats, versions, idempotency keys, change feed) are given a
+# collection factory instead, they call it when they need the collection, so building them at
+# import time doesn't create the client either.
 
 # Initialize Firestore DB Firestore isnt present in pyrebase so thats why had to use firebase_admin for that
-cred = credentials.Certificate('key.json')
-default_app = initialize_app(cred)
-
-# This one is required for managing auth and disbaled users properly
-firebase = pyrebase.initialize_app(config)
-auth = firebase.auth()
-db = firestore.client()
-user_Ref = db.collection('user')
-todo_ref = db.collection('todos')
-service_ref = db.collection('service')
-
-TODO_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "title": {"type": "string", "minLength": 1},
-        "description": {"type": "string"},
-        "createdAt": {"type": "string"},
-        "updatedAt": {"type": "string"},
-        "createdBy": {"type": "string"},
-        "isCompleted": {"type": "boolean"},
-        "activated": {"type": "boolean"}
-    },
-    "required": ["title"]
-}
+def init_firebase_admin():
+    with startup_timer.phase('firebase_admin'):
+        from firebase_admin import credentials, initialize_app
+        cred = credentials.Certificate('key.json')
+        return initialize_app(cred)
 
-# Sign up schema
-SIGNUP_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "email": {"type": "string", "format": "email"},
-        "password": {"type": "string", "minLength": 6},
-        "displayName": {"type": "string", "minLength": 1},
-        "photoURL": {"type": "string"}
-    },
-    "required": ["email", "password", "displayName"]
-}
+def init_firestore():
+    default_app.resolve()
+    with startup_timer.phase('firestore'):
+        from firebase_admin import firestore
+        return firestore.client()
 
-# Service schema
-SERVICE_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "sf_id": {"type": "string"},
-        "channel": {"type": "string"},
-        "contact_details": {
-            "type": "object",
-            "properties": {
-                "first_name": {"type": "string"},
-                "last_name": {"type": "string"},
-                "contact_numbers": {
-                    "type": "object",
-                    "properties": {
-                        "primary": {
-                            "type": "object",
-                            "properties": {
-                                "country_code": {"type": "number"},
-                                "number": {"type": "number"},
-                                "verified": {"type": "boolean"},
-                                "whatsapp": {"type": "boolean"}
-                            },
-                            "required": ["country_code", "number"]
-                        },
-                        "secondary": {
-                            "type": "object",
-                            "properties": {
-                                "country_code": {"type": "number"},
-                                "number": {"type": "number"},
-                                "verified": {"type": "boolean"},
-                                "whatsapp": {"type": "boolean"}
-                            },
-                            "required": ["country_code", "number"]
-                        }
-                    },
-                    "required": ["primary", "secondary"]
-                },
-                "email": {"type": "string"},
-                "pickup_address": {
-                    "type": "object",
-                    "properties": {
-                        "address": {"type": "string"},
-                        "city": {"type": "string"},
-                        "state": {"type": "string"},
-                        "pincode": {"type": "number"},
-                        "google_location": {"type": "string"}
-                    },
-                    "required": ["address", "city", "state", "pincode"]
-                },
-                "use_differant_delivery_address": {"type": "boolean"},
-                "delivery_address": {
-                    "type": "object",
-                    "properties": {
-                        "address": {"type": "string"},
-                        "city": {"type": "string"},
-                        "state": {"type": "string"},
-                        "pincode": {"type": "number"},
-                        "google_location": {"type": "string"}
-                    },
-                    "required": ["address", "city", "state", "pincode"]
-                }
-            },
-            "required": ["first_name", "last_name", "contact_numbers", "pickup_address", "delivery_address"]
-        },
-        "machine_details": {
-            "type": "object",
-            "properties": {
-                "item_brand": {"type": "string"},
-                "model": {"type": "string"},
-                "item_category": {"type": "string"},
-                "year_of_purchase": {"type": "number"}
-            },
-            "required": ["item_brand", "model", "item_category", "year_of_purchase"]
-        },
-        "issue_message_from_customer": {"type": "string"},
-        "admin_comments": {
-            "type": "array",
-            "items": {
-                "type": "object",
-                "properties": {
-                    "timestamp": {"type": "string"},
-                    "user": {"type": "string"},
-                    "message": {"type": "string"}
-                },
-                "required": ["timestamp", "user", "message"]
-            }
-        },
-        "delivery_note": {"type": "string"},
-        "pickup_details": {
-            "type": "object",
-            "properties": {
-                "pickup_note": {"type": "string"}
-            },
-            "required": ["pickup_note"]
-        },
-        "self_logistics": {"type": "boolean"}
-    },
-    "required": ["sf_id", "channel", "contact_details", "machine_details", "issue_message_from_customer", "admin_comments", "delivery_note", "pickup_details", "self_logistics"]
-}
+# Email/password auth goes to the Identity Toolkit REST API (what pyrebase wraps) over shared
+# keep-alive connection pools, sized to the server threads or the signup workers, whichever is more
+def init_auth_client():
+    with startup_timer.phase('identity_toolkit'):
+        return IdentityToolkit(
+            config['apiKey'],
+            pool_size=int(os.environ.get('AUTH_HTTP_POOL_SIZE', max(int(os.environ.get('THREADS', 8)), SIGNUP_MAX_WORKERS))),
+            connect_timeout=float(os.environ.get('AUTH_HTTP_CONNECT_TIMEOUT', 3.05)),
+            read_timeout=float(os.environ.get('AUTH_HTTP_READ_TIMEOUT', 10)),
+            retries=int(os.environ.get('AUTH_HTTP_RETRIES', 2)),
+            backoff_factor=float(os.environ.get('AUTH_HTTP_BACKOFF', 0.2))
+        )
 
-# Custom function to enable user after successful login
-def enable_user(email):
-    try:
-        user = auth.get_user_by_email(email)
-        if user.disabled:
-            auth.update_user(user.uid, disabled=False)
+default_app = LazyClient(init_firebase_admin, 'firebase_admin')
+auth = LazyClient(init_auth_client, 'identity toolkit')
+db = LazyClient(init_firestore, 'firestore')
+user_Ref = LazyClient(lambda: db.collection('user'), 'user collection')
+todo_ref = LazyClient(lambda: db.collection('todos'), 'todos collection')
+service_ref = LazyClient(lambda: db.collection('service'), 'service collection')
+
+def lookup_account(token):
+    with stage('identity_toolkit'):
+        return auth.get_account_info(token)["users"][0]
+
+# Verify ID tokens locally against Google's signing keys instead of a get_account_info call per request.
+# The account record (and so the disabled flag) is refreshed at most every AUTH_DISABLED_STALENESS seconds.
+LOCAL_TOKEN_VERIFICATION = os.environ.get('LOCAL_TOKEN_VERIFICATION', '1') == '1'
+token_verifier = TokenVerifier(
+    project_id=config['projectId'],
+    account_lookup=lookup_account,
+    certs_url=os.environ.get('FIREBASE_CERTS_URL', GOOGLE_CERTS_URL),
+    cache_size=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    disabled_staleness=int(os.environ.get('AUTH_DISABLED_STALENESS', 300))
+)
+
+# Identical concurrent reads share one Firestore call, see singleflight.py
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', '1') == '1'
+services_flight = SingleFlight('services')
+
+# Read-through cache for GET /todo/<todo_id>, invalidated by the todo writes below.
+# TODO_CACHE_LISTEN=1 also keeps hot todos current with snapshot listeners (writes from other instances).
+todo_cache = DocumentCache(
+    InMemoryBackend(maxsize=int(os.environ.get('TODO_CACHE_SIZE', 10000))),
+    ttl=int(os.environ.get('TODO_CACHE_TTL', 30)),
+    listen=os.environ.get('TODO_CACHE_LISTEN') == '1',
+    max_listeners=int(os.environ.get('TODO_CACHE_MAX_LISTENERS', 100)),
+    flight=SingleFlight('todo') if SINGLE_FLIGHT else None
+)
+
+# Streaming exports, one JSON encoded document per line
+
+def wants_stream():
+    if request.args.get('stream') == '1':
         return True
-    except Exception as e:
-        return str(e)
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_documents(docs):
+    # docs is the generator returned by stream(), nothing is buffered beyond the current document
+    def generate():
+        for doc in docs:
+            yield current_app.json.dumps(with_id(doc)) + '\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+# Conditional GET, strong ETags from a document's update_time or, for lists, from the collection's
+# version markers (see versions.py). A match is answered with 304 before anything is serialized.
+# Service writes are spread over marker shards, todo writes bump their owner's marker.
+collection_versions = CollectionVersions(
+    lambda: db.collection(os.environ.get('COLLECTION_VERSIONS_COLLECTION', 'collection_versions')),
+    shards={'service': int(os.environ.get('COLLECTION_VERSIONS_SHARDS', 10))},
+    get_all=lambda refs: db.get_all(refs)
+)
+
+def todos_marker(user):
+    return owner_marker('todos', user['localId'])
+
+# Other users' todos are answered as missing, like GET /todo leaves them out
+def owns_todo(data, user):
+    return data is not None and data.get('createdBy') == user['email']
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Per user data, so only private caches, and they must revalidate every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag):
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(Response(status=304), etag)
+    return None
 
 # Authentication middleware
 def authenticate_user(token):
+    with stage('auth'):
+        return _authenticate_user(token)
+
+def _authenticate_user(token):
+    if LOCAL_TOKEN_VERIFICATION:
+        return token_verifier.authenticate(token)
     try:
-        user = auth.get_account_info(token)["users"][0]
+        user = lookup_account(token)
         
         if not user:
             return False, "Invalid token"
@@ -203,7 +194,26 @@ def authenticate_user(token):
     except Exception as e:
         return False, str(e)
 
-@app.route('/signup', methods=['POST'])
+## Signup runs its upstream calls on a bounded executor, under one deadline
+SIGNUP_MAX_WORKERS = int(os.environ.get('SIGNUP_MAX_WORKERS', 16))
+signup_executor = ThreadPoolExecutor(
+    max_workers=SIGNUP_MAX_WORKERS,
+    thread_name_prefix='signup'
+)
+SIGNUP_DEADLINE = float(os.environ.get('SIGNUP_DEADLINE', 15))
+
+## Rate limits, see ratelimit.py
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+# login and signup spend Identity Toolkit quota, their per-IP buckets are shared when RATE_LIMIT_REDIS_URL is set
+auth_rate_limiter = RateLimiter(ratelimit.backend_from_environ(), TRUSTED_PROXIES)
+# The per-user buckets are checked on every authenticated request, so they stay in process
+user_rate_limiter = RateLimiter(InMemoryBucketBackend(maxsize=int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))), TRUSTED_PROXIES)
+SIGNUP_RATE_LIMIT = ratelimit.parse_limit(os.environ.get('RATE_LIMIT_SIGNUP', '5/minute'))
+LOGIN_RATE_LIMIT = ratelimit.parse_limit(os.environ.get('RATE_LIMIT_LOGIN', '20/minute'))
+USER_RATE_LIMIT = ratelimit.parse_limit(os.environ.get('RATE_LIMIT_USER', '600/minute'))
+
+@api.route('/signup', methods=['POST'])
+@auth_rate_limiter.limit_by_ip(SIGNUP_RATE_LIMIT)
 def signup():
     """
     Register a new user.
@@ -236,6 +246,10 @@ def signup():
         description: User created successfully
       400:
         description: Error message
+      429:
+        description: Too many signups from this IP, retry after the Retry-After seconds
+      504:
+        description: Signup did not finish within SIGNUP_DEADLINE seconds
     """
     email = request.json.get('email')
     password = request.json.get('password')
@@ -243,40 +257,45 @@ def signup():
     photoURL = request.json.get('photoURL')
 
     try:
-        if not displayName:
-            return jsonify({
-                'message': 'Display Name is required',
-                "RequiredPropertiesForSignUp": SIGNUP_SCHEMA.get('required')
-                }), 400
+        with stage('validate'):
+            error_body = signup_error_body(request.json)
+        if error_body:
+            return jsonify(error_body), 400
         
-        user = auth.create_user_with_email_and_password(email=email, password=password)
+        # Every call needs the new account, after that the profile update and the user document
+        # are independent. A new account is enabled already, so there is nothing to enable.
+        route = current_route()
+        pipeline = Pipeline(signup_executor, SIGNUP_DEADLINE)
 
-        # Enable user after successful login
-        isUserEnabled = enable_user(email)
+        def create_user():
+            with stage('identity_toolkit', route):
+                return auth.create_user_with_email_and_password(email=email, password=password)
 
-        if isUserEnabled:
-            user_data = {
-                "displayName": displayName,
-                "email": email,
-                "photoURL": photoURL,
-            }           
+        user = pipeline.run(create_user)
 
+        def set_profile():
             # set the display name and photo URL
-            auth.update_profile(
-                user['idToken'], 
-                user_data.get('displayName'),
-                user_data.get('photoURL')
-              )
-
-            return jsonify({
-                'message': 'User created successfully',
-                'user': user,
-                'localId': user['localId'],
-            }), 201
+            with stage('identity_toolkit', route):
+                auth.update_profile(user['idToken'], displayName, photoURL)
+
+        def save_user_document():
+            with stage('firestore', route):
+                user_Ref.document(user['localId']).set(build_user_document(email, displayName, photoURL))
+
+        pipeline.run_all(set_profile, save_user_document)
+
+        return jsonify({
+            'message': 'User created successfully',
+            'user': user,
+            'localId': user['localId'],
+        }), 201
+    except DeadlineExceeded as e:
+        return jsonify({'error': 'Signup Timed Out', 'message': str(e)}), 504
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
+@auth_rate_limiter.limit_by_ip(LOGIN_RATE_LIMIT)
 def login():
     """
     Authenticate user by email and password.
@@ -311,25 +330,15 @@ def login():
             error:
               type: string
               description: Error message
+      429:
+        description: Too many login attempts from this IP, retry after the Retry-After seconds
     """
     try:
         email = request.json.get('email')
         password = request.json.get('password')
 
-        user = auth.sign_in_with_email_and_password(email, password)
-
-        # Enable user after successful login
-        # isUserEnabled = enable_user(email)
-
-        # if isUserEnabled:
-        #     return jsonify({"access_token": user}), 200
-        # else:
-        #     return jsonify(
-        #         {
-        #         "error": "User is disabled: ",
-        #         "errorDetails": isUserEnabled,
-        #         "message": "Please contact the administrator to enable your account"
-        #         }), 401
+        with stage('identity_toolkit'):
+            user = auth.sign_in_with_email_and_password(email, password)
 
         return jsonify({"access_token": user}), 200
 
@@ -346,63 +355,81 @@ def authenticate(func):
             # Getting the barrier token from the request header
             barrier_token = token.split(" ")[1]
             authenticated, user = authenticate_user(barrier_token)
-
-            # If user is authenticated, call the actual function
-            if authenticated:
-              return func(user, *args, **kwargs)
-            else:
-              # If user is not authenticated, return a 401 Unauthorized response
-              return jsonify({'message': "Unauthorized: ",'errorDetails':user}), 401
         except Exception as e:
-            # If an error occurs, return a 401 Unauthorized response
+            # A missing or malformed Authorization header, return a 401 Unauthorized response
             return jsonify({'error': 'Unauthorized', 'message': str(e)}), 401
+
+        if not authenticated:
+            # If user is not authenticated, return a 401 Unauthorized response
+            return jsonify({'message': "Unauthorized: ",'errorDetails':user}), 401
+
+        # If user is authenticated, call the actual function
+        retry_after = user_rate_limiter.check('user', (user.get('localId'), current_route()), USER_RATE_LIMIT)
+        if retry_after:
+            return too_many_requests(retry_after)
+        return func(user, *args, **kwargs)
     # Return the actual function to be called
     return wrapper
 
-def save_service_to_database(data, user):
-    self_logistics = data.get('self_logistics')
-    sf_id = data.get('sf_id')
-    channel = data.get('channel')
-    contact_details = data.get('contact_details')
-    delivery_note = data.get('delivery_note')
-    issue_message_from_customer = data.get('issue_message_from_customer')
-    machine_details = data.get('machine_details')
-    pickup_details = data.get('pickup_details')
-    admin_comments = data.get('admin_comments')
-
-    service_body_data = {
-        "self_logistics": self_logistics,
-        "sf_id": sf_id,
-        "channel": channel,
-        "contact_details": contact_details,
-        "delivery_note": delivery_note,
-        "issue_message_from_customer": issue_message_from_customer,
-        "machine_details": machine_details,
-        "pickup_details": pickup_details,
-        "admin_comments": admin_comments
-    }
+# Sharded counters behind GET /services/stats, see service_stats.py
+service_stats = ServiceStats(
+    lambda: db.collection(os.environ.get('SERVICE_STATS_COLLECTION', 'service_stats')),
+    shards=int(os.environ.get('SERVICE_STATS_SHARDS', 10))
+)
 
+## Idempotency-Key on create requests, see idempotency.py
+idempotency_store = IdempotencyStore(
+    lambda: db.collection(os.environ.get('IDEMPOTENCY_COLLECTION', 'idempotency_keys')),
+    ttl=int(os.environ.get('IDEMPOTENCY_TTL', 86400)),
+    cache_size=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+)
+
+def idempotent_response(user, handler):
+    """jsonify(handler(idempotent)), the handler returns (body, status) and runs once per Idempotency-Key."""
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        body, status = handler(None)
+        return jsonify(body), status
+    scope = (user.get('localId') or user.get('email'), current_route())
     try:
-        # Validate the request body against the fixed schema
-        validate(instance=service_body_data, schema=SERVICE_SCHEMA)
-    except ValidationError as e:
-        error_body={
-            "message": 'Invalid request body',
-            "errors":e.message,
-            "RequiredSchema": SERVICE_SCHEMA,
-            "status": 400
-        }
+        body, status, replayed = idempotency_store.run(scope, key, request.get_data(), handler)
+    except IdempotencyKeyError as e:
+        return jsonify({'error': 'Idempotency-Key', 'message': str(e)}), e.status
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
+
+def save_service_to_database(data, user, idempotent=None):
+    service_body_data = build_service_body(data)
+
+    # Validate the request body against the fixed schema
+    with stage('validate'):
+        error_body = service_error_body(service_body_data)
+    if error_body:
         return error_body
 
-    todo_ref = service_ref.document()
-    todo_ref.set(service_body_data)
     success_body={
         "message": 'Service added successfully',
         "status": 200
     }
+
+    # The service and its dashboard counters (and the idempotency record) are written together
+    service_doc_ref = service_ref.document()
+    batch = db.batch()
+    if idempotent:
+        idempotent.add_to_batch(batch, success_body, 201)
+    batch.set(service_doc_ref, service_body_data)
+    service_stats.add_to_batch(batch, service_stats.deltas(after=service_body_data))
+    collection_versions.bump(batch, 'service')
+    with stage('firestore'):
+        if idempotent:
+            idempotent.commit(batch)
+        else:
+            batch.commit()
     return success_body
 
-@app.route('/create-service', methods=['POST'])
+@api.route('/create-service', methods=['POST'])
 @authenticate
 def create_service(user):
     """
@@ -418,6 +445,11 @@ def create_service(user):
         required: true
         schema:
           $ref: '#/definitions/SERVICE_SCHEMA'  # Reference to the schema definition
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Client chosen key, a retry with the same key and body gets the first response back (with Idempotent-Replayed true) instead of a second service
     responses:
       201:
         description: Service added successfully
@@ -443,213 +475,279 @@ def create_service(user):
             message:
               type: string
               description: Error message
-
-    definitions:  # Define the schema here
-      SERVICE_SCHEMA: # Define the schema here
-        type: object
-        properties:
-          sf_id:
-            type: string
-            description: Salesforce ID
-          channel:
-            type: string
-            description: Channel of the service
-          contact_details:
-            type: object
-            properties:
-              first_name:
-                type: string
-                description: First name of the contact person
-              last_name:
-                type: string
-                description: Last name of the contact person
-              contact_numbers:
-                type: object
-                properties:
-                  primary:
-                    type: object
-                    properties:
-                      country_code:
-                        type: number
-                        description: Country code of the primary contact number
-                      number:
-                        type: number
-                        description: Primary contact number
-                      verified:
-                        type: boolean
-                        description: Flag indicating whether the primary contact number is verified
-                      whatsapp:
-                        type: boolean
-                        description: Flag indicating whether the primary contact number is on WhatsApp
-                  secondary:
-                    type: object
-                    properties:
-                      country_code:
-                        type: number
-                        description: Country code of the secondary contact number
-                      number:
-                        type: number
-                        description: Secondary contact number
-                      verified:
-                        type: boolean
-                        description: Flag indicating whether the secondary contact number is verified
-                      whatsapp:
-                        type: boolean
-                        description: Flag indicating whether the secondary contact number is on WhatsApp
-                required:
-                  - primary
-                  - secondary
-              email:
-                type: string
-                description: Email address of the contact person
-              pickup_address:
-                type: object
-                properties:
-                  address:
-                    type: string
-                    description: Address for pickup
-                  city:
-                    type: string
-                    description: City for pickup
-                  state:
-                    type: string
-                    description: State for pickup
-                  pincode:
-                    type: number
-                    description: Pincode for pickup
-                  google_location:
-                    type: string
-                    description: Google location for pickup
-                required:
-                  - address
-                  - city
-                  - state
-                  - pincode
-              use_differant_delivery_address:
-                type: boolean
-                description: Flag indicating whether a different delivery address is to be used
-              delivery_address:
-                type: object
-                properties:
-                  address:
-                    type: string
-                    description: Address for delivery
-                  city:
-                    type: string
-                    description: City for delivery
-                  state:
-                    type: string
-                    description: State for delivery
-                  pincode: 
-                    type: number
-                    description: Pincode for delivery
-                  google_location:
-                    type: string
-                    description: Google location for delivery
-                required:
-                  - address
-                  - city
-                  - state
-                  - pincode
-            required:
-              - first_name
-              - last_name
-              - contact_numbers
-              - pickup_address
-              - delivery_address
-          machine_details:
-            type: object
-            properties:
-              item_brand:
-                type: string
-                description: Brand of the machine
-              model:
-                type: string
-                description: Model of the machine
-              item_category:
-                type: string
-                description: Category of the machine
-              year_of_purchase:
-                type: number
-                description: Year of purchase of the machine
-            required:
-              - item_brand
-              - model
-              - item_category
-              - year_of_purchase
-
-          issue_message_from_customer:
-            type: string
-            description: Issue message from the customer
-          admin_comments:
-            type: array
-            items:
-              type: object
-              properties:
-                timestamp:
-                  type: string
-                  description: Timestamp of the comment
-                user:
-                  type: string
-                  description: User who added the comment
-                message:
-                  type: string
-                  description: Comment message
-                required:
-                  - timestamp
-                  - user
-                  - message
-          delivery_note:
-            type: string
-            description: Delivery note
-          pickup_details:
-            type: object
-            properties:
-              pickup_note:
-                type: string
-                description: Pickup note
-            required:
-              - pickup_note
-          self_logistics:
-            type: boolean
-            description: Flag indicating whether self logistics is used
-        required:
-          - sf_id
-          - channel
-          - contact_details
-          - machine_details
-          - issue_message_from_customer
-          - admin_comments
-          - delivery_note
-          - pickup_details
-          - self_logistics
+      409:
+        description: A request with the same Idempotency-Key is still in progress
+      422:
+        description: The Idempotency-Key was already used with a different request body
     """
 
     try:
         data = request.json
         
-        # Save the service to the database
-        save_data_response = save_service_to_database(data, user)
+        # Save the service to the database, once per Idempotency-Key
+        def save(idempotent):
+            save_data_response = save_service_to_database(data, user, idempotent)
+            return save_data_response, 400 if save_data_response.get('status') == 400 else 201
 
-        if save_data_response.get('status') == 400:
-            return jsonify(save_data_response), 400
-        else:
-            return jsonify(save_data_response), 201
+        return idempotent_response(user, save)
 
     except Exception as e:
         return jsonify({'error': 'Internal Server Error Saving Service', 'message': str(e)}), 500
     
+## Create many services at once
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+# Firestore rejects a WriteBatch with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+# ids is filled as each chunk commits, so a caller can tell what was written if a later chunk fails.
+# Every chunk also bumps the collection's version marker and, with stats, carries one write with
+# the chunk's counter increments.
+def commit_in_batches(collection_ref, bodies, ids, stats=None):
+    chunk_size = FIRESTORE_BATCH_LIMIT - (2 if stats else 1)
+    for start in range(0, len(bodies), chunk_size):
+        batch = db.batch()
+        chunk_ids = []
+        chunk = bodies[start:start + chunk_size]
+        for body in chunk:
+            doc_ref = collection_ref.document()
+            batch.set(doc_ref, body)
+            chunk_ids.append(doc_ref.id)
+        if stats:
+            stats.add_to_batch(batch, stats.combine(stats.deltas(after=body) for body in chunk))
+        collection_versions.bump(batch, collection_ref.id)
+        with stage('firestore'):
+            batch.commit()
+        ids.extend(chunk_ids)
+    return ids
+
+@api.route('/services:batch', methods=['POST'])
+@authenticate
+def create_services_batch(user):
+    """
+    POST many services in one request, valid ones are written with Firestore batched writes.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            services:
+              type: array
+              description: Up to MAX_BATCH_SIZE service bodies
+              items:
+                $ref: '#/definitions/SERVICE_SCHEMA'
+          required:
+            - services
+    responses:
+      201:
+        description: All services added successfully
+      207:
+        description: Some services were invalid, the valid ones were added
+      400:
+        description: Invalid request body or every service was invalid
+      401:
+        description: Unauthorized access
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              description: Error message
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('services')
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'services must be a non-empty array'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'message': f'At most {MAX_BATCH_SIZE} services can be created per request'}), 400
+
+    results = []
+    valid = []
+    with stage('validate'):
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({"index": index, "errors": [{"path": "", "message": "Service must be an object"}]})
+                continue
+            body = build_service_body(item)
+            errors = validation_errors(SERVICE_VALIDATOR, body)
+            if errors:
+                results.append({"index": index, "errors": errors})
+            else:
+                result = {"index": index}
+                results.append(result)
+                valid.append((result, body))
+
+    ids = []
+    try:
+        commit_in_batches(service_ref, [body for _, body in valid], ids, stats=service_stats)
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal Server Error Saving Services',
+            'message': str(e),
+            'createdIds': ids
+        }), 500
+    for (result, _), service_id in zip(valid, ids):
+        result["id"] = service_id
+
+    failed = len(items) - len(valid)
+    status = 201 if not failed else (207 if valid else 400)
+    return jsonify({
+        'message': 'Services added successfully' if not failed else 'Some services are invalid',
+        'created': len(valid),
+        'failed': failed,
+        'results': results
+    }), status
+
+## Update part of a service
+# Values in admin_comments are appended (ArrayUnion) rather than replacing the comments
+SERVICE_APPEND_FIELDS = ('admin_comments',)
+# Attempts when the service changes between reading it for the counters and writing it
+SERVICE_UPDATE_ATTEMPTS = 3
+
+def update_service_document(doc_ref, updates, field_updates):
+    counted = any(field_paths_overlap(path, counter_path) for path in updates for counter_path in DIMENSIONS.values())
+    if not counted:
+        # Nothing the dashboard counts changes, a blind update is enough (NotFound if there is no service)
+        batch = db.batch()
+        batch.update(doc_ref, field_updates)
+        collection_versions.bump(batch, 'service')
+        batch.commit()
+        return
+
+    for attempt in range(SERVICE_UPDATE_ATTEMPTS):
+        snapshot = doc_ref.get()
+        if not snapshot.exists:
+            raise exceptions.NotFound(f'No service {doc_ref.id}')
+        before = snapshot.to_dict()
+        after = apply_field_updates(copy.deepcopy(before), updates)
+        batch = db.batch()
+        # Only applied if the service is unchanged since it was read, so the counter deltas are right
+        batch.update(doc_ref, field_updates, option=db.write_option(last_update_time=snapshot.update_time))
+        service_stats.add_to_batch(batch, service_stats.deltas(before, after))
+        collection_versions.bump(batch, 'service')
+        try:
+            batch.commit()
+            return
+        except exceptions.FailedPrecondition:
+            if attempt == SERVICE_UPDATE_ATTEMPTS - 1:
+                raise
+
+@api.route('/services/<service_id>', methods=['PATCH'])
+@authenticate
+def update_service(user, service_id):
+    """
+    Update some fields of a service.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: service_id
+        in: path
+        type: string
+        required: true
+        description: ID of the service to update
+      - name: update_mask
+        in: query
+        type: string
+        required: false
+        description: Comma separated field paths to take from the body, by default every leaf of the body
+      - name: body
+        in: body
+        required: true
+        description: >
+          Part of a service, nested like SERVICE_SCHEMA, e.g. {"contact_details": {"pickup_address": {"city": "Pune"}}}.
+          Each value is validated against its part of the schema only. admin_comments are appended to the existing comments.
+        schema:
+          type: object
+    responses:
+      200:
+        description: Service updated successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+            updated_fields:
+              type: array
+              items:
+                type: string
+      400:
+        description: Invalid request body
+      401:
+        description: Unauthorized access
+      404:
+        description: Service not found
+    """
+    from firebase_admin import firestore
+
+    try:
+        updates, appends = parse_patch(
+            request.get_json(silent=True), SERVICE_SCHEMA, request.args.get('update_mask'),
+            append_fields=SERVICE_APPEND_FIELDS
+        )
+    except FieldErrors as e:
+        return jsonify({'message': str(e), 'errors': e.errors}), 400
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    with stage('validate'):
+        errors = field_errors(SERVICE_SCHEMA, {**updates, **appends})
+    if errors:
+        return jsonify({'message': 'Invalid request body', 'errors': errors}), 400
+
+    field_updates = {**updates, **{path: firestore.ArrayUnion(items) for path, items in appends.items()}}
+    try:
+        with stage('firestore'):
+            update_service_document(service_ref.document(service_id), updates, field_updates)
+    except exceptions.NotFound:
+        return jsonify({'message': 'Service not found'}), 404
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Updating Service', 'message': str(e)}), 500
+    return jsonify({'message': 'Service updated successfully', 'updated_fields': sorted(field_updates)}), 200
+
 ## Get all the services
-@app.route('/services', methods=['GET'])
+@api.route('/services', methods=['GET'])
 @authenticate
 def get_services(user):
     """
-    Retrieve services for the authenticated user.
+    Retrieve services for the authenticated user, one page at a time.
     ---
     tags:
       - Services
     security:
       - BearerAuth: []
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of services to return (defaults to DEFAULT_PAGE_SIZE, capped at MAX_PAGE_SIZE)
+      - name: page_token
+        in: query
+        type: string
+        required: false
+        description: The next_page_token returned by the previous page
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated field paths to return, e.g. sf_id,channel,contact_details.first_name
+      - name: stream
+        in: query
+        type: string
+        required: false
+        description: Set to 1 (or send Accept application/x-ndjson) to stream every service as NDJSON, limit and page_token are ignored
+    produces:
+      - application/json
+      - application/x-ndjson
     responses:
       200:
         description: Services retrieved successfully
@@ -660,6 +758,19 @@ def get_services(user):
               type: array
               items:
                 $ref: '#/definitions/SERVICE_SCHEMA'
+            next_page_token:
+              type: string
+              description: Token for the next page, null on the last page
+      400:
+        description: Invalid limit, page_token or fields
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              description: Error message
+      304:
+        description: Not modified, the If-None-Match header holds the current ETag
       401:
         description: Unauthorized access
         schema:
@@ -670,14 +781,349 @@ def get_services(user):
               description: Error message
     """
     try:
-        services_ref = db.collection('service').stream()
-        services = [{**service.to_dict(), "id": service.id} for service in services_ref]
-        return jsonify({'services': services}), 200
+        limit = parse_limit(request.args.get('limit'))
+        start_after = decode_page_token(request.args.get('page_token'))
+        fields = parse_fields(request.args.get('fields'), SERVICE_SCHEMA)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        if wants_stream():
+            query = db.collection('service')
+            if fields:
+                query = query.select(fields)
+            return stream_documents(query.stream())
+
+        # The marker is read before the query, so the ETag is never newer than the page
+        with stage('firestore'):
+            version = collection_versions.get('service')
+        etag = make_etag('service', version, request.full_path)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        query = db.collection('service').order_by(DOCUMENT_ID)
+        if fields:
+            query = query.select(fields)
+        if start_after:
+            query = query.start_after({DOCUMENT_ID: start_after})
+
+        # Fetch one extra document to know whether there is another page
+        def fetch_page():
+            return page_of(list(query.limit(limit + 1).stream()), limit)
+
+        # Requests for the same page of the same collection version share the query
+        with stage('firestore'):
+            if SINGLE_FLIGHT:
+                services, next_page_token = services_flight.do((version, limit, start_after, tuple(fields or ())), fetch_page)
+            else:
+                services, next_page_token = fetch_page()
+        return with_etag(jsonify({'services': services, 'next_page_token': next_page_token}), etag), 200
     except Exception as e:
         return jsonify({'error': 'Internal Server Error Retrieving Services', 'message': str(e)}), 500
 
-@app.route('/todo', methods=['POST'])
-def add_todo():
+## Fetch many services at once
+MAX_BATCH_GET_SIZE = int(os.environ.get('MAX_BATCH_GET_SIZE', 300))
+
+@api.route('/services:batchGet', methods=['POST'])
+@authenticate
+def batch_get_services(user):
+    """
+    Fetch many services by ID with one Firestore call.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              description: Up to MAX_BATCH_GET_SIZE service IDs
+              items:
+                type: string
+            fields:
+              type: string
+              description: Comma separated field paths to return, e.g. sf_id,channel,contact_details.first_name
+          required:
+            - ids
+    responses:
+      200:
+        description: One result per requested ID, in the same order
+        schema:
+          type: object
+          properties:
+            services:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  found:
+                    type: boolean
+                    description: False when there is no service with this ID (no data then)
+                  data:
+                    type: object
+      400:
+        description: Invalid request body
+      401:
+        description: Unauthorized access
+    """
+    body = request.get_json(silent=True)
+    try:
+        ids = parse_batch_get(body, MAX_BATCH_GET_SIZE)
+        fields = parse_fields(body.get('fields'), SERVICE_SCHEMA)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        refs = [service_ref.document(service_id) for service_id in dict.fromkeys(ids)]
+        with stage('firestore'):
+            # get_all returns the snapshots in any order
+            documents = {
+                snapshot.id: snapshot.to_dict() if snapshot.exists else None
+                for snapshot in db.get_all(refs, field_paths=fields)
+            }
+        return jsonify({'services': batch_get_results(ids, documents)}), 200
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Retrieving Services', 'message': str(e)}), 500
+
+## Dashboard aggregates
+@api.route('/services/stats', methods=['GET'])
+@authenticate
+def get_service_stats(user):
+    """
+    Service counts by channel, item category, self logistics and pickup city.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    responses:
+      200:
+        description: Counts maintained as services are written, read from SERVICE_STATS_SHARDS documents
+        schema:
+          type: object
+          properties:
+            total:
+              type: integer
+            channel:
+              type: object
+              additionalProperties:
+                type: integer
+            item_category:
+              type: object
+              additionalProperties:
+                type: integer
+            self_logistics:
+              type: object
+              additionalProperties:
+                type: integer
+            city:
+              type: object
+              additionalProperties:
+                type: integer
+      401:
+        description: Unauthorized access
+    """
+    try:
+        with stage('firestore'):
+            stats = service_stats.read()
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Retrieving Service Stats', 'message': str(e)}), 500
+
+## Live service changes
+# One snapshot listener per process feeds every GET /services/changes stream, it is started by
+# the first stream. Each open stream holds a worker thread, so they are capped and end after
+# SERVICE_CHANGES_MAX_AGE seconds, the client reconnects with its Last-Event-ID.
+service_changes = ChangeFeed(
+    lambda: db.collection('service'),
+    buffer_size=int(os.environ.get('SERVICE_CHANGES_BUFFER', 1000)),
+    ready_timeout=int(os.environ.get('SERVICE_CHANGES_READY_TIMEOUT', 10))
+)
+SERVICE_CHANGES_MAX_AGE = int(os.environ.get('SERVICE_CHANGES_MAX_AGE', 300))
+service_change_streams = threading.BoundedSemaphore(int(os.environ.get('SERVICE_CHANGES_MAX_STREAMS', 4)))
+
+@api.route('/services/changes', methods=['GET'])
+@authenticate
+def get_service_changes(user):
+    """
+    Server-Sent Events stream of added, modified and removed services.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: Last-Event-ID
+        in: header
+        type: string
+        required: false
+        description: Id of the last event received, the stream resumes after it (sent by EventSource when it reconnects)
+      - name: last_event_id
+        in: query
+        type: string
+        required: false
+        description: Same as the Last-Event-ID header
+    produces:
+      - text/event-stream
+    responses:
+      200:
+        description: >
+          Events named added, modified and removed with data {"id", "type", "data"} (no data for removed).
+          A reset event (first on a new stream, or when the Last-Event-ID can't be resumed) means
+          changes were missed, reload GET /services and apply the events that follow.
+      401:
+        description: Unauthorized access
+      503:
+        description: Too many open streams, or the feed is still starting
+    """
+    if not service_change_streams.acquire(blocking=False):
+        return jsonify({'message': 'Too many open change streams, retry shortly'}), 503, {'Retry-After': '5'}
+    try:
+        service_changes.start()
+    except Exception as e:
+        service_change_streams.release()
+        return jsonify({'error': 'Change feed unavailable', 'message': str(e)}), 503, {'Retry-After': '5'}
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    events = service_changes.stream(
+        service_changes.resume_from(last_event_id),
+        current_app.json.dumps,
+        max_age=SERVICE_CHANGES_MAX_AGE
+    )
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the server is done with the response, also if the client went away before the first event
+    response.call_on_close(service_change_streams.release)
+    return response
+
+## Search services
+# Free text search is served from an in-process index fed by a snapshot listener on the service
+# collection, it is started by the first search that uses q
+SERVICE_SEARCH_INDEX = os.environ.get('SERVICE_SEARCH_INDEX', '1') == '1'
+service_search = ServiceSearchIndex(
+    lambda: db.collection('service'),
+    ready_timeout=int(os.environ.get('SERVICE_SEARCH_READY_TIMEOUT', 10))
+)
+
+@api.route('/services/search', methods=['GET'])
+@authenticate
+def search_services(user):
+    """
+    Search services by sf_id, primary phone number, brand, pincode or free text.
+    ---
+    tags:
+      - Services
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: sf_id
+        in: query
+        type: string
+        required: false
+        description: Salesforce ID
+      - name: phone
+        in: query
+        type: number
+        required: false
+        description: Primary contact number (contact_details.contact_numbers.primary.number)
+      - name: brand
+        in: query
+        type: string
+        required: false
+        description: Machine brand (machine_details.item_brand), case sensitive
+      - name: pincode
+        in: query
+        type: number
+        required: false
+        description: Pickup pincode (contact_details.pickup_address.pincode)
+      - name: pincode_min
+        in: query
+        type: number
+        required: false
+        description: Lowest pickup pincode
+      - name: pincode_max
+        in: query
+        type: number
+        required: false
+        description: Highest pickup pincode
+      - name: q
+        in: query
+        type: string
+        required: false
+        description: Words (or word prefixes) that must all appear in the contact name or the issue message
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of services to return (defaults to DEFAULT_PAGE_SIZE, capped at MAX_PAGE_SIZE)
+    responses:
+      200:
+        description: Matching services
+        schema:
+          type: object
+          properties:
+            services:
+              type: array
+              items:
+                $ref: '#/definitions/SERVICE_SCHEMA'
+      400:
+        description: No search parameters or an invalid one
+      401:
+        description: Unauthorized access
+      503:
+        description: The free text index is still loading
+    """
+    try:
+        filters = parse_service_search(request.args)
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    text = request.args.get('q', '').strip()
+    if not filters and not text:
+        return jsonify({'message': 'Provide q or at least one of sf_id, phone, brand, pincode, pincode_min, pincode_max'}), 400
+    if text and not SERVICE_SEARCH_INDEX:
+        return jsonify({'message': 'Free text search is disabled'}), 400
+
+    try:
+        if text:
+            # The equality and range filters are applied to the index hits in process
+            service_search.start()
+            with stage('search'):
+                ids = service_search.search(text, limit, lambda values: matches_filters(values, filters))
+            # The index only holds words and filter fields, the hits are read with one call
+            with stage('firestore'):
+                found = {
+                    snapshot.id: snapshot.to_dict()
+                    for snapshot in db.get_all([service_ref.document(doc_id) for doc_id in ids]) if snapshot.exists
+                }
+            services = [
+                {**found[doc_id], "id": doc_id} for doc_id in ids
+                if doc_id in found and matches_filters(found[doc_id], filters)
+            ]
+        else:
+            with stage('firestore'):
+                docs = list(services_search_query(db.collection('service'), filters).limit(limit).stream())
+            services = [{**service.to_dict(), "id": service.id} for service in docs]
+        return jsonify({'services': services}), 200
+    except SearchIndexNotReady as e:
+        return jsonify({'error': 'Search Index Loading', 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Searching Services', 'message': str(e)}), 500
+
+@api.route('/todo', methods=['POST'])
+@authenticate
+def add_todo(user):
     """
     Add a new todo for the authenticated user.
     ---
@@ -691,6 +1137,11 @@ def add_todo():
         required: true
         schema:
           $ref: '#/definitions/TODO_SCHEMA'  # Reference to the schema definition
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Client chosen key, a retry with the same key and body gets the first response back (with Idempotent-Replayed true) instead of a second todo
     responses:
       200:
         description: Todo added successfully
@@ -716,71 +1167,44 @@ def add_todo():
             message:
               type: string
               description: Error message
-    definitions:  # Define the schema here
-      TODO_SCHEMA:
-        type: object
-        properties:
-          title:
-            type: string
-            description: Title of the todo
-          description:
-            type: string
-            description: Description of the todo
-          isCompleted:
-            type: boolean
-            description: Flag indicating whether the todo is completed
-          activated:
-            type: boolean
-            description: Flag indicating whether the todo is activated
-        required:
-          - title  # title is a required field
-    """
-    token = request.headers.get('Authorization')
-
-    # Split the token string by space and take the second part
-    barrier_token = token.split(" ")[1]
-
-    authenticated, user = authenticate_user(barrier_token)
-    if authenticated:
-        data = request.json
+      409:
+        description: A request with the same Idempotency-Key is still in progress
+      422:
+        description: The Idempotency-Key was already used with a different request body
+    """
+    data = request.json
 
-        # Set default values and format fields as required
-        title = data.get('title')
-        description = data.get('description', "")
-        createdAt = time.strftime("%Y-%m-%d %H:%M:%S")
-        updatedAt = createdAt
-        createdBy = user["email"]
-        isCompleted = data.get('isCompleted', False)
-        activated = data.get('activated', False)
-
-        todo_data = {
-            "title": title,
-            "description": description,
-            "createdAt": createdAt,
-            "updatedAt": updatedAt,
-            "createdBy": createdBy,
-            "isCompleted": isCompleted,
-            "activated": activated
-        }
+    def save(idempotent):
+        todo_data = build_todo_body(data, user["email"])
 
-        try:
-            # Validate the request body against the fixed schema
-            validate(instance=todo_data, schema=TODO_SCHEMA)
-        except ValidationError as e:
+        # Validate the request body against the fixed schema
+        with stage('validate'):
+            error_body = todo_error_body(todo_data)
+        if error_body:
             # If validation fails, return a 400 Bad Request response
-            return {
-                "message": 'Invalid request body',
-                "errors":e.message,
-                "RequiredSchema": TODO_SCHEMA
-            }, 400
+            return error_body, 400
 
+        success_body = {'message': 'Todo added successfully'}
         todo_ref = db.collection('todos').document()
-        todo_ref.set(todo_data)
-        return jsonify({'message': 'Todo added successfully'}), 200
-    return jsonify({'message': "Unauthorized: ",'errorDetails':user}), 401
+        batch = db.batch()
+        if idempotent:
+            idempotent.add_to_batch(batch, success_body, 200)
+        batch.set(todo_ref, todo_data)
+        collection_versions.bump(batch, todos_marker(user))
+        with stage('firestore'):
+            if idempotent:
+                idempotent.commit(batch)
+            else:
+                batch.commit()
+        todo_cache.invalidate(todo_ref)
+        return success_body, 200
+
+    # Written once per Idempotency-Key
+    return idempotent_response(user, save)
 
-@app.route('/todo', methods=['GET'])
-def get_todos():
+@api.route('/todo', methods=['GET'])
+@authenticate
+def get_todos(user):
     """
     Retrieve todos for the authenticated user.
     ---
@@ -788,6 +1212,31 @@ def get_todos():
       - Todos
     security:
       - BearerAuth: []
+    parameters:
+      - name: isCompleted
+        in: query
+        type: boolean
+        required: false
+        description: Only return todos with this completion state
+      - name: activated
+        in: query
+        type: boolean
+        required: false
+        description: Only return todos with this activation state
+      - name: order
+        in: query
+        type: string
+        enum: [asc, desc]
+        required: false
+        description: Sort by createdAt, newest first by default
+      - name: stream
+        in: query
+        type: string
+        required: false
+        description: Set to 1 (or send Accept application/x-ndjson) to stream the todos as NDJSON
+    produces:
+      - application/json
+      - application/x-ndjson
     responses:
       200:
         description: Todos retrieved successfully
@@ -798,6 +1247,16 @@ def get_todos():
               type: array
               items:
                 $ref: '#/definitions/TODO_SCHEMA'
+      400:
+        description: Invalid filter or order
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              description: Error message
+      304:
+        description: Not modified, the If-None-Match header holds the current ETag
       401:
         description: Unauthorized access
         schema:
@@ -807,21 +1266,27 @@ def get_todos():
               type: string
               description: Error message
     """
-    token = request.headers.get('Authorization')
-
-    # Split the token string by space and take the second part
-    barrier_token = token.split(" ")[1]
+    try:
+        query = user_todos_query(db.collection('todos'), user["email"], request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if wants_stream():
+        return stream_documents(query.stream())
 
-    authenticated, user = authenticate_user(barrier_token)
+    with stage('firestore'):
+        version = collection_versions.get(todos_marker(user))
+    etag = make_etag('todos', version, user["email"], request.full_path)
+    response = not_modified(etag)
+    if response is not None:
+        return response
 
-    if authenticated:
-        todos_ref = db.collection('todos').stream()
-        todos = [{**todo.to_dict(), "id": todo.id} for todo in todos_ref]
-        return jsonify({'todos': todos}), 200
-    return jsonify({'message': 'Unauthorized','errorDetails':user}), 401
+    with stage('firestore'):
+        todos = [with_id(todo) for todo in query.stream()]
+    return with_etag(jsonify({'todos': todos}), etag), 200
 
-@app.route('/todo/<todo_id>', methods=['GET'])
-def get_todo(todo_id):
+@api.route('/todo/<todo_id>', methods=['GET'])
+@authenticate
+def get_todo(user, todo_id):
     """
     Retrieve a todo by its ID.
     ---
@@ -854,6 +1319,8 @@ def get_todo(todo_id):
               type: string
               format: date-time
               description: Date and time when the todo was created
+      304:
+        description: Not modified, the If-None-Match header holds the current ETag
       401:
         description: Unauthorized access
         schema:
@@ -863,7 +1330,7 @@ def get_todo(todo_id):
               type: string
               description: Error message
       404:
-        description: Todo not found
+        description: Todo not found, or not one of the caller's todos
         schema:
           type: object
           properties:
@@ -871,21 +1338,82 @@ def get_todo(todo_id):
               type: string
               description: Error message
     """
-    token = request.headers.get('Authorization')
+    with stage('firestore'):
+        todo = todo_cache.get(db.collection('todos').document(todo_id))
+    if owns_todo(todo.data, user):
+        etag = make_etag(todo.id, todo.update_time)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        return with_etag(jsonify(todo.data), etag), 200
+    return jsonify({'message': 'Todo not found'}), 404
 
-    # Split the token string by space and take the second part
-    barrier_token = token.split(" ")[1]
+## Fetch many todos at once, through the todo cache
+@api.route('/todo:batchGet', methods=['POST'])
+@authenticate
+def batch_get_todos(user):
+    """
+    Fetch many todos by ID, the ones not cached are read with one Firestore call.
+    ---
+    tags:
+      - Todos
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              description: Up to MAX_BATCH_GET_SIZE todo IDs
+              items:
+                type: string
+          required:
+            - ids
+    responses:
+      200:
+        description: One result per requested ID, in the same order
+        schema:
+          type: object
+          properties:
+            todos:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  found:
+                    type: boolean
+                    description: False when there is no todo with this ID among the caller's todos (no data then)
+                  data:
+                    type: object
+      400:
+        description: Invalid request body
+      401:
+        description: Unauthorized access
+    """
+    try:
+        ids = parse_batch_get(request.get_json(silent=True), MAX_BATCH_GET_SIZE)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    authenticated, user = authenticate_user(barrier_token)
-    if authenticated:
-        todo_ref = db.collection('todos').document(todo_id).get()
-        if todo_ref.exists:
-            return jsonify(todo_ref.to_dict()), 200
-        return jsonify({'message': 'Todo not found'}), 404
-    return jsonify({'message': 'Unauthorized','errorDetails':user}), 401
+    try:
+        todos = db.collection('todos')
+        refs = [todos.document(todo_id) for todo_id in dict.fromkeys(ids)]
+        with stage('firestore'):
+            cached = todo_cache.get_many(refs, db.get_all)
+        documents = {todo.id: todo.data if owns_todo(todo.data, user) else None for todo in cached.values()}
+        return jsonify({'todos': batch_get_results(ids, documents)}), 200
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Retrieving Todos', 'message': str(e)}), 500
 
-@app.route('/todo/<todo_id>', methods=['DELETE'])
-def delete_todo(todo_id):
+@api.route('/todo/<todo_id>', methods=['DELETE'])
+@authenticate
+def delete_todo(user, todo_id):
     """
     Delete a todo by its ID.
     ---
@@ -916,17 +1444,172 @@ def delete_todo(todo_id):
             message:
               type: string
               description: Error message
+      404:
+        description: Todo not found, or not one of the caller's todos
+    """
+    todo_ref = db.collection('todos').document(todo_id)
+    # The owner's version marker is bumped, so only the owner may delete (other users' todos are missing)
+    with stage('firestore'):
+        todo = todo_cache.get(todo_ref)
+    if not todo.exists:
+        # Nothing to delete, as before
+        return jsonify({'message': 'Todo deleted successfully'}), 200
+    if not owns_todo(todo.data, user):
+        return jsonify({'message': 'Todo not found'}), 404
+    batch = db.batch()
+    batch.delete(todo_ref)
+    collection_versions.bump(batch, todos_marker(user))
+    with stage('firestore'):
+        batch.commit()
+    todo_cache.invalidate(todo_ref)
+    return jsonify({'message': 'Todo deleted successfully'}), 200
+
+## Update part of a todo
+@api.route('/todo/<todo_id>', methods=['PATCH'])
+@authenticate
+def update_todo(user, todo_id):
+    """
+    Update some fields of a todo, e.g. mark it completed.
+    ---
+    tags:
+      - Todos
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: todo_id
+        in: path
+        type: string
+        required: true
+        description: ID of the todo to update
+      - name: update_mask
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to take from the body, by default every field in the body
+      - name: body
+        in: body
+        required: true
+        description: >
+          Fields of TODO_SCHEMA to change, e.g. {"isCompleted": true}. createdAt and createdBy can't be changed.
+        schema:
+          type: object
+    responses:
+      200:
+        description: Todo updated successfully
+      400:
+        description: Invalid request body
+      401:
+        description: Unauthorized access
+      404:
+        description: Todo not found, or not one of the caller's todos
     """
-    token = request.headers.get('Authorization')
+    try:
+        updates, _ = parse_patch(
+            request.get_json(silent=True), TODO_SCHEMA, request.args.get('update_mask'),
+            read_only=('createdAt', 'createdBy')
+        )
+    except FieldErrors as e:
+        return jsonify({'message': str(e), 'errors': e.errors}), 400
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    # Split the token string by space and take the second part
-    barrier_token = token.split(" ")[1]
+    with stage('validate'):
+        errors = field_errors(TODO_SCHEMA, updates)
+    if errors:
+        return jsonify({'message': 'Invalid request body', 'errors': errors}), 400
 
-    authenticated, user = authenticate_user(barrier_token)
-    if authenticated:
-        db.collection('todos').document(todo_id).delete()
-        return jsonify({'message': 'Todo deleted successfully'}), 200
-    return jsonify({'message': 'Unauthorized','errorDetails':user}), 401
+    updates.setdefault('updatedAt', time.strftime("%Y-%m-%d %H:%M:%S"))
+    todo_ref = db.collection('todos').document(todo_id)
+    try:
+        # createdBy can't be changed, so the cached todo is good enough to tell the owner
+        with stage('firestore'):
+            todo = todo_cache.get(todo_ref)
+        if not owns_todo(todo.data, user):
+            return jsonify({'message': 'Todo not found'}), 404
+        batch = db.batch()
+        batch.update(todo_ref, updates)
+        collection_versions.bump(batch, todos_marker(user))
+        try:
+            with stage('firestore'):
+                batch.commit()
+        finally:
+            todo_cache.invalidate(todo_ref)
+    except exceptions.NotFound:
+        return jsonify({'message': 'Todo not found'}), 404
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Updating Todo', 'message': str(e)}), 500
+    return jsonify({'message': 'Todo updated successfully', 'updated_fields': sorted(updates)}), 200
+
+## Warm-up, creates the lazy clients and opens the Firestore channel before traffic arrives
+def warmup():
+    """
+    Initialize the Firebase clients and report the startup time breakdown.
+    ---
+    tags:
+      - Operations
+    responses:
+      200:
+        description: Instance is warm
+        schema:
+          type: object
+          properties:
+            startup:
+              type: object
+              description: Seconds spent in each startup phase
+      503:
+        description: A client could not be initialized
+    """
+    try:
+        auth.resolve()
+        # The first RPC opens the gRPC channel, which is the slow part of the first Firestore call
+        list(db.collection('service').limit(1).stream())
+        token_verifier.keys.get_certs()
+    except Exception as e:
+        return jsonify({'error': 'Warm-up Failed', 'message': str(e), 'startup': startup_timer.breakdown()}), 503
+    return jsonify({'message': 'Warm', 'startup': startup_timer.breakdown()}), 200
+
+def create_app(warmup_endpoint=None):
+    """Build the Flask app, the Firebase clients are created later, on first use."""
+    startup_timer.record('import', time.perf_counter() - IMPORT_STARTED)
+    with startup_timer.phase('create_app'):
+        from openapi import StaticSwagger
+
+        app = Flask(__name__)
+        app.config['SWAGGER'] = SWAGGER_CONFIG
+
+        # orjson backed jsonify, FAST_JSON=0 keeps Flask's stdlib encoder
+        json_provider_class = TimedFastJSONProvider if os.environ.get('FAST_JSON', '1') == '1' else metrics.TimedJSONProvider
+        app.json = json_provider_class(app)
+
+        # Request, stage and upstream metrics, served at /metrics to loopback clients or with METRICS_TOKEN
+        metrics.init_app(app, token=os.environ.get('METRICS_TOKEN'))
+
+        # gzip / brotli for large JSON bodies
+        if os.environ.get('COMPRESSION', '1') == '1':
+            compression.from_environ().init_app(app)
+
+        app.register_blueprint(api)
+        if warmup_endpoint is None:
+            warmup_endpoint = os.environ.get('WARMUP_ENDPOINT', '1') == '1'
+        if warmup_endpoint:
+            app.add_url_rule('/_ah/warmup', 'warmup', warmup, methods=['GET'])
+
+        # API docs, the spec itself is prebuilt by openapi.py and served with an ETag
+        StaticSwagger(app)
+
+        first_request = {}
+
+        @app.before_request
+        def start_first_request():
+            first_request.setdefault('started', time.perf_counter())
+
+        @app.teardown_request
+        def stop_first_request(exc):
+            if 'first_request' not in startup_timer.phases and 'started' in first_request:
+                startup_timer.record('first_request', time.perf_counter() - first_request['started'])
+    return app
+
+app = create_app()
 
 port = int(os.environ.get('PORT', 8080))
 if __name__ == '__main__':
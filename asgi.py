@@ -0,0 +1,330 @@
+# asgi.py
+
+# Async serving mode: the hot routes of the API on an event loop, with the Firestore async client and
+# a non-blocking Identity Toolkit client, so one worker can keep hundreds of requests in flight.
+# Run it with
+#   gunicorn --bind :$PORT --workers 1 --worker-class uvicorn.workers.UvicornWorker asgi:app
+# async_app serves signup, login, create-service, GET /services and todo create / list / get / delete.
+# Every other request, and creates carrying an Idempotency-Key, go to the Flask app of app.py on a
+# worker thread, so async mode serves the whole API. Validation, document shaping, rate limits and
+# version markers come from app.py and its modules, only the I/O is written again here.
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from quart import Quart, Response, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from firebaseConfig import config
+from helpers import (
+    DOCUMENT_ID, NDJSON_MIMETYPE, parse_limit, decode_page_token, parse_fields, with_id, page_of,
+    user_todos_query, build_service_body, build_todo_body, build_user_document
+)
+import app as sync_api
+import ratelimit
+from identity_toolkit import AsyncIdentityToolkit
+from ratelimit import too_many_requests
+from schemas import SERVICE_SCHEMA
+from service_stats import ServiceStats
+from startup import LazyClient, startup_timer
+from token_verifier import TokenVerifier, GOOGLE_CERTS_URL
+from validators import signup_error_body, service_error_body, todo_error_body
+from versions import CollectionVersions, make_etag
+
+# The routes served on the event loop
+async_app = Quart(__name__, static_folder=None)
+
+# Firebase is initialized on first use, through the same lazy firebase_admin app as app.py
+def init_firestore_async():
+    sync_api.default_app.resolve()
+    with startup_timer.phase('firestore_async'):
+        from firebase_admin import firestore_async
+        return firestore_async.client()
+
+auth = AsyncIdentityToolkit(
+    config['apiKey'],
+    max_connections=int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS', 200))
+)
+db = LazyClient(init_firestore_async, 'firestore async')
+
+# Written in the same batches as app.py does, so both apps see the same counters and versions
+service_stats = ServiceStats(
+    lambda: db.collection(os.environ.get('SERVICE_STATS_COLLECTION', 'service_stats')),
+    shards=int(os.environ.get('SERVICE_STATS_SHARDS', 10))
+)
+collection_versions = CollectionVersions(
+    lambda: db.collection(os.environ.get('COLLECTION_VERSIONS_COLLECTION', 'collection_versions')),
+    shards={'service': int(os.environ.get('COLLECTION_VERSIONS_SHARDS', 10))}
+)
+
+async def lookup_account(token):
+    return (await auth.get_account_info(token))["users"][0]
+
+token_verifier = TokenVerifier(
+    project_id=config['projectId'],
+    async_account_lookup=lookup_account,
+    certs_url=os.environ.get('FIREBASE_CERTS_URL', GOOGLE_CERTS_URL),
+    cache_size=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    disabled_staleness=int(os.environ.get('AUTH_DISABLED_STALENESS', 300))
+)
+
+@async_app.after_serving
+async def close_clients():
+    await auth.aclose()
+
+# Streaming exports, one JSON encoded document per line
+def wants_stream():
+    if request.args.get('stream') == '1':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_documents(docs):
+    json_provider = current_app.json
+
+    async def generate():
+        async for doc in docs:
+            yield json_provider.dumps(with_id(doc)) + '\n'
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+# Conditional GET, see app.py
+def not_modified(etag):
+    if request.if_none_match.contains_weak(etag):
+        return sync_api.with_etag(Response('', status=304), etag)
+    return None
+
+## Rate limits, the same limits and buckets as app.py, see ratelimit.py
+def limit_by_ip(limit):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            limiter = sync_api.auth_rate_limiter
+            route = request.url_rule.rule
+            # The buckets may be in Redis, keep the round trip off the event loop
+            retry_after = await asyncio.to_thread(
+                limiter.check, 'ip', (ratelimit.client_ip(limiter.trusted_proxies, request), route), limit, route
+            )
+            if retry_after:
+                return too_many_requests(retry_after)
+            return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Authentication decorator
+def authenticate(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            token = request.headers.get('Authorization')
+
+            # Getting the barrier token from the request header
+            barrier_token = token.split(" ")[1]
+            authenticated, user = await token_verifier.authenticate_async(barrier_token)
+        except Exception as e:
+            return jsonify({'error': 'Unauthorized', 'message': str(e)}), 401
+
+        if not authenticated:
+            return jsonify({'message': "Unauthorized: ",'errorDetails':user}), 401
+        route = request.url_rule.rule
+        retry_after = sync_api.user_rate_limiter.check('user', (user.get('localId'), route), sync_api.USER_RATE_LIMIT, route)
+        if retry_after:
+            return too_many_requests(retry_after)
+        return await func(user, *args, **kwargs)
+    return wrapper
+
+SIGNUP_DEADLINE = float(os.environ.get('SIGNUP_DEADLINE', 15))
+
+@async_app.route('/signup', methods=['POST'])
+@limit_by_ip(sync_api.SIGNUP_RATE_LIMIT)
+async def signup():
+    data = await request.get_json()
+    try:
+        error_body = signup_error_body(data)
+        if error_body:
+            return jsonify(error_body), 400
+
+        async def pipeline():
+            user = await auth.create_user_with_email_and_password(data['email'], data['password'])
+            # The profile update and the user document only depend on the new account
+            await asyncio.gather(
+                auth.update_profile(user['idToken'], data.get('displayName'), data.get('photoURL')),
+                db.collection('user').document(user['localId']).set(
+                    build_user_document(data['email'], data.get('displayName'), data.get('photoURL'))
+                )
+            )
+            return user
+
+        user = await asyncio.wait_for(pipeline(), SIGNUP_DEADLINE)
+        return jsonify({
+            'message': 'User created successfully',
+            'user': user,
+            'localId': user['localId'],
+        }), 201
+    except asyncio.TimeoutError:
+        return jsonify({'error': 'Signup Timed Out', 'message': f'Signup did not finish within {SIGNUP_DEADLINE} seconds'}), 504
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+
+@async_app.route('/login', methods=['POST'])
+@limit_by_ip(sync_api.LOGIN_RATE_LIMIT)
+async def login():
+    try:
+        data = await request.get_json()
+        user = await auth.sign_in_with_email_and_password(data.get('email'), data.get('password'))
+        return jsonify({"access_token": user}), 200
+    except Exception as e:
+        return jsonify({"error": f"An Error Occurred: {e}"}), 401
+
+@async_app.route('/create-service', methods=['POST'])
+@authenticate
+async def create_service(user):
+    try:
+        service_body_data = build_service_body(await request.get_json())
+        error_body = service_error_body(service_body_data)
+        if error_body:
+            return jsonify(error_body), 400
+
+        batch = db.batch()
+        batch.set(db.collection('service').document(), service_body_data)
+        service_stats.add_to_batch(batch, service_stats.deltas(after=service_body_data))
+        collection_versions.bump(batch, 'service')
+        await batch.commit()
+        return jsonify({"message": 'Service added successfully', "status": 200}), 201
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Saving Service', 'message': str(e)}), 500
+
+@async_app.route('/services', methods=['GET'])
+@authenticate
+async def get_services(user):
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        start_after = decode_page_token(request.args.get('page_token'))
+        fields = parse_fields(request.args.get('fields'), SERVICE_SCHEMA)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        if wants_stream():
+            query = db.collection('service')
+            if fields:
+                query = query.select(fields)
+            return stream_documents(query.stream())
+
+        version = await collection_versions.get_async('service')
+        etag = make_etag('service', version, request.full_path)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        query = db.collection('service').order_by(DOCUMENT_ID)
+        if fields:
+            query = query.select(fields)
+        if start_after:
+            query = query.start_after({DOCUMENT_ID: start_after})
+
+        services, next_page_token = page_of([doc async for doc in query.limit(limit + 1).stream()], limit)
+        return sync_api.with_etag(jsonify({'services': services, 'next_page_token': next_page_token}), etag), 200
+    except Exception as e:
+        return jsonify({'error': 'Internal Server Error Retrieving Services', 'message': str(e)}), 500
+
+@async_app.route('/todo', methods=['POST'])
+@authenticate
+async def add_todo(user):
+    todo_data = build_todo_body(await request.get_json(), user["email"])
+    error_body = todo_error_body(todo_data)
+    if error_body:
+        return jsonify(error_body), 400
+
+    todo_ref = db.collection('todos').document()
+    batch = db.batch()
+    batch.set(todo_ref, todo_data)
+    collection_versions.bump(batch, sync_api.todos_marker(user))
+    await batch.commit()
+    # The Flask app's todo cache is in this process too
+    sync_api.todo_cache.invalidate(todo_ref)
+    return jsonify({'message': 'Todo added successfully'}), 200
+
+@async_app.route('/todo', methods=['GET'])
+@authenticate
+async def get_todos(user):
+    try:
+        query = user_todos_query(db.collection('todos'), user["email"], request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if wants_stream():
+        return stream_documents(query.stream())
+
+    version = await collection_versions.get_async(sync_api.todos_marker(user))
+    etag = make_etag('todos', version, user["email"], request.full_path)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    todos = [with_id(todo) async for todo in query.stream()]
+    return sync_api.with_etag(jsonify({'todos': todos}), etag), 200
+
+@async_app.route('/todo/<todo_id>', methods=['GET'])
+@authenticate
+async def get_todo(user, todo_id):
+    todo = await db.collection('todos').document(todo_id).get()
+    if sync_api.owns_todo(todo.to_dict(), user):
+        etag = make_etag(todo.id, todo.update_time)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        return sync_api.with_etag(jsonify(todo.to_dict()), etag), 200
+    return jsonify({'message': 'Todo not found'}), 404
+
+@async_app.route('/todo/<todo_id>', methods=['DELETE'])
+@authenticate
+async def delete_todo(user, todo_id):
+    todo_ref = db.collection('todos').document(todo_id)
+    # The owner's version marker is bumped, so only the owner may delete, see app.py
+    todo = await todo_ref.get()
+    if not todo.exists:
+        return jsonify({'message': 'Todo deleted successfully'}), 200
+    if not sync_api.owns_todo(todo.to_dict(), user):
+        return jsonify({'message': 'Todo not found'}), 404
+    batch = db.batch()
+    batch.delete(todo_ref)
+    collection_versions.bump(batch, sync_api.todos_marker(user))
+    await batch.commit()
+    sync_api.todo_cache.invalidate(todo_ref)
+    return jsonify({'message': 'Todo deleted successfully'}), 200
+
+## Everything else is served by the Flask app
+# asgiref runs every WSGI request on one shared thread by default, these get a pool like the sync server's
+flask_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('THREADS', 8)), thread_name_prefix='flask')
+
+class _ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False, executor=flask_executor
+    )
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+flask_app = ThreadedWsgiToAsgi(sync_api.app)
+async_routes = async_app.url_map.bind('localhost')
+
+def served_async(scope):
+    try:
+        async_routes.match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return False
+    # Run once per key needs the idempotency records of app.py
+    return not any(name == b'idempotency-key' for name, _ in scope['headers'])
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http' and not served_async(scope):
+        await flask_app(scope, receive, send)
+    else:
+        # async_app also handles the lifespan events
+        await async_app(scope, receive, send)
+
+port = int(os.environ.get('PORT', 8080))
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=port)
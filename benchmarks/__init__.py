@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+
+# Local benchmarks, run them from the repository root e.g. python -m benchmarks.validation_bench
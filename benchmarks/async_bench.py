@@ -0,0 +1,27 @@
+# benchmarks/async_bench.py
+
+# Compares the sync (gunicorn gthread, as in the Dockerfile) and async (uvicorn worker) serving modes
+# under the same workload, both booted against the local stand-ins with simulated upstream latency.
+# python -m benchmarks.async_bench [--concurrency 200] [--requests 2000]
+import argparse
+import sys
+
+from benchmarks.suite import main as run_suite
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async serving mode')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--firestore-latency', type=float, default=0.1)
+    parser.add_argument('--auth-latency', type=float, default=0.1)
+    args = parser.parse_args()
+    return run_suite([
+        '--workload', 'mixed', '--mode', 'sync,async',
+        '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+        '--firestore-latency', str(args.firestore_latency), '--auth-latency', str(args.auth_latency),
+    ])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# benchmarks/auth_client_bench.py
+
+# Sign-in latency through a fresh connection per call (what pyrebase does) vs the shared keep-alive
+# pool of identity_toolkit.IdentityToolkit, against the stand-in Identity Toolkit server.
+# python -m benchmarks.auth_client_bench [--tls] [--threads 8] [--requests 1000] [--latency 0.005]
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+from benchmarks.load_test import summarize
+from identity_toolkit import IdentityToolkit, pooled_session
+from standins import IdentityToolkitServer, TokenIssuer
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'bench-password'
+
+
+class PerCallSession:
+    """Module level requests.post, a new connection (and TLS handshake) for every call."""
+
+    def __init__(self, verify=True):
+        self.verify = verify
+
+    def post(self, url, **kwargs):
+        return requests.post(url, verify=self.verify, **kwargs)
+
+
+def run(client, total, threads):
+    latencies = []
+    errors = []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        for _ in counter:
+            start = time.perf_counter()
+            try:
+                client.sign_in_with_email_and_password(EMAIL, PASSWORD)
+                failed = False
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors.append(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, len(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-call vs pooled Identity Toolkit client')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the stand-in adds to every call')
+    parser.add_argument('--tls', action='store_true', help='serve the stand-in over HTTPS')
+    args = parser.parse_args()
+
+    issuer = TokenIssuer('surefix-bench')
+    with IdentityToolkitServer(issuer, latency=args.latency, tls=args.tls) as server:
+        server.add_user(EMAIL, PASSWORD)
+        base_url = server.url + 'v1'
+        verify = server.cert_file or True
+
+        per_call = IdentityToolkit('bench-key', base_url=base_url, session=PerCallSession(verify))
+        session = pooled_session(args.threads)
+        # REQUESTS_CA_BUNDLE would take precedence over session.verify
+        session.trust_env = False
+        session.verify = verify
+        pooled = IdentityToolkit('bench-key', base_url=base_url, session=session)
+
+        results = {"tls": args.tls, "threads": args.threads}
+        for name, client in (("per_call", per_call), ("pooled", pooled)):
+            run(client, min(50, args.requests), args.threads)  # warm-up
+            results[name] = run(client, args.requests, args.threads)
+        pooled.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
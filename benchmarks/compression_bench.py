@@ -0,0 +1,58 @@
+# benchmarks/compression_bench.py
+
+# Bytes on the wire and CPU per request for GET /services sized payloads, uncompressed, gzip and
+# brotli at a few levels, and for a compressed-body cache hit
+# python -m benchmarks.compression_bench [--sizes 10,100,500,1000] [--iterations 50]
+import argparse
+import json
+import time
+
+from benchmarks.samples import service_document
+from cache import TTLCache
+from compression import brotli, brotli_compress, gzip_compress
+
+
+def cpu_us(fn, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return round((time.process_time() - start) / iterations * 1e6, 1)
+
+
+def payload(count):
+    services = [{"id": f"svc-{i}", **service_document(i)} for i in range(count)]
+    return json.dumps({"services": services, "next_page_token": None}).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Response compression bytes and CPU per request')
+    parser.add_argument('--sizes', default='10,100,500,1000', help='services per response')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    encoders = {f"gzip-{level}": (lambda data, level=level: gzip_compress(data, level)) for level in (1, 6, 9)}
+    if brotli is not None:
+        encoders.update({f"br-{quality}": (lambda data, quality=quality: brotli_compress(data, quality))
+                         for quality in (1, 4, 11)})
+
+    results = {"brotli_available": brotli is not None}
+    for count in (int(size) for size in args.sizes.split(',')):
+        data = payload(count)
+        row = {"identity": {"bytes": len(data)}}
+        for name, encode in encoders.items():
+            body = encode(data)
+            iterations = max(1, args.iterations // 10) if name == 'br-11' else args.iterations
+            row[name] = {
+                "bytes": len(body),
+                "ratio": round(len(data) / len(body), 1),
+                "cpu_us": cpu_us(lambda: encode(data), iterations),
+            }
+        cache = TTLCache(maxsize=16)
+        cache.set(('etag', 'gzip'), gzip_compress(data, 6))
+        row["cache_hit"] = {"cpu_us": cpu_us(lambda: cache.get(('etag', 'gzip')), args.iterations * 100)}
+        results[f"{count}_services"] = row
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
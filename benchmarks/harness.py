@@ -0,0 +1,75 @@
+# benchmarks/harness.py
+
+# Boots the local stand-ins and the API (sync or async) in a gunicorn subprocess wired to them
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from firebaseConfig import config
+from standins import KeyServer, TokenIssuer
+from standins.identity_toolkit import IdentityToolkitServer
+
+# Same server settings as the Dockerfile
+MODES = {
+    "sync": ['--workers', '1', '--threads', '8', 'benchmarks.standin_server:sync_app()'],
+    "async": ['--workers', '1', '--worker-class', 'uvicorn.workers.UvicornWorker', 'benchmarks.standin_server:async_app()'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with {process.returncode}')
+        try:
+            httpx.post(url + '/login', json={}, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {url} did not start')
+
+
+@contextlib.contextmanager
+def standins(auth_latency=0.0):
+    """Yields (issuer, key_server, identity_server), all started."""
+    issuer = TokenIssuer(config['projectId'])
+    with KeyServer(issuer) as key_server, IdentityToolkitServer(issuer, latency=auth_latency) as identity_server:
+        yield issuer, key_server, identity_server
+
+
+@contextlib.contextmanager
+def serve(mode, key_server, identity_server, firestore='memory', firestore_latency=0.0, extra_env=None):
+    """Runs the API in a subprocess against the stand-ins and yields its base URL."""
+    # The load comes from one client IP and user, rate limits stay off unless set in the environment
+    unlimited = {'RATE_LIMIT_LOGIN': '0', 'RATE_LIMIT_SIGNUP': '0', 'RATE_LIMIT_USER': '0'}
+    env = dict(
+        {**unlimited, **os.environ},
+        FIREBASE_CERTS_URL=key_server.url,
+        BENCH_AUTH_URL=identity_server.url,
+        BENCH_FIRESTORE=firestore,
+        BENCH_FIRESTORE_LATENCY=str(firestore_latency),
+        **(extra_env or {})
+    )
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'] + MODES[mode],
+        env=env
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(url, process)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,88 @@
+# benchmarks/load_test.py
+
+# Closed-loop HTTP load generator, ``concurrency`` clients each send requests back to back
+# python -m benchmarks.load_test --url http://127.0.0.1:8080 --path /services --token <id token>
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+    }
+
+
+async def run_load(base_url, make_request, total, concurrency, timeout=60):
+    """Send ``total`` requests, ``make_request(i)`` returns (route, method, path, kwargs).
+
+    Returns {route: summary} plus an "all" entry.
+    """
+    latencies = {}
+    errors = {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            for i in counter:
+                route, method, path, kwargs = make_request(i)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies.setdefault(route, []).append(time.perf_counter() - start)
+                if failed:
+                    errors[route] = errors.get(route, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    results = {route: summarize(values, elapsed, errors.get(route, 0)) for route, values in latencies.items()}
+    results["all"] = summarize([v for values in latencies.values() for v in values], elapsed, sum(errors.values()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP load generator')
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--path', default='/services')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--token')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    results = asyncio.run(run_load(
+        args.url,
+        lambda i: (f'{args.method} {args.path}', args.method, args.path, {'headers': headers}),
+        args.requests,
+        args.concurrency
+    ))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/samples.py
+
+# Realistic documents matching the API schemas
+import random
+import time
+
+
+def service_document(i=0, comments=3):
+    rng = random.Random(i)
+    return {
+        "sf_id": f"SF-{100000 + i}",
+        "channel": rng.choice(["web", "phone", "whatsapp", "walk-in"]),
+        "contact_details": {
+            "first_name": rng.choice(["Ayesha", "Bilal", "Sara", "Omar", "Priya"]),
+            "last_name": rng.choice(["Khan", "Ahmed", "Sharma", "Malik"]),
+            "contact_numbers": {
+                "primary": {"country_code": 91, "number": 9000000000 + i, "verified": True, "whatsapp": True},
+                "secondary": {"country_code": 91, "number": 8000000000 + i, "verified": False, "whatsapp": False},
+            },
+            "email": f"customer{i}@example.com",
+            "pickup_address": {
+                "address": f"{i} MG Road",
+                "city": rng.choice(["Mumbai", "Delhi", "Bengaluru", "Pune"]),
+                "state": "MH",
+                "pincode": 400000 + rng.randrange(1000),
+                "google_location": "https://maps.google.com/?q=19.07,72.87",
+            },
+            "use_differant_delivery_address": False,
+            "delivery_address": {
+                "address": f"{i} MG Road",
+                "city": "Mumbai",
+                "state": "MH",
+                "pincode": 400001,
+                "google_location": "https://maps.google.com/?q=19.07,72.87",
+            },
+        },
+        "machine_details": {
+            "item_brand": rng.choice(["Bosch", "LG", "Samsung", "Whirlpool"]),
+            "model": f"M-{rng.randrange(1000)}",
+            "item_category": rng.choice(["washing machine", "refrigerator", "microwave"]),
+            "year_of_purchase": 2015 + rng.randrange(9),
+        },
+        "issue_message_from_customer": "Drum does not spin and there is a burning smell after the rinse cycle.",
+        "admin_comments": [
+            {"timestamp": "2024-03-01 10:00:00", "user": "admin@surefix.in", "message": f"Follow up call {n}"}
+            for n in range(comments)
+        ],
+        "delivery_note": "Call before delivery",
+        "pickup_details": {"pickup_note": "Lift available"},
+        "self_logistics": rng.random() < 0.3,
+    }
+
+
+def todo_document(i=0, email="bench@example.com"):
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "title": f"Todo {i}",
+        "description": "Benchmark todo",
+        "createdAt": now,
+        "updatedAt": now,
+        "createdBy": email,
+        "isCompleted": i % 2 == 0,
+        "activated": True,
+    }
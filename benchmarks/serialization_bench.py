@@ -0,0 +1,67 @@
+# benchmarks/serialization_bench.py
+
+# jsonify cost of GET /services sized responses with Flask's stdlib provider vs the orjson backed
+# json_provider.FastJSONProvider, over SERVICE_SCHEMA documents carrying Firestore timestamps
+# python -m benchmarks.serialization_bench [--sizes 10,100,500] [--iterations 50]
+import argparse
+import datetime
+import json
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+import json_provider
+from benchmarks.samples import service_document
+from json_provider import FastJSONProvider
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    # same Firestore encoding, stdlib encoder
+    default = staticmethod(FastJSONProvider.default)
+
+
+def payload(count):
+    created = DatetimeWithNanoseconds(2024, 1, 2, 3, 4, 5, nanosecond=123456789, tzinfo=datetime.timezone.utc)
+    services = [{"id": f"svc-{i}", "created_at": created, **service_document(i)} for i in range(count)]
+    return {"services": services, "next_page_token": None}
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='jsonify cost, stdlib vs orjson')
+    parser.add_argument('--sizes', default='10,100,500', help='services per response')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {"stdlib": StdlibJSONProvider(app)}
+    if json_provider.orjson is not None:
+        providers["orjson"] = FastJSONProvider(app)
+
+    results = {}
+    with app.app_context():
+        for count in (int(size) for size in args.sizes.split(',')):
+            body = payload(count)
+            row = {}
+            for name, provider in providers.items():
+                row[name] = {
+                    "bytes": len(provider.response(body).get_data()),
+                    "jsonify_us": per_call_us(lambda: provider.response(body), args.iterations),
+                    "loads_us": per_call_us(lambda: provider.loads(provider.dumps(body)), args.iterations),
+                }
+            if "orjson" in row:
+                row["speedup"] = round(row["stdlib"]["jsonify_us"] / row["orjson"]["jsonify_us"], 1)
+            results[f"{count}_services"] = row
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/standin_server.py
+
+# App factories that boot app.py / asgi.py against the local stand-ins instead of live Firebase,
+# for gunicorn's factory syntax e.g.
+#   gunicorn --threads 8 'benchmarks.standin_server:sync_app()'
+# Configured through the environment (benchmarks/harness.py sets these):
+#   FIREBASE_CERTS_URL         key server of the stand-in token issuer
+#   BENCH_AUTH_URL             stand-in Identity Toolkit server
+#   BENCH_FIRESTORE            "memory" (default) for the in-memory fake, "emulator" to use the
+#                              Firestore emulator at FIRESTORE_EMULATOR_HOST
+#   BENCH_FIRESTORE_LATENCY    seconds added to every in-memory Firestore RPC (default 0)
+#   BENCH_SEED_SERVICES / BENCH_SEED_TODOS   documents created at boot (default 200 / 50)
+#   BENCH_USER_EMAIL           owner of the seeded todos
+import os
+
+from benchmarks.samples import service_document, todo_document
+from standins.firestore import AsyncInMemoryFirestore, InMemoryFirestore
+
+FIRESTORE = os.environ.get('BENCH_FIRESTORE', 'memory')
+FIRESTORE_LATENCY = float(os.environ.get('BENCH_FIRESTORE_LATENCY', 0))
+USER_EMAIL = os.environ.get('BENCH_USER_EMAIL', 'bench@example.com')
+
+
+def seed(db):
+    services = int(os.environ.get('BENCH_SEED_SERVICES', 200))
+    todos = int(os.environ.get('BENCH_SEED_TODOS', 50))
+    for start in range(0, services, 500):
+        batch = db.batch()
+        for i in range(start, min(services, start + 500)):
+            batch.set(db.collection('service').document(f'service-{i:05d}'), service_document(i))
+        batch.commit()
+    batch = db.batch()
+    for i in range(todos):
+        batch.set(db.collection('todos').document(f'todo-{i:05d}'), todo_document(i, USER_EMAIL))
+    batch.commit()
+
+
+def use_standins(module, db):
+    # Points app.py at the stand-ins, asgi.py hands every route it doesn't serve to it
+    if FIRESTORE == 'memory':
+        module.db = db
+        module.user_Ref = db.collection('user')
+        module.todo_ref = db.collection('todos')
+        module.service_ref = db.collection('service')
+    module.auth.resolve().base_url = os.environ['BENCH_AUTH_URL'] + 'v1'
+
+
+def sync_app():
+    import app as module
+
+    use_standins(module, InMemoryFirestore())
+    seed(module.db)
+    if FIRESTORE == 'memory':
+        module.db.latency = FIRESTORE_LATENCY
+    return module.app
+
+
+def async_app():
+    import app as sync_module
+    import asgi as module
+
+    if FIRESTORE == 'memory':
+        module.db = AsyncInMemoryFirestore()
+        use_standins(sync_module, InMemoryFirestore(store=module.db._store))
+        seed(sync_module.db)
+        module.db.latency = sync_module.db.latency = FIRESTORE_LATENCY
+    else:
+        use_standins(sync_module, None)
+        from firebase_admin import firestore
+        seed(firestore.client())
+    module.auth.base_url = os.environ['BENCH_AUTH_URL'] + 'v1'
+    return module.app
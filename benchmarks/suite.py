@@ -0,0 +1,139 @@
+# benchmarks/suite.py
+
+# Scripted workloads against the API booted on local stand-ins, reported per route as JSON.
+# python -m benchmarks --workload mixed --concurrency 50 --requests 2000 [--output result.json]
+# python -m benchmarks --baseline result.json    exits with status 1 on a regression
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import uuid
+
+from benchmarks.harness import serve, standins
+from benchmarks.load_test import run_load
+from benchmarks.samples import service_document
+from benchmarks.standin_server import USER_EMAIL
+
+PASSWORD = 'bench-password'
+SEEDED_TODOS = 50
+
+
+def signup(i, headers):
+    body = {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": PASSWORD, "displayName": "Bench"}
+    return 'POST /signup', 'POST', '/signup', {'json': body}
+
+
+def login(i, headers):
+    return 'POST /login', 'POST', '/login', {'json': {"email": USER_EMAIL, "password": PASSWORD}}
+
+
+def create_service(i, headers):
+    return 'POST /create-service', 'POST', '/create-service', {'json': service_document(i), 'headers': headers}
+
+
+def list_services(i, headers):
+    return 'GET /services', 'GET', '/services?limit=20', {'headers': headers}
+
+
+def create_todo(i, headers):
+    return 'POST /todo', 'POST', '/todo', {'json': {"title": f"Bench {i}"}, 'headers': headers}
+
+
+def list_todos(i, headers):
+    return 'GET /todo', 'GET', '/todo', {'headers': headers}
+
+
+def get_todo(i, headers):
+    return 'GET /todo/<todo_id>', 'GET', f'/todo/todo-{i % SEEDED_TODOS:05d}', {'headers': headers}
+
+
+def delete_todo(i, headers):
+    return 'DELETE /todo/<todo_id>', 'DELETE', f'/todo/bench-delete-{i}', {'headers': headers}
+
+
+# name -> [(weight, operation)]
+WORKLOADS = {
+    "mixed": [(1, signup), (2, login), (2, create_service), (4, list_services),
+              (2, create_todo), (3, list_todos), (5, get_todo), (1, delete_todo)],
+    "auth": [(1, signup), (3, login)],
+    "services": [(1, create_service), (3, list_services)],
+    "todos": [(1, create_todo), (2, list_todos), (3, get_todo), (1, delete_todo)],
+    "signup": [(1, signup)],
+    "login": [(1, login)],
+    "create-service": [(1, create_service)],
+    "list-services": [(1, list_services)],
+}
+
+
+def make_requests(workload, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    schedule = list(itertools.chain.from_iterable([operation] * weight for weight, operation in WORKLOADS[workload]))
+    return lambda i: schedule[i % len(schedule)](i, headers)
+
+
+def regressions(baseline, current, tolerance):
+    found = []
+    for mode, routes in current["results"].items():
+        for route, stats in routes.items():
+            before = baseline.get("results", {}).get(mode, {}).get(route)
+            if not before or not before.get("p95_ms") or not stats.get("p95_ms"):
+                continue
+            if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append({"mode": mode, "route": route, "metric": "p95_ms",
+                              "baseline": before["p95_ms"], "current": stats["p95_ms"]})
+            if stats["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                found.append({"mode": mode, "route": route, "metric": "throughput_rps",
+                              "baseline": before["throughput_rps"], "current": stats["throughput_rps"]})
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Load benchmarks against local stand-ins')
+    parser.add_argument('--workload', choices=sorted(WORKLOADS), default='mixed')
+    parser.add_argument('--mode', default='sync', help='sync, async or a comma separated list')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--firestore', choices=['memory', 'emulator'], default='memory',
+                        help='emulator uses the Firestore emulator at FIRESTORE_EMULATOR_HOST')
+    parser.add_argument('--firestore-latency', type=float, default=0.0, help='seconds per in-memory Firestore RPC')
+    parser.add_argument('--auth-latency', type=float, default=0.0, help='seconds per Identity Toolkit call')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', help='also write the results to this file')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with standins(auth_latency=args.auth_latency) as (issuer, key_server, identity_server):
+        user = identity_server.add_user(USER_EMAIL, PASSWORD, display_name='Bench')
+        token = issuer.mint(user["localId"], USER_EMAIL)
+        for mode in args.mode.split(','):
+            with serve(mode, key_server, identity_server, args.firestore, args.firestore_latency) as url:
+                make_request = make_requests(args.workload, token)
+                asyncio.run(run_load(url, make_request, args.warmup, 1))
+                results[mode] = asyncio.run(run_load(url, make_request, args.requests, args.concurrency))
+
+    report = {
+        "workload": args.workload,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "firestore": args.firestore,
+        "firestore_latency_s": args.firestore_latency,
+        "auth_latency_s": args.auth_latency,
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = regressions(json.load(f), report, args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# benchmarks/validation_bench.py
+
+# Per-request validation cost of jsonschema.validate() against the precompiled validators
+# python -m benchmarks.validation_bench [--iterations N]
+import argparse
+import json
+import time
+
+from jsonschema import ValidationError, validate
+
+from benchmarks.samples import service_document, todo_document
+from schemas import SERVICE_SCHEMA, TODO_SCHEMA
+from validators import SERVICE_VALIDATOR, TODO_VALIDATOR, validation_errors
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def validate_per_request(instance, schema):
+    try:
+        validate(instance=instance, schema=schema)
+    except ValidationError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = {
+        "service": (service_document(1), SERVICE_SCHEMA, SERVICE_VALIDATOR),
+        "service_invalid": ({**service_document(2), "sf_id": 5, "self_logistics": "no"}, SERVICE_SCHEMA, SERVICE_VALIDATOR),
+        "todo": (todo_document(1), TODO_SCHEMA, TODO_VALIDATOR),
+    }
+    results = {}
+    for name, (instance, schema, validator) in cases.items():
+        before = per_call_us(lambda: validate_per_request(instance, schema), args.iterations)
+        after = per_call_us(lambda: validation_errors(validator, instance), args.iterations)
+        results[name] = {
+            "validate_us": round(before, 2),
+            "precompiled_us": round(after, 2),
+            "speedup": round(before / after, 2),
+        }
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
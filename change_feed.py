@@ -0,0 +1,149 @@
+# change_feed.py
+
+# Change feed of the service collection for GET /services/changes. One snapshot listener per
+# process turns added / modified / removed documents into numbered events kept in a ring buffer,
+# and every connected Server-Sent Events stream reads from that buffer. Event ids carry a per
+# process epoch, a client reconnecting with a Last-Event-ID the buffer still covers gets the events
+# it missed, any other id (another instance, an older process, too far behind) gets a reset event.
+# If the listen stream fails for good, the feed subscribes again and, as changes in between were
+# missed, sends every stream a reset event once the new listener has its first snapshot.
+import itertools
+import secrets
+import threading
+import time
+from collections import deque
+
+
+class ChangeFeedNotReady(Exception):
+    pass
+
+
+class ChangeEvent:
+    # type 'reset' (no doc_id) marks changes that were missed
+    __slots__ = ('seq', 'type', 'doc_id', 'data', '_message')
+
+    def __init__(self, seq, type, doc_id, data):
+        self.seq = seq
+        self.type = type
+        self.doc_id = doc_id
+        self.data = data
+        self._message = None
+
+    def message(self, epoch, dumps):
+        # Serialized once, however many streams send it
+        if self._message is None:
+            payload = {"type": self.type} if self.doc_id is None else {"id": self.doc_id, "type": self.type}
+            if self.data is not None:
+                payload["data"] = self.data
+            self._message = f'id: {epoch}-{self.seq}\nevent: {self.type}\ndata: {dumps(payload)}\n\n'
+        return self._message
+
+
+class ChangeFeed:
+    def __init__(self, collection_factory, buffer_size=1000, ready_timeout=10):
+        self.collection_factory = collection_factory
+        self.ready_timeout = ready_timeout
+        self.epoch = secrets.token_hex(4)
+        self._events = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._changed = threading.Condition()
+        self._ready = threading.Event()
+        self._watch = None
+        self._synced = False  # the current watch delivered its first snapshot
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.ensure_listening()
+        if not self._ready.wait(self.ready_timeout):
+            raise ChangeFeedNotReady('Change feed is still starting, retry shortly')
+
+    def ensure_listening(self):
+        """Subscribes, or subscribes again when the listen stream has failed for good."""
+        with self._lock:
+            if self._watch is not None and not self._watch.is_active:
+                # The client gave up on the stream, no more snapshots would arrive
+                self._watch.unsubscribe()
+                self._watch = None
+            if self._watch is None:
+                with self._changed:
+                    self._synced = False
+                self._watch = self.collection_factory().on_snapshot(self._on_snapshot)
+
+    def close(self):
+        with self._lock:
+            watch, self._watch = self._watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        with self._changed:
+            if not self._synced:
+                # The first snapshot lists every existing document, it is the baseline, not a change
+                self._synced = True
+                if self._ready.is_set():
+                    # A new listener after a failed one, what changed in between is unknown
+                    self._seq += 1
+                    self._events.append(ChangeEvent(self._seq, 'reset', None, None))
+                    self._changed.notify_all()
+                self._ready.set()
+                return
+            for change in changes:
+                self._seq += 1
+                kind = change.type.name.lower()
+                data = None if kind == 'removed' else change.document.to_dict()
+                self._events.append(ChangeEvent(self._seq, kind, change.document.id, data))
+            self._changed.notify_all()
+
+    def resume_from(self, last_event_id):
+        """Sequence number to continue after, None when ``last_event_id`` can't be resumed here."""
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._changed:
+            oldest = self._events[0].seq if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return None
+        return seq
+
+    def current(self):
+        with self._changed:
+            return self._seq
+
+    def wait(self, after, timeout):
+        """Events after sequence number ``after``, waiting up to ``timeout`` seconds for the first."""
+        with self._changed:
+            if self._seq <= after:
+                self._changed.wait(timeout)
+            if self._seq <= after:
+                return []
+            # The newest events are at the right, skip the ones the caller has seen
+            missed = min(self._seq - after, len(self._events))
+            return list(itertools.islice(self._events, len(self._events) - missed, None))
+
+    def stream(self, after, dumps, max_age=300, keepalive=15, retry=3000):
+        """Server-Sent Events text for everything after ``after``, for up to ``max_age`` seconds."""
+        deadline = time.monotonic() + max_age
+        yield f'retry: {retry}\n\n'
+        if after is None:
+            after = self.current()
+            yield f'id: {self.epoch}-{after}\nevent: reset\ndata: {dumps({"type": "reset"})}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # The client reconnects with its Last-Event-ID (and a fresh token)
+                return
+            try:
+                self.ensure_listening()
+            except Exception:
+                # Subscribing failed, the client reconnects (and gets a reset if it can't resume)
+                return
+            events = self.wait(after, min(keepalive, remaining))
+            if events and events[0].seq > after + 1:
+                # Fell further behind than the buffer holds
+                yield f'event: reset\ndata: {dumps({"type": "reset"})}\n\n'
+            if events:
+                after = events[-1].seq
+                yield ''.join(event.message(self.epoch, dumps) for event in events)
+            else:
+                yield ': keepalive\n\n'
@@ -0,0 +1,82 @@
+# compression.py
+
+# Negotiated gzip / brotli response compression. Bodies under a minimum size go out as they are,
+# and compressed bodies of responses with an ETag (the hot list responses) are cached by ETag so
+# repeat requests skip the compression CPU. Brotli is used when the Brotli package is installed.
+import gzip
+import os
+
+from flask import request
+
+from cache import TTLCache
+from metrics import stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript'}
+
+
+def gzip_compress(data, level):
+    # mtime=0 keeps the output the same for the same input
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def brotli_compress(data, level):
+    return brotli.compress(data, quality=level)
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4, cache_size=256):
+        self.min_size = min_size
+        self.encoders = {}
+        # Preference order when the client accepts several at the same quality
+        if brotli is not None:
+            self.encoders['br'] = lambda data: brotli_compress(data, brotli_quality)
+        self.encoders['gzip'] = lambda data: gzip_compress(data, gzip_level)
+        self.cache = TTLCache(maxsize=cache_size) if cache_size else None
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    def negotiate(self):
+        return request.accept_encodings.best_match(list(self.encoders))
+
+    def compress_response(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag and self.cache is not None else None
+        body = self.cache.get(key) if key else None
+        if body is None:
+            with stage('compress'):
+                body = self.encoders[encoding](data)
+            if key:
+                self.cache.set(key, body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # The encoded body is a different representation, a weak ETag still matches If-None-Match
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def from_environ():
+    return Compressor(
+        min_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+        gzip_level=int(os.environ.get('GZIP_LEVEL', 6)),
+        brotli_quality=int(os.environ.get('BROTLI_QUALITY', 4)),
+        cache_size=int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+    )
@@ -0,0 +1,153 @@
+# doc_cache.py
+
+# Read-through cache of single Firestore documents. Entries are filled on read and invalidated by
+# the API's own writes; with ``listen`` enabled, hot documents are also kept current through
+# on_snapshot listeners so writes made by other instances show up too. With a SingleFlight, concurrent
+# misses for the same document share one read. A read still running when its document is invalidated
+# is not stored, it may have seen the document from before the write.
+import threading
+from collections import OrderedDict
+
+
+class CachedDocument:
+    def __init__(self, doc_id, data, update_time):
+        self.id = doc_id
+        self.data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self.data is not None
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.id, snapshot.to_dict() if snapshot.exists else None, snapshot.update_time)
+
+
+class DocumentCache:
+    def __init__(self, backend, ttl=30, listen=False, max_listeners=100, flight=None):
+        self.backend = backend
+        self.flight = flight
+        self.ttl = ttl
+        self.listen = listen
+        self.max_listeners = max_listeners
+        self._watches = OrderedDict()
+        self._loads = {}  # path -> [generation, reads running], only while reads are running
+        self._lock = threading.Lock()
+
+    def get(self, doc_ref):
+        cached = self.backend.get(doc_ref.path)
+        if cached is not None:
+            if self.listen:
+                self._touch(doc_ref.path)
+            return cached
+
+        if self.flight is not None:
+            return self.flight.do(doc_ref.path, lambda: self._load(doc_ref))
+        return self._load(doc_ref)
+
+    def _load(self, doc_ref):
+        generation = self._start_load(doc_ref.path)
+        try:
+            document = CachedDocument.from_snapshot(doc_ref.get())
+        except Exception:
+            self._finish_load(doc_ref, generation)
+            raise
+        return self._finish_load(doc_ref, generation, document)
+
+    def _start_load(self, path):
+        with self._lock:
+            load = self._loads.setdefault(path, [0, 0])
+            load[1] += 1
+            return load[0]
+
+    def _finish_load(self, doc_ref, generation, document=None):
+        """Stores ``document`` unless the path was invalidated after its read started."""
+        # Watched documents are kept current by their listener, they don't need to expire
+        watched = self.listen and document is not None and document.exists
+        with self._lock:
+            load = self._loads[doc_ref.path]
+            load[1] -= 1
+            if not load[1]:
+                del self._loads[doc_ref.path]
+            store = document is not None and load[0] == generation
+            if store:
+                # Under the lock, so an invalidate() either drops the read or deletes what it stored
+                self.backend.set(doc_ref.path, document, ttl=None if watched else self.ttl)
+        if store and watched:
+            self._watch(doc_ref)
+        return document
+
+    def get_many(self, doc_refs, get_all):
+        """CachedDocuments by path, the misses are read together through ``get_all(refs)``."""
+        documents = {}
+        misses = []
+        for doc_ref in doc_refs:
+            cached = self.backend.get(doc_ref.path)
+            if cached is None:
+                misses.append(doc_ref)
+                continue
+            if self.listen:
+                self._touch(doc_ref.path)
+            documents[doc_ref.path] = cached
+        if not misses:
+            return documents
+        generations = {doc_ref.path: self._start_load(doc_ref.path) for doc_ref in misses}
+        try:
+            for snapshot in get_all(misses):
+                path = snapshot.reference.path
+                documents[path] = self._finish_load(snapshot.reference, generations.pop(path), CachedDocument.from_snapshot(snapshot))
+        finally:
+            for doc_ref in misses:
+                if doc_ref.path in generations:
+                    self._finish_load(doc_ref, generations.pop(doc_ref.path))
+        return documents
+
+    def invalidate(self, doc_ref):
+        with self._lock:
+            load = self._loads.get(doc_ref.path)
+            if load is not None:
+                # Reads already running may have seen the document from before the write
+                load[0] += 1
+        if self.flight is not None:
+            self.flight.forget(doc_ref.path)
+        self.backend.delete(doc_ref.path)
+
+    def _touch(self, path):
+        with self._lock:
+            if path in self._watches:
+                self._watches.move_to_end(path)
+
+    def _watch(self, doc_ref):
+        with self._lock:
+            if doc_ref.path in self._watches:
+                return
+            evicted = []
+            while len(self._watches) >= self.max_listeners:
+                evicted.append(self._watches.popitem(last=False))
+            self._watches[doc_ref.path] = None
+
+        for path, watch in evicted:
+            if watch is not None:
+                watch.unsubscribe()
+            self.backend.delete(path)
+
+        def on_snapshot(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                document = CachedDocument.from_snapshot(snapshot)
+                self.backend.set(doc_ref.path, document, ttl=None if document.exists else self.ttl)
+
+        watch = doc_ref.on_snapshot(on_snapshot)
+        with self._lock:
+            if doc_ref.path in self._watches:
+                self._watches[doc_ref.path] = watch
+                return
+        # Evicted while subscribing
+        watch.unsubscribe()
+
+    def close(self):
+        with self._lock:
+            watches, self._watches = list(self._watches.values()), OrderedDict()
+        for watch in watches:
+            if watch is not None:
+                watch.unsubscribe()
@@ -0,0 +1,315 @@
+# helpers.py
+
+# Request parsing and document shaping shared by the sync (app.py) and async (asgi.py) apps
+import base64
+import json
+import math
+import os
+import time
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Pagination
+DOCUMENT_ID = '__name__'
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be greater than 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+# Page tokens are opaque to clients, they only carry the id of the last document served
+def encode_page_token(doc_id):
+    raw = json.dumps({"after": doc_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_token(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        doc_id = json.loads(raw)["after"]
+    except Exception:
+        raise ValueError('Invalid page_token')
+    if not isinstance(doc_id, str) or not doc_id:
+        raise ValueError('Invalid page_token')
+    return doc_id
+
+def with_id(doc):
+    return {**doc.to_dict(), "id": doc.id}
+
+def page_of(docs, limit):
+    """(documents, next_page_token) from a query run with limit + 1, the extra one tells there is another page."""
+    next_page_token = encode_page_token(docs[limit - 1].id) if len(docs) > limit else None
+    return [with_id(doc) for doc in docs[:limit]], next_page_token
+
+# Walk a dotted field path through the nested "properties" of a schema
+def resolve_schema_path(schema, field_path):
+    for part in field_path.split('.'):
+        schema = schema.get('properties', {}).get(part)
+        if schema is None:
+            return None
+    return schema
+
+def parse_fields(value, schema):
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError('fields must be a comma separated string')
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if resolve_schema_path(schema, field) is None]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+# Partial updates (PATCH). The body is a partial document nested like the stored one, each of its
+# leaves is one field path of the update, or update_mask lists the field paths to take from it.
+_MISSING = object()
+
+class FieldErrors(ValueError):
+    """Invalid request body, ``errors`` are in the shape of validators.validation_errors."""
+
+    def __init__(self, errors):
+        super().__init__('Invalid request body')
+        self.errors = errors
+
+def dotted_key_errors(body, prefix=''):
+    # A '.' in a key would be read as a nested field path, nested values are sent as objects instead
+    errors = []
+    for key, value in body.items():
+        path = prefix + key
+        if '.' in key:
+            errors.append({"path": path, "message": "Field names can't contain '.', send nested fields as objects"})
+        elif isinstance(value, dict):
+            errors.extend(dotted_key_errors(value, path + '.'))
+    return errors
+
+def patch_field_paths(body, schema, prefix=''):
+    paths = []
+    for key, value in body.items():
+        path = prefix + key
+        field_schema = resolve_schema_path(schema, path)
+        if field_schema is None:
+            raise ValueError(f"Unknown field: {path}")
+        if isinstance(value, dict) and value and 'properties' in field_schema:
+            paths.extend(patch_field_paths(value, schema, path + '.'))
+        else:
+            paths.append(path)
+    return paths
+
+def parse_patch(body, schema, update_mask=None, append_fields=(), read_only=()):
+    """(updates, appends) keyed by field path, appends are the lists to add to the append_fields arrays."""
+    if not isinstance(body, dict) or not body:
+        raise ValueError('Request body must be a non-empty JSON object')
+    errors = dotted_key_errors(body)
+    if errors:
+        raise FieldErrors(errors)
+    paths = parse_fields(update_mask, schema) if update_mask else patch_field_paths(body, schema)
+    if not paths:
+        raise ValueError('Nothing to update')
+    updates = {}
+    appends = {}
+    for path in paths:
+        if path in read_only:
+            raise ValueError(f"{path} can't be changed")
+        # Firestore rejects an update that names a field and one of its parents
+        if any(other != path and other.startswith(path + '.') for other in paths):
+            raise ValueError(f"{path} overlaps another updated field")
+        value = body
+        for part in path.split('.'):
+            value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+        if value is _MISSING:
+            raise ValueError(f"{path} is in update_mask but not in the body")
+        if path in append_fields:
+            appends[path] = value
+        else:
+            updates[path] = value
+    return updates, appends
+
+def apply_field_updates(data, updates):
+    # The document as it will be after update(updates), for plain values (not transforms)
+    for path, value in updates.items():
+        *parents, key = path.split('.')
+        target = data
+        for part in parents:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[key] = value
+    return data
+
+def field_paths_overlap(a, b):
+    return a == b or a.startswith(b + '.') or b.startswith(a + '.')
+
+# Multi-get (batchGet), ids in the order the client wants them back
+def parse_batch_get(body, max_size):
+    ids = body.get('ids') if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty array')
+    if len(ids) > max_size:
+        raise ValueError(f'At most {max_size} ids can be fetched per request')
+    invalid = [doc_id for doc_id in ids if not isinstance(doc_id, str) or not doc_id or '/' in doc_id]
+    if invalid:
+        raise ValueError(f'Invalid ids: {", ".join(map(str, invalid))}')
+    return ids
+
+def batch_get_results(ids, documents):
+    # documents maps id -> data (None when missing), repeated ids are answered every time
+    return [
+        {"id": doc_id, "found": True, "data": documents[doc_id]} if documents.get(doc_id) is not None
+        else {"id": doc_id, "found": False}
+        for doc_id in ids
+    ]
+
+def build_todo_body(data, email):
+    # Set default values and format fields as required
+    title = data.get('title')
+    description = data.get('description', "")
+    createdAt = time.strftime("%Y-%m-%d %H:%M:%S")
+    updatedAt = createdAt
+    createdBy = email
+    isCompleted = data.get('isCompleted', False)
+    activated = data.get('activated', False)
+
+    return {
+        "title": title,
+        "description": description,
+        "createdAt": createdAt,
+        "updatedAt": updatedAt,
+        "createdBy": createdBy,
+        "isCompleted": isCompleted,
+        "activated": activated
+    }
+
+def build_user_document(email, displayName, photoURL):
+    # Profile kept in the user collection, keyed by localId
+    return {
+        "displayName": displayName,
+        "email": email,
+        "photoURL": photoURL,
+        "createdAt": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+def build_service_body(data):
+    self_logistics = data.get('self_logistics')
+    sf_id = data.get('sf_id')
+    channel = data.get('channel')
+    contact_details = data.get('contact_details')
+    delivery_note = data.get('delivery_note')
+    issue_message_from_customer = data.get('issue_message_from_customer')
+    machine_details = data.get('machine_details')
+    pickup_details = data.get('pickup_details')
+    admin_comments = data.get('admin_comments')
+
+    return {
+        "self_logistics": self_logistics,
+        "sf_id": sf_id,
+        "channel": channel,
+        "contact_details": contact_details,
+        "delivery_note": delivery_note,
+        "issue_message_from_customer": issue_message_from_customer,
+        "machine_details": machine_details,
+        "pickup_details": pickup_details,
+        "admin_comments": admin_comments
+    }
+
+# Todo queries are always scoped to the owner, the composite indexes live in firestore.indexes.json
+def parse_bool(name, value):
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+def user_todos_query(collection, email, args):
+    # imported here so loading this module does not pull in the Firestore client libraries
+    from firebase_admin import firestore
+
+    query = collection.where(filter=firestore.FieldFilter('createdBy', '==', email))
+    for name in ('isCompleted', 'activated'):
+        if args.get(name) is not None:
+            query = query.where(filter=firestore.FieldFilter(name, '==', parse_bool(name, args[name])))
+
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    direction = firestore.Query.ASCENDING if order == 'asc' else firestore.Query.DESCENDING
+    return query.order_by('createdAt', direction=direction)
+
+# Service search, query parameter -> (field path, operator, type)
+SERVICE_SEARCH_FILTERS = {
+    'sf_id': ('sf_id', '==', str),
+    'phone': ('contact_details.contact_numbers.primary.number', '==', float),
+    'brand': ('machine_details.item_brand', '==', str),
+    'pincode': ('contact_details.pickup_address.pincode', '==', float),
+    'pincode_min': ('contact_details.pickup_address.pincode', '>=', float),
+    'pincode_max': ('contact_details.pickup_address.pincode', '<=', float),
+}
+
+def get_field(data, field_path):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+def parse_number(name, value):
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+    # nan and inf parse as floats but match nothing a client could mean
+    if not math.isfinite(number):
+        raise ValueError(f'{name} must be a finite number')
+    # Firestore compares integers and doubles by value, ints keep the query readable
+    return int(number) if number.is_integer() else number
+
+def parse_service_search(args):
+    filters = []
+    for name, (field_path, op, kind) in SERVICE_SEARCH_FILTERS.items():
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        if kind is float:
+            if name == 'phone':
+                # Phone numbers are often written with spaces or dashes between the digit groups
+                value = value.replace(' ', '').replace('-', '')
+            value = parse_number(name, value)
+        filters.append((field_path, op, value))
+    return filters
+
+def services_search_query(collection, filters):
+    from firebase_admin import firestore
+
+    query = collection
+    ranges = set()
+    for field_path, op, value in filters:
+        query = query.where(filter=firestore.FieldFilter(field_path, op, value))
+        if op != '==':
+            ranges.add(field_path)
+    # A range filter needs its field to be the first order_by, the composite indexes for range plus
+    # equality filters live in firestore.indexes.json
+    for field_path in sorted(ranges):
+        query = query.order_by(field_path)
+    return query
+
+def matches_filters(data, filters):
+    for field_path, op, expected in filters:
+        value = get_field(data, field_path)
+        if op == '==':
+            if value != expected:
+                return False
+        elif not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        elif op == '>=' and value < expected:
+            return False
+        elif op == '<=' and value > expected:
+            return False
+    return True
@@ -0,0 +1,133 @@
+# idempotency.py
+
+# Idempotency-Key support for create requests. The first request with a key writes a record of its
+# response in the same WriteBatch as the document it creates (with create(), so the batch fails
+# if the key was used before, on any instance). Retries with the key get that response back
+# without being validated or written again. Records live in IDEMPOTENCY_COLLECTION until
+# their expires_at (a Firestore TTL policy deletes them), recent ones also in an in-process LRU.
+# Concurrent duplicates on one instance wait for the first instead of racing it to the batch.
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.api_core import exceptions
+
+from cache import TTLCache
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyError(Exception):
+    """The request can't be run or replayed under its key, carries the HTTP status to answer with."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class IdempotentRequest:
+    """Handed to the view, which adds the record to its batch and commits through commit()."""
+
+    def __init__(self, store, doc_id, fingerprint):
+        self.store = store
+        self.doc_id = doc_id
+        self.fingerprint = fingerprint
+        self.record = None
+        self.committed = False
+        self.duplicate = False
+
+    def add_to_batch(self, batch, body, status):
+        # Added first, so a duplicate fails the batch before any other write
+        self.record = {
+            "fingerprint": self.fingerprint,
+            "status": status,
+            "body": body,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.store.ttl),
+        }
+        batch.create(self.store.reference(self.doc_id), self.record)
+
+    def commit(self, batch):
+        try:
+            result = batch.commit()
+        except exceptions.Conflict:
+            # The key was used first on another instance (or before this one's cache entry expired)
+            self.duplicate = True
+            return None
+        self.committed = self.record is not None
+        return result
+
+
+class IdempotencyStore:
+    def __init__(self, collection_factory, ttl=86400, cache_size=10000, wait_timeout=30):
+        self.collection_factory = collection_factory
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._in_flight = {}  # doc id -> Event set when the first request finishes
+        self._lock = threading.Lock()
+
+    def reference(self, doc_id):
+        return self.collection_factory().document(doc_id)
+
+    @staticmethod
+    def document_id(scope, key):
+        return hashlib.sha256('\x1f'.join((*scope, key)).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def fingerprint(body):
+        return hashlib.sha256(body).hexdigest()
+
+    def _stored(self, doc_id):
+        snapshot = self.reference(doc_id).get()
+        if not snapshot.exists:
+            return None
+        record = snapshot.to_dict()
+        if record['expires_at'] <= datetime.now(timezone.utc):
+            # Expired but not deleted by the TTL policy yet, the key may be used again
+            self.reference(doc_id).delete()
+            return None
+        return record
+
+    def _replay(self, record, fingerprint):
+        if record['fingerprint'] != fingerprint:
+            raise IdempotencyKeyError('Idempotency-Key was already used with a different request body', 422)
+        return record['body'], record['status']
+
+    def run(self, scope, key, body, handler):
+        """Runs ``handler(IdempotentRequest)`` once per key, returns (response body, status, replayed)."""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyKeyError(f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters', 400)
+        doc_id = self.document_id(scope, key)
+        fingerprint = self.fingerprint(body)
+
+        while True:
+            record = self._cache.get(doc_id)
+            if record is not None:
+                return (*self._replay(record, fingerprint), True)
+            with self._lock:
+                event = self._in_flight.get(doc_id)
+                if event is None:
+                    event = self._in_flight[doc_id] = threading.Event()
+                    break
+            # Another thread has the key, wait for its record (or its failure, then try ourselves)
+            if not event.wait(self.wait_timeout):
+                raise IdempotencyKeyError('A request with this Idempotency-Key is still in progress', 409)
+
+        try:
+            for _ in range(2):
+                request = IdempotentRequest(self, doc_id, fingerprint)
+                response = handler(request)
+                if not request.duplicate:
+                    if request.committed:
+                        self._cache.set(doc_id, request.record)
+                    return (*response, False)
+                record = self._stored(doc_id)
+                if record is not None:
+                    self._cache.set(doc_id, record)
+                    return (*self._replay(record, fingerprint), True)
+                # The earlier record had expired and is gone now, run the request as a new one
+            raise IdempotencyKeyError('A request with this Idempotency-Key is still in progress', 409)
+        finally:
+            with self._lock:
+                self._in_flight.pop(doc_id, None)
+            event.set()
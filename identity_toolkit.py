@@ -0,0 +1,159 @@
+# identity_toolkit.py
+
+# Clients for the Identity Toolkit REST endpoints that pyrebase's auth wraps.
+# Responses have the same shape pyrebase returns (idToken, localId, users, ...).
+import os
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+IDENTITY_TOOLKIT_URL = 'https://identitytoolkit.googleapis.com/v1'
+
+
+def default_base_url():
+    # Same convention as the Firebase SDKs for the local auth emulator
+    emulator_host = os.environ.get('FIREBASE_AUTH_EMULATOR_HOST')
+    if emulator_host:
+        return f'http://{emulator_host}/identitytoolkit.googleapis.com/v1'
+    return os.environ.get('IDENTITY_TOOLKIT_URL', IDENTITY_TOOLKIT_URL)
+
+
+class IdentityToolkitError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def error_message(response):
+    try:
+        return response.json()["error"]["message"]
+    except Exception:
+        return response.text or f'HTTP {response.status_code}'
+
+
+# Transient failures worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest sleep between attempts, also for a longer Retry-After, so a retry can't hold a request thread for long
+MAX_RETRY_SLEEP = 2
+
+
+class CappedRetry(Retry):
+    def get_backoff_time(self):
+        return min(MAX_RETRY_SLEEP, super().get_backoff_time())
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(MAX_RETRY_SLEEP, retry_after)
+
+
+def pooled_session(pool_size, retries=2, backoff_factor=0.2, connect_only=False):
+    """requests Session with one keep-alive pool of ``pool_size`` connections per host.
+
+    ``connect_only`` retries only requests that never reached the server, for calls that are not
+    safe to repeat (signUp would answer EMAIL_EXISTS for the account its first attempt created).
+    """
+    retry = CappedRetry(
+        total=retries,
+        connect=retries,
+        read=0 if connect_only else retries,
+        status=0 if connect_only else retries,
+        other=0 if connect_only else retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # the Identity Toolkit API is all POSTs
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class IdentityToolkit:
+    """Blocking Identity Toolkit client for the sync app, in place of pyrebase's auth.
+
+    pyrebase calls the module level requests.post, so every call may open a new TLS connection.
+    This client shares thread-safe keep-alive pools, size them to the number of threads calling it.
+    signUp has its own pool, retried on connection errors only.
+    """
+
+    def __init__(self, api_key, base_url=None, pool_size=8, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff_factor=0.2, session=None, signup_session=None):
+        self.api_key = api_key
+        self.base_url = (base_url or default_base_url()).rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = session or pooled_session(pool_size, retries=retries, backoff_factor=backoff_factor)
+        self.signup_session = signup_session or session or pooled_session(
+            pool_size, retries=retries, backoff_factor=backoff_factor, connect_only=True)
+
+    def _post(self, method, payload, session=None):
+        response = (session or self.session).post(
+            f'{self.base_url}/accounts:{method}',
+            params={'key': self.api_key},
+            json=payload,
+            timeout=self.timeout
+        )
+        if response.status_code >= 400:
+            raise IdentityToolkitError(error_message(response), response.status_code)
+        return response.json()
+
+    def sign_in_with_email_and_password(self, email, password):
+        return self._post('signInWithPassword', {"email": email, "password": password, "returnSecureToken": True})
+
+    def create_user_with_email_and_password(self, email, password):
+        return self._post('signUp', {"email": email, "password": password, "returnSecureToken": True},
+                          session=self.signup_session)
+
+    def update_profile(self, id_token, display_name=None, photo_url=None, delete_attribute=None):
+        payload = {"idToken": id_token, "displayName": display_name, "photoUrl": photo_url,
+                   "deleteAttribute": delete_attribute, "returnSecureToken": True}
+        return self._post('update', {k: v for k, v in payload.items() if v is not None})
+
+    def get_account_info(self, id_token):
+        return self._post('lookup', {"idToken": id_token})
+
+    def close(self):
+        self.session.close()
+        self.signup_session.close()
+
+
+class AsyncIdentityToolkit:
+    """Non-blocking Identity Toolkit client for the async app, one shared connection pool."""
+
+    def __init__(self, api_key, base_url=None, timeout=10, max_connections=200, client=None):
+        self.api_key = api_key
+        self.base_url = (base_url or default_base_url()).rstrip('/')
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def _post(self, method, payload):
+        response = await self.client.post(
+            f'{self.base_url}/accounts:{method}',
+            params={'key': self.api_key},
+            json=payload
+        )
+        if response.status_code >= 400:
+            raise IdentityToolkitError(error_message(response), response.status_code)
+        return response.json()
+
+    async def sign_in_with_email_and_password(self, email, password):
+        return await self._post('signInWithPassword', {"email": email, "password": password, "returnSecureToken": True})
+
+    async def create_user_with_email_and_password(self, email, password):
+        return await self._post('signUp', {"email": email, "password": password, "returnSecureToken": True})
+
+    async def update_profile(self, id_token, display_name=None, photo_url=None, delete_attribute=None):
+        payload = {"idToken": id_token, "displayName": display_name, "photoUrl": photo_url,
+                   "deleteAttribute": delete_attribute, "returnSecureToken": True}
+        return await self._post('update', {k: v for k, v in payload.items() if v is not None})
+
+    async def get_account_info(self, id_token):
+        return await self._post('lookup', {"idToken": id_token})
+
+    async def aclose(self):
+        await self.client.aclose()
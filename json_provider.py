@@ -0,0 +1,77 @@
+# json_provider.py
+
+# Flask JSON provider backed by orjson, falling back to the stdlib encoder when orjson isn't installed
+# or for arguments and values it doesn't support. Both encoders turn Firestore values into the same
+# JSON: timestamps as RFC 3339 strings (nanoseconds kept), GeoPoints as {latitude, longitude} and
+# document references as their path.
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import TimedJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def firestore_default(o):
+    """JSON value for Firestore types, raises TypeError for anything else."""
+    # DatetimeWithNanoseconds, the type of every Firestore timestamp
+    if hasattr(o, 'rfc3339'):
+        return o.rfc3339()
+
+    from google.cloud.firestore_v1 import GeoPoint
+    from google.cloud.firestore_v1.base_document import BaseDocumentReference
+
+    if isinstance(o, GeoPoint):
+        return {"latitude": o.latitude, "longitude": o.longitude}
+    if isinstance(o, BaseDocumentReference):
+        return o.path
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        try:
+            return firestore_default(o)
+        except TypeError:
+            # dates, decimals, UUIDs and dataclasses as Flask encodes them
+            return DefaultJSONProvider.default(o)
+
+    def _orjson_option(self, kwargs):
+        """orjson options for the json.dumps style ``kwargs``, None when orjson can't honour them."""
+        if orjson is None or not set(kwargs) <= {'indent', 'separators', 'sort_keys', 'default', 'ensure_ascii'}:
+            return None
+        # orjson output is compact UTF-8, ensure_ascii only changes how non-ASCII text is escaped
+        if kwargs.get('separators', (',', ':')) != (',', ':') or kwargs.get('indent') not in (None, 2):
+            return None
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._orjson_option(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+            except orjson.JSONEncodeError:
+                # integers over 64 bits, non-str keys mixed with sort_keys, ...
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # NaN, integers over 64 bits, ... the stdlib parser has the final say
+                pass
+        return super().loads(s, **kwargs)
+
+
+class TimedFastJSONProvider(TimedJSONProvider, FastJSONProvider):
+    """FastJSONProvider that records serialization time as the 'serialize' stage."""
@@ -0,0 +1,214 @@
+# metrics.py
+
+# Lightweight Prometheus-style metrics: per-route and per-stage latency histograms, in-flight
+# requests and upstream error counters, rendered in the Prometheus text format at /metrics.
+# Recording is a perf_counter call, a bisect and a couple of dict updates under a lock.
+import bisect
+import functools
+import hmac
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages that are calls to another service, an exception escaping them counts as an upstream error
+UPSTREAMS = ('firestore', 'identity_toolkit')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labelvalues=(), amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, labelvalues=()):
+        return self._values.get(labelvalues, 0)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labelvalues=(), amount=1):
+        self.inc(labelvalues, -amount)
+
+    def set(self, value, labelvalues=()):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labelvalues=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((labels, ([*counts], total, count)) for labels, (counts, total, count) in self._values.items())
+        for labelvalues, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labelvalues)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'surefix_request_duration_seconds', 'Time spent serving a request', ('route', 'method', 'status')))
+STAGE_DURATION = registry.register(Histogram(
+    'surefix_stage_duration_seconds', 'Time spent in each stage of a request', ('route', 'stage')))
+IN_FLIGHT = registry.register(Gauge(
+    'surefix_requests_in_flight', 'Requests currently being served'))
+UPSTREAM_ERRORS = registry.register(Counter(
+    'surefix_upstream_errors_total', 'Failed calls to upstream services', ('route', 'upstream')))
+
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+@contextmanager
+def stage(name, route=None):
+    # Off the request thread (e.g. on an executor) pass the route captured by the request
+    if route is None:
+        if not has_request_context():
+            yield
+            return
+        route = current_route()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if name in UPSTREAMS:
+            UPSTREAM_ERRORS.inc((route, name))
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, (route, name))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records serialization time as the 'serialize' stage."""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def _finish(start, route, method, status):
+    IN_FLIGHT.dec()
+    REQUEST_DURATION.observe(time.perf_counter() - start, (route, method, status))
+
+
+def _allowed(token):
+    # Scrapers on the same host (e.g. a Prometheus sidecar) or anyone with the bearer token
+    try:
+        if ipaddress.ip_address(request.remote_addr or '').is_loopback:
+            return True
+    except ValueError:
+        pass
+    authorization = request.headers.get('Authorization', '').encode('utf-8')
+    return bool(token) and hmac.compare_digest(authorization, f'Bearer {token}'.encode('utf-8'))
+
+
+def init_app(app, endpoint='/metrics', token=None):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_status(response):
+        if response.is_streamed and 'metrics_start' in g:
+            # A streamed body is sent after the request is torn down, the request ends when the
+            # server closes the response
+            response.call_on_close(functools.partial(
+                _finish, g.pop('metrics_start'), current_route(), request.method, str(response.status_code)
+            ))
+        g.metrics_status = response.status_code
+        return response
+
+    # teardown runs before a streamed body is sent, those are recorded on close (see above)
+    @app.teardown_request
+    def stop_timer(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        _finish(start, current_route(), request.method, str(g.pop('metrics_status', 500)))
+
+    def metrics_endpoint():
+        if not _allowed(token):
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule(endpoint, 'metrics', metrics_endpoint, methods=['GET'])
@@ -0,0 +1,89 @@
+# openapi.py
+
+# The API spec is generated once, at build time, from the view docstrings plus the schema dicts in
+# schemas.py and written to APISPEC_FILE. At runtime it is served as static bytes with an ETag.
+#   python openapi.py            writes apispec.json (the Dockerfile runs this)
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response, request
+from flasgger import Swagger
+
+from schemas import SERVICE_SCHEMA, SIGNUP_SCHEMA, TODO_SCHEMA
+
+APISPEC_FILE = os.environ.get('APISPEC_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'apispec.json'))
+APISPEC_MAX_AGE = int(os.environ.get('APISPEC_MAX_AGE', 3600))
+
+# Referenced by the view docstrings as '#/definitions/<name>'
+TEMPLATE = {
+    "definitions": {
+        "SERVICE_SCHEMA": SERVICE_SCHEMA,
+        "TODO_SCHEMA": TODO_SCHEMA,
+        "SIGNUP_SCHEMA": SIGNUP_SCHEMA,
+    }
+}
+
+
+def spec_bytes(spec):
+    return json.dumps(spec, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class StaticSwagger(Swagger):
+    """Flasgger's UI, with the spec endpoints serving the prebuilt spec.
+
+    When APISPEC_FILE is missing (running from a checkout without the build step) the spec is
+    generated from the docstrings on first request and kept for the life of the process.
+    """
+
+    def __init__(self, app=None, spec_file=APISPEC_FILE, **kwargs):
+        self.spec_file = spec_file
+        self._spec = None
+        self._spec_lock = threading.Lock()
+        kwargs.setdefault('template', TEMPLATE)
+        super().__init__(app, **kwargs)
+
+    def register_views(self, app):
+        super().register_views(app)
+        blueprint = self.config.get('endpoint', 'flasgger')
+        for spec in self.config['specs']:
+            app.view_functions[f"{blueprint}.{spec['endpoint']}"] = self.spec_view
+
+    def load_spec(self):
+        if self._spec is None:
+            with self._spec_lock:
+                if self._spec is None:
+                    try:
+                        with open(self.spec_file, 'rb') as f:
+                            body = f.read()
+                    except FileNotFoundError:
+                        body = spec_bytes(self.get_apispecs())
+                    self._spec = (body, hashlib.sha256(body).hexdigest()[:32])
+        return self._spec
+
+    def spec_view(self):
+        body, etag = self.load_spec()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = APISPEC_MAX_AGE
+        return response.make_conditional(request)
+
+
+def build_spec(app):
+    with app.test_request_context():
+        return app.swag.get_apispecs()
+
+
+def main():
+    from app import create_app
+
+    spec = build_spec(create_app())
+    with open(APISPEC_FILE, 'wb') as f:
+        f.write(spec_bytes(spec))
+    print(f'Wrote {APISPEC_FILE} ({len(spec["paths"])} paths)')
+
+
+if __name__ == '__main__':
+    main()
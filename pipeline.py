@@ -0,0 +1,37 @@
+# pipeline.py
+
+# Runs a request's upstream calls as a pipeline: dependent steps one after another, independent
+# ones side by side on a bounded executor, all under one deadline for the whole request. Latency
+# is then the critical path instead of the sum of every call.
+import time
+from concurrent.futures import wait
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Pipeline:
+    def __init__(self, executor, deadline):
+        self.executor = executor
+        self.expires_at = time.monotonic() + deadline
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def run_all(self, *steps):
+        """Run the zero argument callables concurrently, return their results in order.
+
+        Waits for every step, so a failure is only raised once the others have finished.
+        """
+        futures = [self.executor.submit(step) for step in steps]
+        done, pending = wait(futures, timeout=self.remaining())
+        if pending:
+            # Steps already running can't be interrupted, they finish in the background
+            for future in pending:
+                future.cancel()
+            raise DeadlineExceeded(f'{len(pending)} of {len(futures)} steps did not finish before the deadline')
+        return [future.result() for future in futures]
+
+    def run(self, step):
+        return self.run_all(step)[0]
@@ -0,0 +1,173 @@
+# ratelimit.py
+
+# Token bucket rate limiting. A Limit such as "20/minute" is a bucket holding up to 20 tokens that
+# refills at 20 per minute, every request takes one and requests finding it empty get 429 with
+# Retry-After. Buckets live in a backend: InMemoryBucketBackend keeps them in process (per instance),
+# RedisBucketBackend shares them between instances when the redis package and RATE_LIMIT_REDIS_URL are set.
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+
+from metrics import Counter, current_route, registry
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMITED = registry.register(Counter(
+    'surefix_rate_limited_total', 'Requests rejected by a rate limit', ('route', 'scope')))
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Limit:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f'Limit({self.capacity}, {self.capacity / self.rate:g})'
+
+
+def parse_limit(text):
+    """'20/minute' -> Limit(20, 60), None for an empty or zero limit (no limit)."""
+    if not text or not text.strip() or text.strip() == '0':
+        return None
+    count, _, period = text.strip().partition('/')
+    seconds = PERIODS.get(period.strip() or 'second')
+    if seconds is None:
+        raise ValueError(f'Unknown rate limit period in {text!r}, use one of {", ".join(PERIODS)}')
+    count = int(count)
+    return Limit(count, seconds) if count > 0 else None
+
+
+class BucketBackend(ABC):
+    """Storage for the token buckets, shared backends must take tokens atomically."""
+
+    @abstractmethod
+    def take(self, key, limit, cost=1):
+        """Takes ``cost`` tokens, returns 0 when allowed or the seconds until they are available."""
+
+
+class InMemoryBucketBackend(BucketBackend):
+    """Buckets in a bounded LRU dict, an evicted bucket comes back full."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, limit, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / limit.rate
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+# Same algorithm as InMemoryBucketBackend.take, atomically on the Redis server and on its clock
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketBackend(BucketBackend):
+    """Buckets shared by every instance, one round trip per check."""
+
+    def __init__(self, url, prefix='surefix:ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_REDIS_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, limit, cost=1):
+        redis_key = self.prefix + ':'.join(str(part) for part in key)
+        return float(self._take(keys=[redis_key], args=[limit.rate, limit.capacity, cost]))
+
+
+def client_ip(trusted_proxies=0, req=None):
+    # Each trusted proxy (e.g. the Cloud Run front end) appends the address it received the request from
+    req = req or request
+    if trusted_proxies:
+        route = req.access_route
+        return route[-trusted_proxies] if len(route) >= trusted_proxies else route[0]
+    return req.remote_addr
+
+
+# A (body, status, headers) view result, so the Quart app in asgi.py can return it too
+def too_many_requests(retry_after):
+    body = {'error': 'Too Many Requests', 'message': f'Rate limit exceeded, retry in {retry_after} seconds'}
+    return body, 429, {'Retry-After': str(retry_after)}
+
+
+class RateLimiter:
+    def __init__(self, backend=None, trusted_proxies=0):
+        self.backend = backend or InMemoryBucketBackend()
+        self.trusted_proxies = trusted_proxies
+
+    def check(self, scope, key, limit, route=None):
+        """0 when the request may go ahead, otherwise the whole seconds for Retry-After."""
+        if limit is None:
+            return 0
+        try:
+            wait = self.backend.take((scope, *key), limit)
+        except Exception:
+            # A shared backend that is down must not take the API down with it
+            return 0
+        if not wait:
+            return 0
+        RATE_LIMITED.inc((route or current_route(), scope))
+        return max(1, math.ceil(wait))
+
+    def limit_by_ip(self, limit):
+        """Decorator limiting a view per client IP (and per route)."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                retry_after = self.check('ip', (client_ip(self.trusted_proxies), current_route()), limit)
+                if retry_after:
+                    return too_many_requests(retry_after)
+                return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def backend_from_environ():
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if url:
+        return RedisBucketBackend(url)
+    return InMemoryBucketBackend(maxsize=int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000)))
@@ -0,0 +1,128 @@
+# schemas.py
+
+# Todo schema
+TODO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "createdAt": {"type": "string"},
+        "updatedAt": {"type": "string"},
+        "createdBy": {"type": "string"},
+        "isCompleted": {"type": "boolean"},
+        "activated": {"type": "boolean"}
+    },
+    "required": ["title"]
+}
+
+# Sign up schema
+SIGNUP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "email": {"type": "string", "format": "email"},
+        "password": {"type": "string", "minLength": 6},
+        "displayName": {"type": "string", "minLength": 1},
+        "photoURL": {"type": "string"}
+    },
+    "required": ["email", "password", "displayName"]
+}
+
+# Service schema
+SERVICE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sf_id": {"type": "string"},
+        "channel": {"type": "string"},
+        "contact_details": {
+            "type": "object",
+            "properties": {
+                "first_name": {"type": "string"},
+                "last_name": {"type": "string"},
+                "contact_numbers": {
+                    "type": "object",
+                    "properties": {
+                        "primary": {
+                            "type": "object",
+                            "properties": {
+                                "country_code": {"type": "number"},
+                                "number": {"type": "number"},
+                                "verified": {"type": "boolean"},
+                                "whatsapp": {"type": "boolean"}
+                            },
+                            "required": ["country_code", "number"]
+                        },
+                        "secondary": {
+                            "type": "object",
+                            "properties": {
+                                "country_code": {"type": "number"},
+                                "number": {"type": "number"},
+                                "verified": {"type": "boolean"},
+                                "whatsapp": {"type": "boolean"}
+                            },
+                            "required": ["country_code", "number"]
+                        }
+                    },
+                    "required": ["primary", "secondary"]
+                },
+                "email": {"type": "string"},
+                "pickup_address": {
+                    "type": "object",
+                    "properties": {
+                        "address": {"type": "string"},
+                        "city": {"type": "string"},
+                        "state": {"type": "string"},
+                        "pincode": {"type": "number"},
+                        "google_location": {"type": "string"}
+                    },
+                    "required": ["address", "city", "state", "pincode"]
+                },
+                "use_differant_delivery_address": {"type": "boolean"},
+                "delivery_address": {
+                    "type": "object",
+                    "properties": {
+                        "address": {"type": "string"},
+                        "city": {"type": "string"},
+                        "state": {"type": "string"},
+                        "pincode": {"type": "number"},
+                        "google_location": {"type": "string"}
+                    },
+                    "required": ["address", "city", "state", "pincode"]
+                }
+            },
+            "required": ["first_name", "last_name", "contact_numbers", "pickup_address", "delivery_address"]
+        },
+        "machine_details": {
+            "type": "object",
+            "properties": {
+                "item_brand": {"type": "string"},
+                "model": {"type": "string"},
+                "item_category": {"type": "string"},
+                "year_of_purchase": {"type": "number"}
+            },
+            "required": ["item_brand", "model", "item_category", "year_of_purchase"]
+        },
+        "issue_message_from_customer": {"type": "string"},
+        "admin_comments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "timestamp": {"type": "string"},
+                    "user": {"type": "string"},
+                    "message": {"type": "string"}
+                },
+                "required": ["timestamp", "user", "message"]
+            }
+        },
+        "delivery_note": {"type": "string"},
+        "pickup_details": {
+            "type": "object",
+            "properties": {
+                "pickup_note": {"type": "string"}
+            },
+            "required": ["pickup_note"]
+        },
+        "self_logistics": {"type": "boolean"}
+    },
+    "required": ["sf_id", "channel", "contact_details", "machine_details", "issue_message_from_customer", "admin_comments", "delivery_note", "pickup_details", "self_logistics"]
+}
@@ -0,0 +1,143 @@
+# search_index.py
+
+# In-process inverted index over the service collection for prefix and free text search, which
+# Firestore queries can't do. It is fed by a snapshot listener on the collection, so it follows
+# writes from every instance, and lookups never leave the process. Only the words and the fields
+# the search filters on are kept per service, the hits are read from Firestore. If the listen stream
+# fails for good, the next search subscribes again and the index is rebuilt from its first snapshot.
+import bisect
+import re
+import threading
+
+from helpers import SERVICE_SEARCH_FILTERS, apply_field_updates, get_field
+
+# Service fields whose words are searchable
+TEXT_FIELDS = (
+    'contact_details.first_name',
+    'contact_details.last_name',
+    'issue_message_from_customer',
+)
+
+# Service fields kept for filtering the hits in process
+FILTER_FIELDS = tuple(sorted({field_path for field_path, _, _ in SERVICE_SEARCH_FILTERS.values()}))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower()) if isinstance(text, str) else []
+
+
+class SearchIndexNotReady(Exception):
+    pass
+
+
+class ServiceSearchIndex:
+    def __init__(self, collection_factory, fields=TEXT_FIELDS, filter_fields=FILTER_FIELDS, ready_timeout=10):
+        self.collection_factory = collection_factory
+        self.fields = fields
+        self.filter_fields = filter_fields
+        self.ready_timeout = ready_timeout
+        self._docs = {}        # doc id -> (tokens, filter field values)
+        self._postings = {}    # token -> set of doc ids
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._synced = False   # the current watch delivered its first snapshot
+
+    def start(self):
+        with self._lock:
+            if self._watch is not None and not self._watch.is_active:
+                # The listen stream failed and the client gave up on it, no more changes would arrive
+                self._watch.unsubscribe()
+                self._watch = None
+            if self._watch is None:
+                self._synced = False
+                try:
+                    self._watch = self.collection_factory().on_snapshot(self._on_snapshot)
+                except Exception as e:
+                    raise SearchIndexNotReady(f'Search index could not subscribe to services: {e}')
+        if not self._ready.wait(self.ready_timeout):
+            raise SearchIndexNotReady('Search index is still loading, retry shortly')
+
+    def close(self):
+        with self._lock:
+            watch, self._watch = self._watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        with self._lock:
+            if not self._synced:
+                # The first snapshot lists every service, after a new subscription it replaces the index
+                self._synced = True
+                self._docs, self._postings, self._vocabulary = {}, {}, []
+            for change in changes:
+                document = change.document
+                if change.type.name == 'REMOVED':
+                    self._remove(document.id)
+                else:
+                    self._add(document.id, document.to_dict())
+        self._ready.set()
+
+    def _add(self, doc_id, data):
+        self._remove(doc_id)
+        tokens = set()
+        for field in self.fields:
+            tokens.update(tokenize(get_field(data, field)))
+        values = {}
+        for field in self.filter_fields:
+            value = get_field(data, field)
+            if value is not None:
+                values[field] = value
+        self._docs[doc_id] = (tokens, apply_field_updates({}, values))
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            posting.add(doc_id)
+
+    def _remove(self, doc_id):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for token in entry[0]:
+            posting = self._postings[token]
+            posting.discard(doc_id)
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    def _prefix_matches(self, prefix):
+        matches = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches |= self._postings[token]
+        return matches
+
+    def search(self, text, limit, predicate=None):
+        """Services whose text fields contain a word starting with every term of ``text``.
+
+        Returns up to ``limit`` ids in order, ``predicate(values)`` filters further on the filter fields.
+        """
+        terms = tokenize(text)
+        if not terms:
+            return []
+        with self._lock:
+            # Start from the rarest term so the intersections stay small
+            candidates = sorted((self._prefix_matches(term) for term in set(terms)), key=len)
+            ids = set.intersection(*candidates)
+            results = []
+            for doc_id in sorted(ids):
+                if predicate is None or predicate(self._docs[doc_id][1]):
+                    results.append(doc_id)
+                    if len(results) == limit:
+                        break
+            return results
@@ -0,0 +1,122 @@
+# service_stats.py
+
+# Dashboard aggregates for services, kept as sharded counter documents in SERVICE_STATS_COLLECTION.
+# Every service write adds its counter increments to the same WriteBatch, so the counts move with
+# the services atomically, and GET /services/stats reads the shards (one read each) instead of
+# every service. Writes are spread over the shards to stay under Firestore's per-document write rate.
+#   python service_stats.py rebuild     recounts every service, e.g. after the first deploy
+import random
+
+from helpers import get_field
+
+# Dashboard dimension -> service field path
+DIMENSIONS = {
+    "channel": "channel",
+    "item_category": "machine_details.item_category",
+    "self_logistics": "self_logistics",
+    "city": "contact_details.pickup_address.city",
+}
+
+MISSING = '(none)'
+
+
+def counter_key(value):
+    if value is None or value == '':
+        return MISSING
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value).strip()[:100] or MISSING
+
+
+class ServiceStats:
+    def __init__(self, collection_factory, shards=10):
+        self.collection_factory = collection_factory
+        self.shards = shards
+
+    def deltas(self, before=None, after=None):
+        """Counter changes for a service going from ``before`` to ``after`` (None when absent)."""
+        total = 0
+        counts = {}
+        for sign, data in ((-1, before), (1, after)):
+            if data is None:
+                continue
+            total += sign
+            for name, field_path in DIMENSIONS.items():
+                key = counter_key(get_field(data, field_path))
+                counts.setdefault(name, {})
+                counts[name][key] = counts[name].get(key, 0) + sign
+        return total, counts
+
+    def combine(self, changes):
+        """Sums (total, counts) pairs, so a batch of services costs one counter write."""
+        total = 0
+        counts = {}
+        for change_total, change_counts in changes:
+            total += change_total
+            for name, values in change_counts.items():
+                for key, delta in values.items():
+                    counts.setdefault(name, {})
+                    counts[name][key] = counts[name].get(key, 0) + delta
+        return total, counts
+
+    def add_to_batch(self, batch, deltas):
+        from firebase_admin import firestore
+
+        total, counts = deltas
+        update = {
+            name: {key: firestore.Increment(delta) for key, delta in values.items() if delta}
+            for name, values in counts.items()
+        }
+        update = {name: values for name, values in update.items() if values}
+        if not total and not update:
+            return False
+        shard = self.collection_factory().document(f'shard-{random.randrange(self.shards)}')
+        body = {"counts": update}
+        if total:
+            body["total"] = firestore.Increment(total)
+        batch.set(shard, body, merge=True)
+        return True
+
+    def read(self):
+        total = 0
+        counts = {name: {} for name in DIMENSIONS}
+        for shard in self.collection_factory().stream():
+            data = shard.to_dict()
+            total += data.get('total', 0)
+            for name, values in (data.get('counts') or {}).items():
+                if name not in counts:
+                    continue
+                for key, value in values.items():
+                    counts[name][key] = counts[name].get(key, 0) + value
+        # Values whose services were all deleted or changed stay behind as zeros
+        counts = {name: {k: v for k, v in sorted(values.items()) if v} for name, values in counts.items()}
+        return {"total": total, **counts}
+
+    def rebuild(self, db, services_collection='service'):
+        """Recount every service and replace the shards, services written meanwhile may be miscounted."""
+        field_paths = sorted(set(DIMENSIONS.values()))
+        total, counts = self.combine(
+            self.deltas(after=service.to_dict())
+            for service in db.collection(services_collection).select(field_paths).stream()
+        )
+        batch = db.batch()
+        collection = self.collection_factory()
+        for shard in collection.stream():
+            batch.delete(shard.reference)
+        batch.set(collection.document('shard-0'), {"total": total, "counts": counts})
+        batch.commit()
+        return total
+
+
+def main():
+    import sys
+
+    from app import db, service_stats
+
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python service_stats.py rebuild')
+    print(f'Counted {service_stats.rebuild(db)} services')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# singleflight.py
+
+# Request coalescing for reads. Identical calls that arrive while one is already running wait for
+# it and share its result (or its exception) instead of each going to Firestore, which flattens
+# the burst of identical reads a dashboard refresh sends across the gunicorn threads.
+import threading
+
+from metrics import Counter, registry
+
+FLIGHT_CALLS = registry.register(Counter(
+    'surefix_singleflight_calls_total', 'Reads that went upstream through a single-flight group', ('group',)))
+FLIGHT_COALESCED = registry.register(Counter(
+    'surefix_singleflight_coalesced_total', 'Reads answered by an identical read already in flight', ('group',)))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns fn(), shared with every call for ``key`` made while it runs."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            FLIGHT_COALESCED.inc((self.group,))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        FLIGHT_CALLS.inc((self.group,))
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self.forget(key, call)
+            call.done.set()
+
+    def forget(self, key, call=None):
+        """Later calls for ``key`` start a new read, e.g. after a write made the running one stale."""
+        with self._lock:
+            if call is None or self._calls.get(key) is call:
+                self._calls.pop(key, None)
@@ -0,0 +1,6 @@
+# standins/__init__.py
+
+# Local stand-ins for the Google/Firebase services the API talks to
+from standins.keyserver import KeyServer, TokenIssuer
+from standins.firestore import AsyncInMemoryFirestore, InMemoryFirestore
+from standins.identity_toolkit import IdentityToolkitServer
@@ -0,0 +1,520 @@
+# standins/firestore.py
+
+# In-memory stand-in for the parts of the Firestore client the API uses, in a sync flavour
+# (drop-in for firestore.client()) and an async one (drop-in for firestore_async.client()).
+# ``latency`` adds a fixed delay to every RPC to mimic a network round trip.
+import asyncio
+import copy
+import datetime
+import queue
+import threading
+import time
+import uuid
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+DOCUMENT_ID = '__name__'
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def get_path(data, field_path):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _parent(data, field_path):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    return data, parts[-1]
+
+
+def _apply_key(parent, key, value):
+    if value is transforms.DELETE_FIELD:
+        parent.pop(key, None)
+    elif value is transforms.SERVER_TIMESTAMP:
+        parent[key] = _now()
+    elif isinstance(value, transforms.Increment):
+        parent[key] = (parent.get(key) or 0) + value.value
+    elif isinstance(value, transforms.ArrayUnion):
+        current = list(parent.get(key) or [])
+        parent[key] = current + [v for v in value.values if v not in current]
+    elif isinstance(value, transforms.ArrayRemove):
+        parent[key] = [v for v in parent.get(key) or [] if v not in value.values]
+    else:
+        parent[key] = copy.deepcopy(value)
+
+
+def _apply(data, field_path, value):
+    parent, key = _parent(data, field_path)
+    _apply_key(parent, key, value)
+
+
+def _merge(target, source):
+    # Nested dicts are merged key by key (set(merge=True)), map keys are never split on dots
+    for key, value in source.items():
+        if isinstance(value, dict) and value:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _merge(target[key], value)
+        else:
+            _apply_key(target, key, value)
+    return target
+
+
+def _project(entry, field_paths):
+    # Only the selected fields, like select() / field_paths on the real client
+    if entry is None or field_paths is None:
+        return entry
+    data = {}
+    for field_path in field_paths:
+        value = get_path(entry['data'], field_path)
+        if value is not None:
+            _apply(data, field_path, value)
+    return dict(entry, data=data)
+
+
+class Store:
+    """Thread-safe document storage shared by the sync and async clients."""
+
+    def __init__(self):
+        self.collections = {}
+        self.listeners = []
+        self.lock = threading.RLock()
+
+    def read(self, collection, doc_id):
+        with self.lock:
+            return self.collections.get(collection, {}).get(doc_id)
+
+    def write(self, collection, doc_id, mutate, must_exist=False, must_not_exist=False, last_update_time=None):
+        with self.lock:
+            docs = self.collections.setdefault(collection, {})
+            existing = docs.get(doc_id)
+            if must_exist and existing is None:
+                raise exceptions.NotFound(f'No document to update: {collection}/{doc_id}')
+            if must_not_exist and existing is not None:
+                raise exceptions.Conflict(f'Document already exists: {collection}/{doc_id}')
+            if last_update_time is not None and (existing is None or existing['update_time'] != last_update_time):
+                raise exceptions.FailedPrecondition(f'Document changed since it was read: {collection}/{doc_id}')
+            now = _now()
+            if mutate is None:
+                docs.pop(doc_id, None)
+                entry = None
+            else:
+                data = copy.deepcopy(existing['data']) if existing else {}
+                entry = {
+                    'data': mutate(data),
+                    'create_time': existing['create_time'] if existing else now,
+                    'update_time': now,
+                }
+                docs[doc_id] = entry
+            for listener in list(self.listeners):
+                listener(collection, doc_id, existing, entry)
+            return now
+
+    def items(self, collection):
+        # Entries are replaced, never mutated in place, so handing them out without a copy is safe
+        with self.lock:
+            return list(self.collections.get(collection, {}).items())
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, entry):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = entry is not None
+        self._data = entry['data'] if entry else None
+        self.create_time = entry['create_time'] if entry else None
+        self.update_time = entry['update_time'] if entry else None
+        self.read_time = _now()
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        return get_path(self._data, field_path)
+
+
+class Watch:
+    """Delivers snapshot callbacks on a background thread, like the real client's Watch."""
+
+    def __init__(self, store, matches, snapshot, initial, callback):
+        self._store = store
+        self._matches = matches
+        self._snapshot = snapshot
+        self._callback = callback
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._queue.put(initial)
+        with store.lock:
+            store.listeners.append(self._on_write)
+        self._thread.start()
+
+    def _on_write(self, collection, doc_id, before, after):
+        was = before is not None and self._matches(collection, doc_id, before)
+        now = after is not None and self._matches(collection, doc_id, after)
+        if not was and not now:
+            return
+        change_type = ChangeType.MODIFIED if was and now else (ChangeType.ADDED if now else ChangeType.REMOVED)
+        snapshot = self._snapshot(collection, doc_id, after if now else None)
+        self._queue.put(([snapshot], [DocumentChange(change_type, snapshot, -1, -1)]))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            snapshots, changes = item
+            self._callback(snapshots, changes, _now())
+
+    @property
+    def is_active(self):
+        # False once unsubscribed, like the real Watch after its stream is closed
+        return self._thread.is_alive()
+
+    def unsubscribe(self):
+        with self._store.lock:
+            if self._on_write in self._store.listeners:
+                self._store.listeners.remove(self._on_write)
+        self._queue.put(None)
+
+
+class _Mutations:
+    @staticmethod
+    def set(document_data, merge=False):
+        def mutate(data):
+            return _merge(data if merge else {}, document_data)
+        return mutate
+
+    @staticmethod
+    def update(field_updates):
+        def mutate(data):
+            for path, value in field_updates.items():
+                _apply(data, path, value)
+            return data
+        return mutate
+
+
+class _Query:
+    def __init__(self, client, collection, filters=(), orders=(), projection=None, cursor=None, limit=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._projection = projection
+        self._cursor = cursor
+        self._limit = limit
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, projection=self._projection,
+                     cursor=self._cursor, limit=self._limit)
+        state.update(changes)
+        return type(self)(self._client, self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    @staticmethod
+    def _value(doc_id, data, field_path):
+        return doc_id if field_path == DOCUMENT_ID else get_path(data, field_path)
+
+    @staticmethod
+    def _matches(value, op, expected):
+        if op == '==':
+            return value == expected
+        if op == '!=':
+            return value is not None and value != expected
+        if op == 'in':
+            return value in expected
+        if op == 'not-in':
+            return value is not None and value not in expected
+        if op == 'array-contains':
+            return isinstance(value, list) and expected in value
+        if op == 'array-contains-any':
+            return isinstance(value, list) and any(v in value for v in expected)
+        if value is None or type(value) is bool or type(expected) is bool:
+            return False
+        try:
+            return {'<': value < expected, '<=': value <= expected,
+                    '>': value > expected, '>=': value >= expected}[op]
+        except TypeError:
+            return False
+
+    def _run(self):
+        rows = [
+            (doc_id, entry) for doc_id, entry in self._client._store.items(self._collection)
+            if all(self._matches(self._value(doc_id, entry['data'], f), op, v) for f, op, v in self._filters)
+        ]
+        orders = self._orders or [(DOCUMENT_ID, 'ASCENDING')]
+        if orders[-1][0] != DOCUMENT_ID:
+            orders = orders + [(DOCUMENT_ID, orders[-1][1])]
+        # Documents missing an order_by field are excluded, like Firestore does
+        rows = [row for row in rows if all(self._value(row[0], row[1]['data'], f) is not None for f, _ in orders)]
+        for field_path, direction in reversed(orders):
+            rows.sort(key=lambda row: self._value(row[0], row[1]['data'], field_path),
+                      reverse=direction == 'DESCENDING')
+
+        if self._cursor is not None:
+            if isinstance(self._cursor, DocumentSnapshot):
+                cursor = {f: self._value(self._cursor.id, self._cursor._data, f) for f, _ in orders}
+            else:
+                cursor = {f: (v.id if hasattr(v, 'id') else v) for f, v in self._cursor.items()}
+            rows = [row for row in rows if self._after_cursor(row, cursor, orders)]
+
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [self._snapshot(doc_id, entry) for doc_id, entry in rows]
+
+    def on_snapshot(self, callback):
+        def matches(collection, doc_id, entry):
+            return collection == self._collection and all(
+                self._matches(self._value(doc_id, entry['data'], f), op, v) for f, op, v in self._filters
+            )
+        initial = self._run()
+        changes = [DocumentChange(ChangeType.ADDED, snapshot, -1, i) for i, snapshot in enumerate(initial)]
+        return Watch(self._client._store, matches, self._snapshot_for, (initial, changes), callback)
+
+    def _snapshot_for(self, collection, doc_id, entry):
+        return DocumentSnapshot(self._client._document_ref(collection, doc_id), entry)
+
+    def _after_cursor(self, row, cursor, orders):
+        for field_path, direction in orders:
+            if field_path not in cursor:
+                break
+            value = self._value(row[0], row[1]['data'], field_path)
+            if value != cursor[field_path]:
+                return (value > cursor[field_path]) == (direction != 'DESCENDING')
+        return False
+
+    def _snapshot(self, doc_id, entry):
+        entry = _project(entry, self._projection)
+        return DocumentSnapshot(self._client._document_ref(self._collection, doc_id), entry)
+
+
+class _DocumentReferenceBase:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.id = doc_id
+        self.path = f'{collection}/{doc_id}'
+        self._collection = collection
+
+    def __eq__(self, other):
+        return isinstance(other, _DocumentReferenceBase) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def _get(self, field_paths=None):
+        return DocumentSnapshot(self, _project(self._client._store_entry(self._collection, self.id), field_paths))
+
+    def _write(self, mutate, **checks):
+        return self._client._store.write(self._collection, self.id, mutate, **checks)
+
+    def on_snapshot(self, callback):
+        def matches(collection, doc_id, entry):
+            return collection == self._collection and doc_id == self.id
+        initial = self._get()
+        return Watch(self._client._store, matches, lambda c, d, entry: DocumentSnapshot(self, entry),
+                     ([initial], []), callback)
+
+
+class DocumentReference(_DocumentReferenceBase):
+    def get(self, field_paths=None, transaction=None):
+        self._client._wait()
+        return self._get(field_paths)
+
+    def set(self, document_data, merge=False):
+        self._client._wait()
+        return self._write(_Mutations.set(document_data, merge))
+
+    def create(self, document_data):
+        self._client._wait()
+        return self._write(_Mutations.set(document_data), must_not_exist=True)
+
+    def update(self, field_updates):
+        self._client._wait()
+        return self._write(_Mutations.update(field_updates), must_exist=True)
+
+    def delete(self):
+        self._client._wait()
+        return self._write(None)
+
+
+class AsyncDocumentReference(_DocumentReferenceBase):
+    async def get(self, field_paths=None, transaction=None):
+        await self._client._wait()
+        return self._get(field_paths)
+
+    async def set(self, document_data, merge=False):
+        await self._client._wait()
+        return self._write(_Mutations.set(document_data, merge))
+
+    async def create(self, document_data):
+        await self._client._wait()
+        return self._write(_Mutations.set(document_data), must_not_exist=True)
+
+    async def update(self, field_updates):
+        await self._client._wait()
+        return self._write(_Mutations.update(field_updates), must_exist=True)
+
+    async def delete(self):
+        await self._client._wait()
+        return self._write(None)
+
+
+class Query(_Query):
+    def stream(self, transaction=None):
+        self._client._wait()
+        yield from self._run()
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class AsyncQuery(_Query):
+    async def stream(self, transaction=None):
+        await self._client._wait()
+        for snapshot in self._run():
+            yield snapshot
+
+    async def get(self, transaction=None):
+        return [snapshot async for snapshot in self.stream()]
+
+
+def _collection_type(query_type):
+    class CollectionReference(query_type):
+        def __init__(self, client, collection, **state):
+            super().__init__(client, collection, **state)
+            self.id = collection
+
+        def _copy(self, **changes):
+            state = dict(filters=self._filters, orders=self._orders, projection=self._projection,
+                         cursor=self._cursor, limit=self._limit)
+            state.update(changes)
+            return query_type(self._client, self._collection, **state)
+
+        def document(self, document_id=None):
+            return self._client._document_ref(self._collection, document_id or uuid.uuid4().hex[:20])
+
+    return CollectionReference
+
+
+class _BatchBase:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append((reference, _Mutations.set(document_data, merge), {}))
+
+    def create(self, reference, document_data):
+        self._writes.append((reference, _Mutations.set(document_data), {'must_not_exist': True}))
+
+    def update(self, reference, field_updates, option=None):
+        # option comes from write_option(), e.g. a last_update_time precondition
+        self._writes.append((reference, _Mutations.update(field_updates), {'must_exist': True, **(option or {})}))
+
+    def delete(self, reference):
+        self._writes.append((reference, None, {}))
+
+    def _commit(self):
+        if len(self._writes) > 500:
+            raise exceptions.InvalidArgument('maximum 500 writes allowed per request')
+        with self._client._store.lock:
+            for reference, mutate, checks in self._writes:
+                reference._write(mutate, **checks)
+        writes, self._writes = self._writes, []
+        return writes
+
+
+class WriteBatch(_BatchBase):
+    def commit(self):
+        self._client._wait()
+        return self._commit()
+
+
+class AsyncWriteBatch(_BatchBase):
+    async def commit(self):
+        await self._client._wait()
+        return self._commit()
+
+
+class _ClientBase:
+    def __init__(self, latency=0.0, store=None):
+        self.latency = latency
+        self._store = store or Store()
+
+    def _store_entry(self, collection, doc_id):
+        return self._store.read(collection, doc_id)
+
+    @staticmethod
+    def write_option(last_update_time=None):
+        return {'last_update_time': last_update_time} if last_update_time is not None else {}
+
+    def _document_ref(self, collection, doc_id):
+        return self._document_type(self, collection, doc_id)
+
+    def collection(self, name):
+        return self._collection_type(self, name)
+
+    def document(self, path):
+        collection, doc_id = path.split('/', 1)
+        return self._document_ref(collection, doc_id)
+
+
+class InMemoryFirestore(_ClientBase):
+    _document_type = DocumentReference
+    _collection_type = _collection_type(Query)
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self._wait()
+        for reference in references:
+            yield reference._get(field_paths)
+
+
+class AsyncInMemoryFirestore(_ClientBase):
+    _document_type = AsyncDocumentReference
+    _collection_type = _collection_type(AsyncQuery)
+
+    async def _wait(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def batch(self):
+        return AsyncWriteBatch(self)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        await self._wait()
+        for reference in references:
+            yield reference._get(field_paths)
@@ -0,0 +1,166 @@
+# standins/identity_toolkit.py
+
+# Local stand-in for the Identity Toolkit REST API. It answers both the v3 relyingparty endpoints
+# pyrebase calls and the v1 accounts:* endpoints, and signs its ID tokens with a TokenIssuer so
+# they verify against the matching KeyServer.
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.auth import jwt
+
+from standins.tls import wrap_server
+
+# v3 relyingparty method -> v1 accounts method
+V3_METHODS = {
+    'signupNewUser': 'signUp',
+    'verifyPassword': 'signInWithPassword',
+    'getAccountInfo': 'lookup',
+    'setAccountInfo': 'update',
+}
+
+
+class IdentityToolkitError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class IdentityToolkitServer:
+    def __init__(self, issuer, latency=0.0, host='127.0.0.1', port=0, tls=False):
+        self.issuer = issuer
+        self.latency = latency
+        self.users = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body go out in separate writes, without this a keep-alive client waits
+            # out the delayed ACK on every response
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                method = self.path.split('?')[0].rsplit('/', 1)[-1]
+                method = V3_METHODS.get(method, method.replace('accounts:', ''))
+                status, body = server.handle(method, payload)
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+        # With tls, clients must trust cert_file (e.g. requests' verify=server.cert_file)
+        self.cert_file = wrap_server(self._httpd, host) if tls else None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        scheme = 'https' if self.cert_file else 'http'
+        return f'{scheme}://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Account handling
+
+    @staticmethod
+    def _hash(password):
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def add_user(self, email, password, display_name=None, disabled=False):
+        user = {
+            "localId": uuid.uuid4().hex[:28],
+            "email": email,
+            "passwordHash": self._hash(password),
+            "emailVerified": False,
+            "displayName": display_name,
+            "photoUrl": None,
+            "disabled": disabled,
+            "createdAt": str(int(time.time() * 1000)),
+        }
+        with self._lock:
+            if email in self.users:
+                raise IdentityToolkitError('EMAIL_EXISTS')
+            self.users[email] = user
+        return user
+
+    def _session(self, user, kind):
+        return {
+            "kind": f"identitytoolkit#{kind}",
+            "localId": user["localId"],
+            "email": user["email"],
+            "displayName": user["displayName"] or "",
+            "idToken": self.issuer.mint(user["localId"], user["email"]),
+            "refreshToken": uuid.uuid4().hex,
+            "expiresIn": "3600",
+        }
+
+    def _user_for_token(self, id_token):
+        try:
+            claims = jwt.decode(id_token, certs=self.issuer.certs(), audience=self.issuer.project_id)
+        except Exception:
+            raise IdentityToolkitError('INVALID_ID_TOKEN')
+        for user in self.users.values():
+            if user["localId"] == claims["sub"]:
+                return user
+        raise IdentityToolkitError('USER_NOT_FOUND')
+
+    def handle(self, method, payload):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            if method == 'signUp':
+                if len(payload.get('password') or '') < 6:
+                    raise IdentityToolkitError('WEAK_PASSWORD : Password should be at least 6 characters')
+                user = self.add_user(payload.get('email'), payload['password'])
+                return 200, self._session(user, 'SignupNewUserResponse')
+            if method == 'signInWithPassword':
+                user = self.users.get(payload.get('email'))
+                if user is None:
+                    raise IdentityToolkitError('EMAIL_NOT_FOUND')
+                if user["passwordHash"] != self._hash(payload.get('password') or ''):
+                    raise IdentityToolkitError('INVALID_PASSWORD')
+                if user["disabled"]:
+                    raise IdentityToolkitError('USER_DISABLED')
+                return 200, dict(self._session(user, 'VerifyPasswordResponse'), registered=True)
+            if method == 'lookup':
+                user = self._user_for_token(payload.get('idToken'))
+                account = {k: v for k, v in user.items() if k != 'passwordHash' and v is not None}
+                return 200, {"kind": "identitytoolkit#GetAccountInfoResponse", "users": [account]}
+            if method == 'update':
+                user = self._user_for_token(payload.get('idToken'))
+                for field in ('displayName', 'photoUrl'):
+                    if field in payload:
+                        user[field] = payload[field]
+                return 200, dict(self._session(user, 'SetAccountInfoResponse'), photoUrl=user["photoUrl"])
+            raise IdentityToolkitError(f'Unknown method {method}', status=404)
+        except IdentityToolkitError as e:
+            return e.status, {"error": {"code": e.status, "message": e.message, "errors": [{"message": e.message}]}}
@@ -0,0 +1,125 @@
+# standins/keyserver.py
+
+# Local stand-ins for Google's securetoken key endpoint and the Firebase token issuer.
+# Point TokenVerifier (or FIREBASE_CERTS_URL) at KeyServer.url to verify tokens minted by TokenIssuer.
+import datetime
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+
+class SigningKey:
+    def __init__(self):
+        self.kid = uuid.uuid4().hex
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'securetoken.standin')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(self._private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(self._private_key, hashes.SHA256())
+        )
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode('utf-8')
+        private_pem = self._private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=self.kid)
+
+
+class TokenIssuer:
+    """Mints Firebase-shaped ID tokens signed with locally generated keys."""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.keys = [SigningKey()]
+
+    @property
+    def current_key(self):
+        return self.keys[-1]
+
+    def rotate(self, keep_previous=True):
+        key = SigningKey()
+        self.keys = (self.keys if keep_previous else []) + [key]
+        return key
+
+    def certs(self):
+        return {key.kid: key.cert_pem for key in self.keys}
+
+    def mint(self, uid, email=None, expires_in=3600, **claims):
+        now = int(time.time())
+        payload = {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "auth_time": now,
+            "user_id": uid,
+            "sub": uid,
+            "iat": now,
+            "exp": now + expires_in,
+            "email": email,
+            "email_verified": False,
+            "firebase": {"identities": {"email": [email]}, "sign_in_provider": "password"},
+        }
+        payload.update(claims)
+        return jwt.encode(self.current_key.signer, payload).decode('utf-8')
+
+
+class KeyServer:
+    """Serves TokenIssuer's certificates the way the securetoken x509 endpoint does."""
+
+    def __init__(self, issuer, max_age=3600, host='127.0.0.1', port=0):
+        self.issuer = issuer
+        self.max_age = max_age
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.issuer.certs()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Cache-Control', f'public, max-age={server.max_age}, must-revalidate')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
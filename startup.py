@@ -0,0 +1,73 @@
+# startup.py
+
+# Cold start helpers: clients that are only built when first used, and a breakdown of where
+# startup time went (module import, client init, first request), exported at /metrics
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import Gauge, registry
+
+STARTUP_SECONDS = registry.register(Gauge(
+    'surefix_startup_seconds', 'Time spent in each startup phase', ('phase',)))
+
+
+class StartupTimer:
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self._lock:
+            # a phase is only recorded once, later calls (e.g. a second app) keep the cold start value
+            if phase in self.phases:
+                return
+            self.phases[phase] = seconds
+        STARTUP_SECONDS.set(seconds, (phase,))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def breakdown(self):
+        with self._lock:
+            return {phase: round(seconds, 4) for phase, seconds in self.phases.items()}
+
+
+startup_timer = StartupTimer()
+
+
+class LazyClient:
+    """Proxy that builds the wrapped client on first attribute access.
+
+    Lets the module keep ``db.collection(...)`` style globals while deferring the imports and
+    network setup behind them until a request actually needs them.
+    """
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+        self._client = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    @property
+    def initialized(self):
+        return self._client is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        state = 'initialized' if self.initialized else 'not initialized'
+        return f'<LazyClient {self._name} ({state})>'
@@ -0,0 +1,40 @@
+# tests/conftest.py
+
+# The modules live at the repository root, run the tests from there with
+#   python -m pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from cache import InMemoryBackend
+from doc_cache import DocumentCache
+from standins.firestore import InMemoryFirestore
+
+# Bearer tokens of the api fixture, the token is the user's name
+USERS = {
+    'alice': {"localId": "uid-alice", "email": "alice@example.com"},
+    'bob': {"localId": "uid-bob", "email": "bob@example.com"},
+}
+
+
+@pytest.fixture
+def db():
+    return InMemoryFirestore()
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """A test client of app.py against the in-memory Firestore, with an empty todo cache."""
+    import app
+
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'user_Ref', db.collection('user'))
+    monkeypatch.setattr(app, 'todo_ref', db.collection('todos'))
+    monkeypatch.setattr(app, 'service_ref', db.collection('service'))
+    monkeypatch.setattr(app, 'todo_cache', DocumentCache(InMemoryBackend()))
+    monkeypatch.setattr(app, 'authenticate_user', lambda token: (True, USERS[token]) if token in USERS else (False, 'Invalid token'))
+    monkeypatch.setattr(app, 'USER_RATE_LIMIT', None)
+    return app.app.test_client()
@@ -0,0 +1,51 @@
+# tests/test_batch_get.py
+
+# POST /services:batchGet and POST /todo:batchGet
+from benchmarks.samples import service_document, todo_document
+
+ALICE = {'Authorization': 'Bearer alice'}
+
+
+def test_services_in_request_order(api, db):
+    for i in range(3):
+        db.collection('service').document(f's{i}').set(service_document(i))
+    response = api.post('/services:batchGet', json={"ids": ['s2', 'missing', 's0', 's2']}, headers=ALICE)
+    assert response.status_code == 200
+    results = response.get_json()['services']
+    assert [(result['id'], result['found']) for result in results] == [
+        ('s2', True), ('missing', False), ('s0', True), ('s2', True)
+    ]
+    assert 'data' not in results[1]
+    assert results[0]['data']['sf_id'] == service_document(2)['sf_id']
+
+
+def test_services_fields(api, db):
+    db.collection('service').document('s0').set(service_document(0))
+    response = api.post('/services:batchGet', json={"ids": ['s0'], "fields": 'sf_id,channel'}, headers=ALICE)
+    assert set(response.get_json()['services'][0]['data']) == {'sf_id', 'channel'}
+
+
+def test_services_invalid_body_is_json_400(api):
+    for body in ({"ids": ['s0'], "fields": ['sf_id']}, {"ids": ['s0'], "fields": 'nope'}, {"ids": []}, {"ids": ['a/b']}, []):
+        response = api.post('/services:batchGet', json=body, headers=ALICE)
+        assert response.status_code == 400
+        assert response.is_json
+
+
+def test_todos_of_other_users_are_not_found(api, db):
+    db.collection('todos').document('mine').set(todo_document(0, 'alice@example.com'))
+    db.collection('todos').document('theirs').set(todo_document(1, 'bob@example.com'))
+    response = api.post('/todo:batchGet', json={"ids": ['theirs', 'mine', 'missing']}, headers=ALICE)
+    assert response.status_code == 200
+    assert [(result['id'], result['found']) for result in response.get_json()['todos']] == [
+        ('theirs', False), ('mine', True), ('missing', False)
+    ]
+
+
+def test_todos_read_through_the_cache(api, db):
+    db.collection('todos').document('mine').set(todo_document(0, 'alice@example.com'))
+    api.get('/todo/mine', headers=ALICE)
+    # Changed behind the cache's back, the cached copy is served
+    db.collection('todos').document('mine').update({'title': 'changed'})
+    response = api.post('/todo:batchGet', json={"ids": ['mine']}, headers=ALICE)
+    assert response.get_json()['todos'][0]['data']['title'] == todo_document(0)['title']
@@ -0,0 +1,104 @@
+# tests/test_change_feed.py
+
+# The service change feed: events, resuming by Last-Event-ID and subscribing again after a failure
+import json
+import time
+
+import pytest
+
+from benchmarks.samples import service_document
+from change_feed import ChangeFeed
+
+
+def wait_for(condition, timeout=5):
+    # Snapshot listeners deliver on their own thread
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def feed(db):
+    db.collection('service').document('existing').set(service_document(0))
+    feed = ChangeFeed(lambda: db.collection('service'), buffer_size=5)
+    feed.start()
+    yield feed
+    feed.close()
+
+
+def events(feed, after=0):
+    return [(event.type, event.doc_id) for event in feed.wait(after, timeout=1)]
+
+
+def test_first_snapshot_is_the_baseline(feed):
+    assert feed.current() == 0
+
+
+def test_changes_become_events(db, feed):
+    service = db.collection('service').document('s1')
+    service.set(service_document(1))
+    service.update({'channel': 'web'})
+    service.delete()
+    wait_for(lambda: feed.current() == 3)
+    assert events(feed) == [('added', 's1'), ('modified', 's1'), ('removed', 's1')]
+    assert feed.wait(0, timeout=1)[1].data['channel'] == 'web'
+    assert feed.wait(0, timeout=1)[2].data is None
+
+
+def test_resume_from(db, feed):
+    for i in range(7):
+        db.collection('service').document(f's{i}').set(service_document(i))
+    wait_for(lambda: feed.current() == 7)
+    # The buffer holds events 3 to 7
+    assert feed.resume_from(f'{feed.epoch}-7') == 7
+    assert feed.resume_from(f'{feed.epoch}-2') == 2
+    assert feed.resume_from(f'{feed.epoch}-1') is None
+    assert feed.resume_from(f'{feed.epoch}-8') is None
+    assert feed.resume_from('other-7') is None
+    assert feed.resume_from(None) is None
+
+
+def test_subscribes_again_after_the_stream_fails(db, feed):
+    failed = feed._watch
+    # The client giving up on the listen stream leaves the watch inactive
+    failed.unsubscribe()
+    wait_for(lambda: not failed.is_active)
+    db.collection('service').document('missed').set(service_document(1))
+
+    feed.ensure_listening()
+    assert feed._watch is not failed
+    wait_for(lambda: feed.current() == 1)
+    # What changed without a listener is unknown, streams are told to start over
+    assert events(feed) == [('reset', None)]
+
+    db.collection('service').document('s2').set(service_document(2))
+    wait_for(lambda: feed.current() == 2)
+    assert events(feed, after=1) == [('added', 's2')]
+
+
+def test_ensure_listening_keeps_an_active_watch(feed):
+    watch = feed._watch
+    feed.ensure_listening()
+    assert feed._watch is watch
+
+
+def test_stream_sends_a_reset_after_a_failure(db, feed):
+    stream = feed.stream(feed.current(), json.dumps, max_age=5, keepalive=0.05)
+    assert next(stream).startswith('retry:')
+    failed = feed._watch
+    failed.unsubscribe()
+    wait_for(lambda: not failed.is_active)
+    # The stream subscribes again before waiting for events
+    message = next(stream)
+    while message == ': keepalive\n\n':
+        message = next(stream)
+    assert f'id: {feed.epoch}-1\nevent: reset\n' in message
+    stream.close()
+
+
+def test_stream_without_last_event_id_starts_with_a_reset(feed):
+    stream = feed.stream(None, json.dumps, max_age=5, keepalive=0.05)
+    next(stream)
+    assert next(stream) == f'id: {feed.epoch}-0\nevent: reset\ndata: {{"type": "reset"}}\n\n'
+    stream.close()
@@ -0,0 +1,82 @@
+# tests/test_compression.py
+import gzip
+import json
+
+import brotli
+import pytest
+from flask import Flask, Response, jsonify
+
+from benchmarks.samples import service_document
+from compression import Compressor
+
+ALICE = {'Authorization': 'Bearer alice'}
+BIG = {"items": [{"n": i, "text": "repeated text " * 4} for i in range(100)]}
+
+
+@pytest.fixture
+def compressor():
+    return Compressor(min_size=1024)
+
+
+@pytest.fixture
+def client(compressor):
+    app = Flask(__name__)
+    compressor.init_app(app)
+
+    @app.route('/big')
+    def big():
+        response = jsonify(BIG)
+        response.set_etag('v1')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify({"ok": True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(item) + '\n' for item in BIG['items']), mimetype='application/json')
+
+    return app.test_client()
+
+
+def test_gzip(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.get_data())) == BIG
+
+
+def test_brotli_is_preferred(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.get_data())) == BIG
+
+
+def test_quality_values_are_honoured(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip;q=1, br;q=0.5'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('path, accept', [('/big', None), ('/big', 'identity'), ('/small', 'gzip'), ('/stream', 'gzip')])
+def test_sent_as_is(client, path, accept):
+    response = client.get(path, headers={'Accept-Encoding': accept} if accept else {})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compressed_body_gets_a_weak_etag_and_is_cached(client, compressor):
+    first = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['ETag'] == 'W/"v1"'
+    assert compressor.cache.get(('v1', 'gzip')) == first.get_data()
+    assert client.get('/big', headers={'Accept-Encoding': 'gzip'}).get_data() == first.get_data()
+
+
+def test_weak_etag_revalidates(api, db):
+    for i in range(20):
+        db.collection('service').document(f's{i:02d}').set(service_document(i))
+    headers = {**ALICE, 'Accept-Encoding': 'gzip'}
+    first = api.get('/services', headers=headers)
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert api.get('/services', headers={**headers, 'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,146 @@
+# tests/test_doc_cache.py
+
+# DocumentCache against the in-memory Firestore, including reads racing the API's own writes
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cache import CacheBackend, InMemoryBackend
+from doc_cache import DocumentCache
+from singleflight import SingleFlight
+
+
+class SlowReference:
+    """Wraps a document reference, get() reads the document and then waits until released."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.path = reference.path
+        self.read = threading.Event()
+        self.release = threading.Event()
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        snapshot = self.reference.get()
+        self.read.set()
+        assert self.release.wait(5)
+        return snapshot
+
+
+@pytest.fixture
+def todo(db):
+    reference = db.collection('todos').document('todo-1')
+    reference.set({"title": "v1"})
+    return reference
+
+
+def test_read_through(todo):
+    cache = DocumentCache(InMemoryBackend())
+    assert cache.get(todo).data == {"title": "v1"}
+    todo.set({"title": "v2"})
+    # Served from the cache until invalidated
+    assert cache.get(todo).data == {"title": "v1"}
+    cache.invalidate(todo)
+    assert cache.get(todo).data == {"title": "v2"}
+
+
+def test_missing_documents_are_cached(db):
+    cache = DocumentCache(InMemoryBackend())
+    reference = db.collection('todos').document('missing')
+    assert not cache.get(reference).exists
+    reference.set({"title": "new"})
+    assert not cache.get(reference).exists
+    cache.invalidate(reference)
+    assert cache.get(reference).exists
+
+
+def test_ttl(todo):
+    cache = DocumentCache(InMemoryBackend(), ttl=0.05)
+    cache.get(todo)
+    todo.set({"title": "v2"})
+    time.sleep(0.1)
+    assert cache.get(todo).data == {"title": "v2"}
+
+
+def test_read_started_before_invalidate_is_not_stored(todo):
+    # The read sees v1, the write of v2 and its invalidate land before the read returns
+    cache = DocumentCache(InMemoryBackend())
+    slow = SlowReference(todo)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stale = executor.submit(cache.get, slow)
+        assert slow.read.wait(5)
+        todo.set({"title": "v2"})
+        cache.invalidate(todo)
+        slow.release.set()
+        # The reader still gets what it read
+        assert stale.result().data == {"title": "v1"}
+    assert cache.get(todo).data == {"title": "v2"}
+
+
+def test_get_many_started_before_invalidate_is_not_stored(db, todo):
+    cache = DocumentCache(InMemoryBackend())
+    read = threading.Event()
+    release = threading.Event()
+
+    def slow_get_all(references):
+        snapshots = list(db.get_all(references))
+        read.set()
+        assert release.wait(5)
+        return snapshots
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stale = executor.submit(cache.get_many, [todo], slow_get_all)
+        assert read.wait(5)
+        todo.set({"title": "v2"})
+        cache.invalidate(todo)
+        release.set()
+        assert stale.result()[todo.path].data == {"title": "v1"}
+    assert cache.get(todo).data == {"title": "v2"}
+
+
+def test_get_many_mixes_hits_and_misses(db, todo):
+    cache = DocumentCache(InMemoryBackend())
+    cache.get(todo)
+    other = db.collection('todos').document('todo-2')
+    other.set({"title": "other"})
+    requested = []
+
+    def get_all(references):
+        requested.extend(reference.path for reference in references)
+        return db.get_all(references)
+
+    documents = cache.get_many([todo, other], get_all)
+    assert requested == [other.path]
+    assert {path: document.data for path, document in documents.items()} == {todo.path: {"title": "v1"}, other.path: {"title": "other"}}
+
+
+def test_concurrent_misses_share_a_read(todo):
+    cache = DocumentCache(InMemoryBackend(), flight=SingleFlight('test'))
+    slow = SlowReference(todo)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(cache.get, slow)]
+        assert slow.read.wait(5)
+        futures += [executor.submit(cache.get, slow) for _ in range(2)]
+        time.sleep(0.05)
+        slow.release.set()
+        assert [future.result().data for future in futures] == [{"title": "v1"}] * 3
+    assert slow.reads == 1
+
+
+def test_listener_keeps_documents_current(todo):
+    cache = DocumentCache(InMemoryBackend(), listen=True)
+    cache.get(todo)
+    todo.set({"title": "v2"})
+    deadline = time.monotonic() + 5
+    while cache.get(todo).data != {"title": "v2"}:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    cache.close()
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
@@ -0,0 +1,77 @@
+# tests/test_etags.py
+
+# ETags from version markers and update times, and 304 Not Modified
+from benchmarks.samples import service_document, todo_document
+from versions import CollectionVersions, owner_marker
+
+ALICE = {'Authorization': 'Bearer alice'}
+BOB = {'Authorization': 'Bearer bob'}
+
+
+def revalidate(api, path, etag, headers=ALICE):
+    return api.get(path, headers={**headers, 'If-None-Match': etag})
+
+
+def test_sharded_marker_sums_its_shards(db):
+    versions = CollectionVersions(lambda: db.collection('collection_versions'), shards={'service': 4}, get_all=db.get_all)
+    assert versions.get('service') == 0
+    for _ in range(10):
+        batch = db.batch()
+        versions.bump(batch, 'service')
+        batch.commit()
+    assert versions.get('service') == 10
+    assert len(list(db.collection('collection_versions').stream())) <= 4
+
+
+def test_todo_list(api, db):
+    db.collection('todos').document('todo-1').set(todo_document(1, 'alice@example.com'))
+    first = api.get('/todo', headers=ALICE)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert revalidate(api, '/todo', etag).status_code == 304
+    # Another query has its own ETag
+    assert revalidate(api, '/todo?isCompleted=true', etag).status_code == 200
+
+    # Another user's write leaves alice's marker alone
+    api.post('/todo', json={"title": "bob's"}, headers=BOB)
+    assert revalidate(api, '/todo', etag).status_code == 304
+
+    api.post('/todo', json={"title": "second"}, headers=ALICE)
+    changed = revalidate(api, '/todo', etag)
+    assert changed.status_code == 200
+    assert len(changed.get_json()['todos']) == 2
+    assert db.collection('collection_versions').document(owner_marker('todos', 'uid-alice')).get().exists
+
+
+def test_todo_list_after_patch_and_delete(api, db):
+    db.collection('todos').document('todo-1').set(todo_document(1, 'alice@example.com'))
+    etag = api.get('/todo', headers=ALICE).headers['ETag']
+    api.patch('/todo/todo-1', json={"isCompleted": True}, headers=ALICE)
+    etag_after_patch = revalidate(api, '/todo', etag).headers['ETag']
+    assert etag_after_patch != etag
+    api.delete('/todo/todo-1', headers=ALICE)
+    assert revalidate(api, '/todo', etag_after_patch).status_code == 200
+
+
+def test_service_pages(api, db):
+    for i in range(3):
+        db.collection('service').document(f's{i}').set(service_document(i))
+    etag = api.get('/services?limit=2', headers=ALICE).headers['ETag']
+    assert revalidate(api, '/services?limit=2', etag).status_code == 304
+    assert revalidate(api, '/services?limit=1', etag).status_code == 200
+
+    api.post('/create-service', json=service_document(3), headers=ALICE)
+    assert revalidate(api, '/services?limit=2', etag).status_code == 200
+
+
+def test_single_todo(api, db):
+    db.collection('todos').document('todo-1').set(todo_document(1, 'alice@example.com'))
+    etag = api.get('/todo/todo-1', headers=ALICE).headers['ETag']
+    not_modified = revalidate(api, '/todo/todo-1', etag)
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b''
+    # Weak comparison, a compressed copy of the body carries a weak ETag
+    assert revalidate(api, '/todo/todo-1', f'W/{etag}').status_code == 304
+
+    api.patch('/todo/todo-1', json={"title": "Renamed"}, headers=ALICE)
+    assert revalidate(api, '/todo/todo-1', etag).status_code == 200
@@ -0,0 +1,23 @@
+# tests/test_helpers.py
+import pytest
+
+from helpers import decode_page_token, encode_page_token
+
+
+def test_page_token_round_trip():
+    for doc_id in ('abc', 'service-00042', 'ünïcode/äëï'):
+        token = encode_page_token(doc_id)
+        assert '=' not in token
+        assert decode_page_token(token) == doc_id
+
+
+def test_empty_page_token():
+    assert decode_page_token(None) is None
+    assert decode_page_token('') is None
+
+
+# e30 is {}, eyJhZnRlciI6IDF9 is {"after": 1}
+@pytest.mark.parametrize('token', ['not base64!', 'e30', 'eyJhZnRlciI6IDF9', encode_page_token('')])
+def test_invalid_page_token(token):
+    with pytest.raises(ValueError):
+        decode_page_token(token)
@@ -0,0 +1,114 @@
+# tests/test_idempotency.py
+
+# IdempotencyStore against the in-memory Firestore stand-in
+import pytest
+
+from idempotency import IdempotencyKeyError, IdempotencyStore
+from standins.firestore import InMemoryFirestore
+
+SCOPE = ('uid-1', '/todo')
+
+
+@pytest.fixture
+def db():
+    return InMemoryFirestore()
+
+
+def make_store(db):
+    return IdempotencyStore(lambda: db.collection('idempotency_keys'))
+
+
+def create_todo(db, calls):
+    def handler(idempotent):
+        calls.append(idempotent)
+        batch = db.batch()
+        body = {"message": "Todo added successfully"}
+        idempotent.add_to_batch(batch, body, 200)
+        batch.set(db.collection('todos').document(), {"title": "a"})
+        idempotent.commit(batch)
+        return body, 200
+    return handler
+
+
+def todo_count(db):
+    return len(list(db.collection('todos').stream()))
+
+
+def test_first_request_runs(db):
+    calls = []
+    body, status, replayed = make_store(db).run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, calls))
+    assert (body, status, replayed) == ({"message": "Todo added successfully"}, 200, False)
+    assert len(calls) == 1
+    assert todo_count(db) == 1
+
+
+def test_retry_is_replayed(db):
+    calls = []
+    store = make_store(db)
+    store.run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, calls))
+    body, status, replayed = store.run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, calls))
+    assert (body, status, replayed) == ({"message": "Todo added successfully"}, 200, True)
+    assert len(calls) == 1
+    assert todo_count(db) == 1
+
+
+def test_retry_on_another_instance_is_replayed(db):
+    # A second store has an empty local cache, the batch's create() of the record fails instead
+    calls = []
+    make_store(db).run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, calls))
+    body, status, replayed = make_store(db).run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, calls))
+    assert (status, replayed) == (200, True)
+    assert todo_count(db) == 1
+
+
+def test_different_body_is_rejected(db):
+    store = make_store(db)
+    store.run(SCOPE, 'key-1', b'{"title": "a"}', create_todo(db, []))
+    with pytest.raises(IdempotencyKeyError) as error:
+        store.run(SCOPE, 'key-1', b'{"title": "b"}', create_todo(db, []))
+    assert error.value.status == 422
+    assert todo_count(db) == 1
+
+
+def test_keys_are_scoped(db):
+    store = make_store(db)
+    store.run(SCOPE, 'key-1', b'{}', create_todo(db, []))
+    _, _, replayed = store.run(('uid-2', '/todo'), 'key-1', b'{}', create_todo(db, []))
+    assert not replayed
+    assert todo_count(db) == 2
+
+
+def test_invalid_key(db):
+    with pytest.raises(IdempotencyKeyError) as error:
+        make_store(db).run(SCOPE, 'k' * 256, b'{}', create_todo(db, []))
+    assert error.value.status == 400
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'authenticate_user', lambda token: (True, {"localId": "uid-1", "email": "user@example.com"}))
+    monkeypatch.setattr(app, 'idempotency_store', make_store(db))
+    monkeypatch.setattr(app, 'USER_RATE_LIMIT', None)
+    return app.app.test_client()
+
+
+def test_post_todo_replay(client, db):
+    headers = {'Authorization': 'Bearer token', 'Idempotency-Key': 'key-1'}
+    first = client.post('/todo', json={"title": "a"}, headers=headers)
+    retry = client.post('/todo', json={"title": "a"}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert 'Idempotent-Replayed' not in first.headers
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert todo_count(db) == 1
+
+
+def test_post_todo_mismatched_body(client, db):
+    headers = {'Authorization': 'Bearer token', 'Idempotency-Key': 'key-1'}
+    client.post('/todo', json={"title": "a"}, headers=headers)
+    response = client.post('/todo', json={"title": "b"}, headers=headers)
+    assert response.status_code == 422
+    assert todo_count(db) == 1
@@ -0,0 +1,83 @@
+# tests/test_json_provider.py
+
+# FastJSONProvider writes the same JSON with orjson as with its stdlib fallback
+import datetime
+import decimal
+import json
+import uuid
+
+import pytest
+from flask import Flask
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore_v1 import Client, GeoPoint
+
+import json_provider
+from benchmarks.samples import service_document
+from json_provider import FastJSONProvider
+
+TIMESTAMP = DatetimeWithNanoseconds(2024, 3, 1, 10, 0, 0, nanosecond=123456789, tzinfo=datetime.timezone.utc)
+
+VALUES = [
+    service_document(1),
+    {"b": 1, "a": [1, 2.5, -3, True, False, None], "nested": {"z": {}, "y": []}},
+    {"text": "ünïcödé – emoji 🚀", "quote": "\"\\\n"},
+    {"when": TIMESTAMP, "where": GeoPoint(19.07, 72.87), "date": datetime.date(2024, 3, 1)},
+    {"id": uuid.UUID('12345678-1234-5678-1234-567812345678'), "price": decimal.Decimal('12.50')},
+    {"big": 2 ** 70, "small": -2 ** 70},
+    {1: "int key", 2: "another"},
+]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        yield app
+
+
+def encode(app, value):
+    return app.json.response(value).get_data(as_text=True)
+
+
+@pytest.fixture
+def stdlib(monkeypatch):
+    def encode_with_stdlib(app, value):
+        with monkeypatch.context() as patch:
+            patch.setattr(json_provider, 'orjson', None)
+            return encode(app, value)
+    return encode_with_stdlib
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_same_json_as_stdlib(app, stdlib, value):
+    assert json.loads(encode(app, value)) == json.loads(stdlib(app, value))
+
+
+def test_same_bytes_for_ascii_documents(app, stdlib):
+    value = service_document(2)
+    assert encode(app, value) == stdlib(app, value)
+
+
+def test_firestore_types(app):
+    # a real client, the stand-in's references aren't Firestore references
+    db = Client(project='test', credentials=AnonymousCredentials())
+    value = {"when": TIMESTAMP, "where": GeoPoint(19.07, 72.87), "ref": db.collection('service').document('s1')}
+    assert json.loads(encode(app, value)) == {
+        "when": "2024-03-01T10:00:00.123456789Z",
+        "where": {"latitude": 19.07, "longitude": 72.87},
+        "ref": "service/s1",
+    }
+
+
+def test_unknown_types_still_fail(app):
+    with pytest.raises(TypeError):
+        encode(app, {"value": object()})
+
+
+def test_loads(app):
+    text = json.dumps(VALUES[1])
+    assert app.json.loads(text) == json.loads(text)
+    # orjson rejects NaN, the stdlib parser has the final say
+    assert app.json.loads('{"n": NaN}')['n'] != 0
@@ -0,0 +1,56 @@
+# tests/test_metrics.py
+
+import metrics
+from benchmarks.samples import todo_document
+
+ALICE = {'Authorization': 'Bearer alice'}
+REMOTE = {'REMOTE_ADDR': '203.0.113.7'}
+
+
+def request_count(route, method='GET', status='200'):
+    state = metrics.REQUEST_DURATION._values.get((route, method, status))
+    return state[2] if state else 0
+
+
+def test_request_is_recorded(api):
+    before = request_count('/todo/<todo_id>', status='404')
+    api.get('/todo/missing', headers=ALICE)
+    assert request_count('/todo/<todo_id>', status='404') == before + 1
+
+
+def test_streamed_response_is_recorded_when_closed(api, db):
+    for i in range(3):
+        db.collection('todos').document(f'todo-{i}').set(todo_document(i, 'alice@example.com'))
+    in_flight = metrics.IN_FLIGHT.value()
+    before = request_count('/todo')
+
+    response = api.get('/todo?stream=1', headers=ALICE, buffered=False)
+    # Headers are out, the body is not, so the request is still being served
+    assert metrics.IN_FLIGHT.value() == in_flight + 1
+    assert request_count('/todo') == before
+    assert len(b''.join(response.response).splitlines()) == 3
+    response.close()
+
+    assert metrics.IN_FLIGHT.value() == in_flight
+    assert request_count('/todo') == before + 1
+
+
+def test_metrics_from_loopback(api):
+    response = api.get('/metrics')
+    assert response.status_code == 200
+    assert 'surefix_request_duration_seconds' in response.get_data(as_text=True)
+
+
+def test_metrics_from_remote_clients_is_forbidden(api):
+    assert api.get('/metrics', environ_base=REMOTE).status_code == 403
+
+
+def test_metrics_token():
+    from flask import Flask
+
+    app = Flask(__name__)
+    metrics.init_app(app, token='s3cret')
+    client = app.test_client()
+    assert client.get('/metrics', environ_base=REMOTE, headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/metrics', environ_base=REMOTE, headers={'Authorization': 'Bearer nope'}).status_code == 403
+    assert client.get('/metrics', environ_base=REMOTE, headers={'Authorization': 'Bearer ü'}).status_code == 403
@@ -0,0 +1,119 @@
+# tests/test_patch.py
+
+# PATCH /services/<service_id> and PATCH /todo/<todo_id>
+import pytest
+
+from benchmarks.samples import service_document, todo_document
+from helpers import FieldErrors, parse_patch
+from schemas import SERVICE_SCHEMA, TODO_SCHEMA
+
+ALICE = {'Authorization': 'Bearer alice'}
+BOB = {'Authorization': 'Bearer bob'}
+CITY = 'contact_details.pickup_address.city'
+
+
+def test_body_leaves_are_the_field_paths():
+    body = {"contact_details": {"pickup_address": {"city": "Pune"}}, "delivery_note": "Ring twice"}
+    assert parse_patch(body, SERVICE_SCHEMA) == ({CITY: "Pune", "delivery_note": "Ring twice"}, {})
+
+
+def test_update_mask_picks_from_the_body():
+    body = {"contact_details": {"pickup_address": {"city": "Pune", "state": "MH"}}, "delivery_note": "x"}
+    assert parse_patch(body, SERVICE_SCHEMA, CITY) == ({CITY: "Pune"}, {})
+    # A parent in the mask replaces the whole map
+    updates, _ = parse_patch(body, SERVICE_SCHEMA, 'contact_details.pickup_address')
+    assert updates == {'contact_details.pickup_address': {"city": "Pune", "state": "MH"}}
+
+
+def test_appends():
+    comment = {"timestamp": "2024-03-01 10:00:00", "user": "admin@surefix.in", "message": "Called"}
+    body = {"admin_comments": [comment]}
+    assert parse_patch(body, SERVICE_SCHEMA, append_fields=('admin_comments',)) == ({}, {"admin_comments": [comment]})
+
+
+@pytest.mark.parametrize('body, update_mask, message', [
+    ({}, None, 'Request body must be a non-empty JSON object'),
+    ([1], None, 'Request body must be a non-empty JSON object'),
+    ({"nope": 1}, None, 'Unknown field: nope'),
+    ({"title": "a"}, 'description', 'description is in update_mask but not in the body'),
+    ({"createdBy": "x"}, None, "createdBy can't be changed"),
+])
+def test_invalid_patches(body, update_mask, message):
+    with pytest.raises(ValueError) as error:
+        parse_patch(body, TODO_SCHEMA, update_mask, read_only=('createdAt', 'createdBy'))
+    assert str(error.value) == message
+
+
+def test_overlapping_paths():
+    with pytest.raises(ValueError) as error:
+        parse_patch({"contact_details": {"pickup_address": {"city": "Pune"}}}, SERVICE_SCHEMA, f'contact_details,{CITY}')
+    assert str(error.value) == 'contact_details overlaps another updated field'
+
+
+def test_dotted_keys_are_field_errors():
+    for body, update_mask in (({CITY: "Pune"}, None), ({CITY: "Pune"}, CITY), ({"contact_details": {"pickup_address.city": "Pune"}}, None)):
+        with pytest.raises(FieldErrors) as error:
+            parse_patch(body, SERVICE_SCHEMA, update_mask)
+        assert [e['path'] for e in error.value.errors] == [CITY]
+
+
+@pytest.fixture
+def todo(db):
+    db.collection('todos').document('todo-1').set(todo_document(1, 'alice@example.com'))
+    return db.collection('todos').document('todo-1')
+
+
+def test_patch_todo(api, todo):
+    response = api.patch('/todo/todo-1', json={"isCompleted": True, "title": "Renamed"}, headers=ALICE)
+    assert response.status_code == 200
+    assert response.get_json()['updated_fields'] == ['isCompleted', 'title', 'updatedAt']
+    data = todo.get().to_dict()
+    assert (data['isCompleted'], data['title'], data['description']) == (True, 'Renamed', 'Benchmark todo')
+
+
+def test_patch_todo_update_mask(api, todo):
+    response = api.patch('/todo/todo-1?update_mask=isCompleted', json={"isCompleted": True, "title": "Ignored"}, headers=ALICE)
+    assert response.status_code == 200
+    assert todo.get().to_dict()['title'] == 'Todo 1'
+
+
+def test_patch_todo_field_errors(api, todo):
+    response = api.patch('/todo/todo-1', json={"isCompleted": "yes", "title": ""}, headers=ALICE)
+    assert response.status_code == 400
+    assert [error['path'] for error in response.get_json()['errors']] == ['isCompleted', 'title']
+    assert todo.get().to_dict()['isCompleted'] is False
+
+
+def test_patch_todo_dotted_key(api, todo):
+    response = api.patch('/todo/todo-1', json={"a.b": 1}, headers=ALICE)
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['path'] == 'a.b'
+
+
+def test_patch_other_users_todo_is_not_found(api, todo):
+    assert api.patch('/todo/todo-1', json={"isCompleted": True}, headers=BOB).status_code == 404
+    assert todo.get().to_dict()['isCompleted'] is False
+    assert api.patch('/todo/missing', json={"isCompleted": True}, headers=ALICE).status_code == 404
+
+
+def test_patch_todo_invalidates_the_cache(api, todo):
+    api.get('/todo/todo-1', headers=ALICE)
+    api.patch('/todo/todo-1', json={"title": "Renamed"}, headers=ALICE)
+    assert api.get('/todo/todo-1', headers=ALICE).get_json()['title'] == 'Renamed'
+
+
+def test_patch_service(api, db):
+    db.collection('service').document('s0').set(service_document(0, comments=1))
+    comment = {"timestamp": "2024-03-02 10:00:00", "user": "admin@surefix.in", "message": "Picked up"}
+    body = {"contact_details": {"pickup_address": {"city": "Pune"}}, "admin_comments": [comment]}
+    response = api.patch('/services/s0', json=body, headers=ALICE)
+    assert response.status_code == 200
+    assert response.get_json()['updated_fields'] == ['admin_comments', CITY]
+    data = db.collection('service').document('s0').get().to_dict()
+    assert data['contact_details']['pickup_address']['city'] == 'Pune'
+    assert data['contact_details']['pickup_address']['pincode'] == service_document(0)['contact_details']['pickup_address']['pincode']
+    assert data['admin_comments'][-1] == comment and len(data['admin_comments']) == 2
+
+
+def test_patch_missing_service(api):
+    assert api.patch('/services/missing', json={"delivery_note": "x"}, headers=ALICE).status_code == 404
@@ -0,0 +1,84 @@
+# tests/test_pipeline.py
+
+# Pipeline and the signup route that runs on it
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import DeadlineExceeded, Pipeline
+from ratelimit import InMemoryBucketBackend
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def test_steps_run_side_by_side(executor):
+    pipeline = Pipeline(executor, deadline=5)
+    started = time.monotonic()
+    assert pipeline.run_all(lambda: time.sleep(0.2) or 'a', lambda: time.sleep(0.2) or 'b') == ['a', 'b']
+    assert time.monotonic() - started < 0.35
+
+
+def test_deadline_covers_every_step(executor):
+    pipeline = Pipeline(executor, deadline=0.3)
+    pipeline.run(lambda: time.sleep(0.2))
+    # 0.1 seconds are left for the second stage
+    with pytest.raises(DeadlineExceeded):
+        pipeline.run_all(lambda: None, lambda: time.sleep(0.3))
+
+
+def test_failure_is_raised_after_the_other_steps(executor):
+    finished = threading.Event()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    def slow():
+        time.sleep(0.1)
+        finished.set()
+
+    with pytest.raises(RuntimeError):
+        Pipeline(executor, deadline=5).run_all(fail, slow)
+    assert finished.is_set()
+
+
+class FakeAuth:
+    def __init__(self, profile_delay=0):
+        self.profile_delay = profile_delay
+
+    def create_user_with_email_and_password(self, email, password):
+        return {'localId': 'uid-new', 'idToken': 'token', 'email': email}
+
+    def update_profile(self, id_token, display_name, photo_url):
+        time.sleep(self.profile_delay)
+
+
+@pytest.fixture
+def signup(api, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app.auth_rate_limiter, 'backend', InMemoryBucketBackend())
+
+    def signup(auth, deadline=15):
+        monkeypatch.setattr(app, 'auth', auth)
+        monkeypatch.setattr(app, 'SIGNUP_DEADLINE', deadline)
+        body = {'email': 'new@example.com', 'password': 'secret123', 'displayName': 'New User'}
+        return api.post('/signup', json=body)
+    return signup
+
+
+def test_signup(signup, db):
+    response = signup(FakeAuth())
+    assert response.status_code == 201
+    assert db.collection('user').document('uid-new').get().to_dict()['email'] == 'new@example.com'
+
+
+def test_signup_deadline(signup):
+    response = signup(FakeAuth(profile_delay=0.5), deadline=0.2)
+    assert response.status_code == 504
+    assert response.get_json()['error'] == 'Signup Timed Out'
@@ -0,0 +1,85 @@
+# tests/test_ratelimit.py
+import pytest
+
+import ratelimit
+from ratelimit import BucketBackend, InMemoryBucketBackend, Limit, RateLimiter, parse_limit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def test_parse_limit():
+    limit = parse_limit('20/minute')
+    assert limit.capacity == 20
+    assert limit.rate == pytest.approx(20 / 60)
+    assert parse_limit('') is None
+    assert parse_limit('0') is None
+    with pytest.raises(ValueError):
+        parse_limit('5/fortnight')
+
+
+def test_bucket_empties_and_refills(clock):
+    backend = InMemoryBucketBackend()
+    limit = Limit(2, 60)
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'a'), limit) == pytest.approx(30)
+
+    # One token comes back every 30 seconds
+    clock.now += 30
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'a'), limit) > 0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    backend = InMemoryBucketBackend()
+    limit = Limit(2, 60)
+    backend.take(('user', 'a'), limit)
+    clock.now += 3600
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'a'), limit) > 0
+
+
+def test_keys_have_separate_buckets(clock):
+    backend = InMemoryBucketBackend()
+    limit = Limit(1, 60)
+    assert backend.take(('user', 'a'), limit) == 0
+    assert backend.take(('user', 'b'), limit) == 0
+    assert backend.take(('user', 'a'), limit) > 0
+
+
+def test_check_reports_whole_seconds(clock):
+    limiter = RateLimiter(InMemoryBucketBackend())
+    limit = Limit(1, 10)
+    assert limiter.check('user', ('a', '/todo'), limit, route='/todo') == 0
+    assert limiter.check('user', ('a', '/todo'), limit, route='/todo') == 10
+    assert limiter.check('user', ('a', '/todo'), None) == 0
+
+
+def test_failing_backend_lets_requests_through():
+    class Down(BucketBackend):
+        def take(self, key, limit, cost=1):
+            raise ConnectionError('redis is down')
+
+    assert RateLimiter(Down()).check('ip', ('127.0.0.1', '/login'), Limit(1, 60), route='/login') == 0
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class Incomplete(BucketBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,110 @@
+# tests/test_search.py
+
+# GET /services/search, its query parameters and the in-process text index
+import time
+
+import pytest
+
+from benchmarks.samples import service_document
+from helpers import parse_service_search
+from search_index import ServiceSearchIndex
+
+ALICE = {'Authorization': 'Bearer alice'}
+PINCODE = 'contact_details.pickup_address.pincode'
+PHONE = 'contact_details.contact_numbers.primary.number'
+
+
+def wait_for(condition, timeout=5):
+    # Snapshot listeners deliver on their own thread
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_parse_filters():
+    filters = parse_service_search({'sf_id': 'SF-1', 'phone': '90000-00000', 'pincode_min': '-5', 'pincode_max': '400100.5'})
+    assert ('sf_id', '==', 'SF-1') in filters
+    assert (PHONE, '==', 9000000000) in filters
+    # Only phone numbers lose their separators
+    assert (PINCODE, '>=', -5) in filters
+    assert (PINCODE, '<=', 400100.5) in filters
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e400', 'abc', '4000-01'])
+def test_invalid_numbers(value):
+    with pytest.raises(ValueError):
+        parse_service_search({'pincode': value})
+
+
+def test_invalid_number_is_400(api):
+    response = api.get('/services/search?pincode_min=nan', headers=ALICE)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'pincode_min must be a finite number'
+
+
+@pytest.fixture
+def index(db):
+    index = ServiceSearchIndex(lambda: db.collection('service'), ready_timeout=5)
+    yield index
+    index.close()
+
+
+def test_index_prefix_search(db, index):
+    for i, (first_name, message) in enumerate([('Ayesha', 'Drum does not spin'), ('Omar', 'Door will not spin'), ('Sara', 'Noisy drum')]):
+        service = service_document(i)
+        service['contact_details']['first_name'] = first_name
+        service['issue_message_from_customer'] = message
+        db.collection('service').document(f's{i}').set(service)
+    index.start()
+    assert index.search('spin', 10) == ['s0', 's1']
+    assert index.search('dru SPIN', 10) == ['s0']
+    assert index.search('oma', 10) == ['s1']
+    assert index.search('spin', 1) == ['s0']
+    assert index.search('nothing', 10) == []
+
+
+def test_index_filters_and_follows_writes(db, index):
+    for i in range(3):
+        db.collection('service').document(f's{i}').set(service_document(i))
+    index.start()
+    phone = service_document(1)['contact_details']['contact_numbers']['primary']['number']
+    assert index.search('drum', 10, lambda values: values['contact_details']['contact_numbers']['primary']['number'] == phone) == ['s1']
+
+    db.collection('service').document('s1').delete()
+    wait_for(lambda: len(index) == 2)
+    assert index.search('drum', 10) == ['s0', 's2']
+    # Only the words and the filter fields are kept
+    tokens, values = index._docs['s0']
+    assert set(values) == {'sf_id', 'contact_details', 'machine_details'}
+
+
+def test_index_resubscribes_after_the_watch_dies(db, index):
+    db.collection('service').document('s0').set(service_document(0))
+    index.start()
+    index._watch.unsubscribe()
+    wait_for(lambda: not index._watch.is_active)
+    db.collection('service').document('s0').delete()
+    db.collection('service').document('s1').set(service_document(1))
+
+    index.start()
+    wait_for(lambda: 's0' not in index._docs and 's1' in index._docs)
+    assert index.search('drum', 10) == ['s1']
+
+
+def test_search_route(api, db, index, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, 'service_search', index)
+    for i in range(3):
+        db.collection('service').document(f's{i}').set(service_document(i))
+    sf_id = service_document(2)['sf_id']
+
+    response = api.get(f'/services/search?q=drum&sf_id={sf_id}', headers=ALICE)
+    assert [service['id'] for service in response.get_json()['services']] == ['s2']
+    # The hits are read from Firestore, not from the index
+    assert response.get_json()['services'][0]['delivery_note'] == 'Call before delivery'
+
+    response = api.get(f'/services/search?sf_id={sf_id}', headers=ALICE)
+    assert [service['id'] for service in response.get_json()['services']] == ['s2']
+    assert api.get('/services/search', headers=ALICE).status_code == 400
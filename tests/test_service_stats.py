@@ -0,0 +1,77 @@
+# tests/test_service_stats.py
+
+# Counter deltas and GET /services/stats as services are created, updated and recounted
+from benchmarks.samples import service_document
+from service_stats import MISSING, ServiceStats
+
+ALICE = {'Authorization': 'Bearer alice'}
+
+
+def service(city='Pune', channel='web', self_logistics=False):
+    data = service_document(0)
+    data['contact_details']['pickup_address']['city'] = city
+    data['channel'] = channel
+    data['self_logistics'] = self_logistics
+    data['machine_details']['item_category'] = 'microwave'
+    return data
+
+
+def stats(db):
+    return ServiceStats(lambda: db.collection('service_stats'), shards=3)
+
+
+def test_deltas(db):
+    total, counts = stats(db).deltas(after=service())
+    assert total == 1
+    assert counts == {'channel': {'web': 1}, 'item_category': {'microwave': 1}, 'self_logistics': {'false': 1}, 'city': {'Pune': 1}}
+
+    total, counts = stats(db).deltas(before=service(), after=service(city='Delhi'))
+    assert total == 0
+    assert counts['city'] == {'Pune': -1, 'Delhi': 1}
+    assert counts['channel'] == {'web': 0}
+
+    total, counts = stats(db).deltas(before=service(city=''))
+    assert (total, counts['city']) == (-1, {MISSING: -1})
+
+
+def test_combine(db):
+    service_stats = stats(db)
+    total, counts = service_stats.combine(service_stats.deltas(after=service(city=city)) for city in ('Pune', 'Pune', 'Delhi'))
+    assert total == 3
+    assert counts['city'] == {'Pune': 2, 'Delhi': 1}
+
+
+def test_unchanged_counters_are_not_written(db):
+    service_stats = stats(db)
+    batch = db.batch()
+    assert not service_stats.add_to_batch(batch, service_stats.deltas(before=service(), after=service()))
+    assert service_stats.add_to_batch(batch, service_stats.deltas(after=service()))
+    batch.commit()
+    assert service_stats.read()['total'] == 1
+
+
+def test_stats_follow_service_writes(api, db):
+    assert api.post('/create-service', json=service(), headers=ALICE).status_code == 201
+    response = api.post('/services:batch', json={"services": [service(city='Delhi'), service(city='Delhi', channel='phone'), {}]}, headers=ALICE)
+    assert response.status_code == 207
+
+    result = api.get('/services/stats', headers=ALICE).get_json()
+    assert result['total'] == 3
+    assert result['city'] == {'Delhi': 2, 'Pune': 1}
+    assert result['channel'] == {'phone': 1, 'web': 2}
+
+    service_id = next(doc.id for doc in db.collection('service').stream() if doc.to_dict()['contact_details']['pickup_address']['city'] == 'Pune')
+    api.patch(f'/services/{service_id}', json={"contact_details": {"pickup_address": {"city": "Delhi"}}}, headers=ALICE)
+    api.patch(f'/services/{service_id}', json={"delivery_note": "Not counted"}, headers=ALICE)
+    result = api.get('/services/stats', headers=ALICE).get_json()
+    assert result['total'] == 3
+    # Pune dropped to zero and is left out
+    assert result['city'] == {'Delhi': 3}
+
+
+def test_rebuild(db):
+    for i, city in enumerate(('Pune', 'Delhi', 'Pune')):
+        db.collection('service').document(f's{i}').set(service(city=city))
+    service_stats = stats(db)
+    assert service_stats.rebuild(db) == 3
+    assert service_stats.read()['city'] == {'Delhi': 1, 'Pune': 2}
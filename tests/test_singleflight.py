@@ -0,0 +1,69 @@
+# tests/test_singleflight.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_together(flight, key, fn, n=5):
+    # The first call is the leader, the others arrive while it runs
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        leader = executor.submit(flight.do, key, fn)
+        time.sleep(0.05)
+        followers = [executor.submit(flight.do, key, fn) for _ in range(n - 1)]
+        return [leader, *followers]
+
+
+def slow(calls, result='page', delay=0.2):
+    def fn():
+        calls.append(threading.current_thread().name)
+        time.sleep(delay)
+        return result
+    return fn
+
+
+def test_concurrent_calls_share_one_read():
+    calls = []
+    futures = run_together(SingleFlight('test'), 'key', slow(calls))
+    assert [future.result() for future in futures] == ['page'] * 5
+    assert len(calls) == 1
+
+
+def test_error_is_shared():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError('boom')
+
+    for future in run_together(SingleFlight('test'), 'key', fail):
+        with pytest.raises(RuntimeError):
+            future.result()
+    assert len(calls) == 1
+
+
+def test_different_keys_and_later_calls_read_again():
+    flight = SingleFlight('test')
+    calls = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(flight.do, key, slow(calls, key)) for key in ('a', 'b')]
+        assert [future.result() for future in futures] == ['a', 'b']
+    assert flight.do('a', slow(calls, 'again', delay=0)) == 'again'
+    assert len(calls) == 3
+
+
+def test_forget_starts_a_new_read():
+    # A write while a read runs makes that read stale, calls after forget() don't join it
+    flight = SingleFlight('test')
+    calls = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stale = executor.submit(flight.do, 'key', slow(calls, 'before'))
+        time.sleep(0.05)
+        flight.forget('key')
+        fresh = executor.submit(flight.do, 'key', slow(calls, 'after'))
+        assert (stale.result(), fresh.result()) == ('before', 'after')
+    assert len(calls) == 2
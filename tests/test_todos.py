@@ -0,0 +1,58 @@
+# tests/test_todos.py
+
+# Single todo routes, a user only ever sees their own todos
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.samples import todo_document
+from standins.firestore import AsyncInMemoryFirestore
+
+ALICE = {'Authorization': 'Bearer alice'}
+BOB = {'Authorization': 'Bearer bob'}
+
+
+@pytest.fixture
+def todo_id(db):
+    db.collection('todos').document('todo-1').set(todo_document(1, 'alice@example.com'))
+    return 'todo-1'
+
+
+def test_get_own_todo(api, todo_id):
+    response = api.get(f'/todo/{todo_id}', headers=ALICE)
+    assert response.status_code == 200
+    assert response.get_json()['createdBy'] == 'alice@example.com'
+    assert response.headers['ETag']
+
+
+def test_get_other_users_todo_is_not_found(api, todo_id):
+    response = api.get(f'/todo/{todo_id}', headers=BOB)
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+    # Also with the ETag of the owner's copy
+    etag = api.get(f'/todo/{todo_id}', headers=ALICE).headers['ETag']
+    assert api.get(f'/todo/{todo_id}', headers={**BOB, 'If-None-Match': etag}).status_code == 404
+
+
+def test_get_missing_todo(api):
+    assert api.get('/todo/missing', headers=ALICE).status_code == 404
+
+
+def test_async_get_other_users_todo_is_not_found(api, db, todo_id, monkeypatch):
+    import asgi
+    from conftest import USERS
+
+    async def authenticate_async(token):
+        return True, USERS[token]
+
+    monkeypatch.setattr(asgi, 'db', AsyncInMemoryFirestore(store=db._store))
+    monkeypatch.setattr(asgi.token_verifier, 'authenticate_async', authenticate_async)
+
+    async def get(headers):
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.get(f'/todo/{todo_id}', headers=headers)
+
+    assert asyncio.run(get(ALICE)).status_code == 200
+    assert asyncio.run(get(BOB)).status_code == 404
@@ -0,0 +1,97 @@
+# tests/test_token_verifier.py
+
+# TokenVerifier against the local key server and token issuer stand-ins
+import pytest
+
+from standins.keyserver import KeyServer, TokenIssuer
+from token_verifier import TokenVerifier
+
+PROJECT_ID = 'surefix-test'
+
+
+@pytest.fixture
+def issuer():
+    return TokenIssuer(PROJECT_ID)
+
+
+@pytest.fixture
+def key_server(issuer):
+    with KeyServer(issuer) as server:
+        yield server
+
+
+def make_verifier(key_server, min_refresh_interval=0):
+    verifier = TokenVerifier(
+        project_id=PROJECT_ID,
+        account_lookup=lambda token: {"localId": "uid-1", "email": "user@example.com", "disabled": False},
+        certs_url=key_server.url
+    )
+    verifier.keys.min_refresh_interval = min_refresh_interval
+    return verifier
+
+
+def test_valid_token(issuer, key_server):
+    authenticated, user = make_verifier(key_server).authenticate(issuer.mint('uid-1', 'user@example.com'))
+    assert authenticated
+    assert user["localId"] == 'uid-1'
+
+
+def test_verified_token_is_cached(issuer, key_server):
+    verifier = make_verifier(key_server)
+    token = issuer.mint('uid-1')
+    verifier.verify(token)
+    verifier.verify(token)
+    assert key_server.requests == 1
+
+
+def test_expired_token(issuer, key_server):
+    authenticated, message = make_verifier(key_server).authenticate(issuer.mint('uid-1', expires_in=-3600))
+    assert not authenticated
+    assert 'expired' in message.lower()
+
+
+def test_wrong_audience(issuer, key_server):
+    authenticated, _ = make_verifier(key_server).authenticate(issuer.mint('uid-1', aud='another-project'))
+    assert not authenticated
+
+
+def test_wrong_issuer(issuer, key_server):
+    token = issuer.mint('uid-1', iss='https://securetoken.google.com/another-project')
+    assert make_verifier(key_server).authenticate(token) == (False, 'Invalid token issuer')
+
+
+def test_missing_subject(issuer, key_server):
+    assert make_verifier(key_server).authenticate(issuer.mint('uid-1', sub='')) == (False, 'Token has no subject')
+
+
+def test_key_not_served(key_server):
+    forged = TokenIssuer(PROJECT_ID).mint('uid-1')
+    assert make_verifier(key_server).authenticate(forged) == (False, 'Token was signed by an unknown key')
+
+
+def test_unknown_kid_refetches_after_rotation(issuer, key_server):
+    verifier = make_verifier(key_server)
+    assert verifier.authenticate(issuer.mint('uid-1'))[0]
+    issuer.rotate()
+    assert verifier.authenticate(issuer.mint('uid-1'))[0]
+    assert key_server.requests == 2
+
+
+def test_unknown_kid_refetch_is_rate_limited(issuer, key_server):
+    verifier = make_verifier(key_server, min_refresh_interval=3600)
+    assert verifier.authenticate(issuer.mint('uid-1'))[0]
+    issuer.rotate()
+    assert verifier.authenticate(issuer.mint('uid-1')) == (False, 'Token was signed by an unknown key')
+    assert key_server.requests == 1
+
+
+def test_disabled_user(issuer, key_server):
+    verifier = make_verifier(key_server)
+    verifier.account_lookup = lambda token: {"localId": "uid-1", "disabled": True}
+    assert verifier.authenticate(issuer.mint('uid-1')) == (False, 'User is disabled')
+
+
+def test_malformed_token(key_server):
+    authenticated, message = make_verifier(key_server).authenticate('not-a-jwt')
+    assert not authenticated
+    assert message.startswith('Malformed token')
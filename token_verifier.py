@@ -0,0 +1,165 @@
+# token_verifier.py
+
+# Local verification of Firebase ID tokens against Google's rotated signing keys.
+# Verified tokens and account records are cached so protected routes don't have
+# to make an Identity Toolkit round trip on every request.
+import asyncio
+import hashlib
+import re
+import threading
+import time
+
+import requests
+from google.auth import exceptions as google_auth_exceptions
+from google.auth import jwt
+
+from cache import TTLCache
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class PublicKeyCache:
+    """Caches the x509 signing certificates, honouring the server's Cache-Control max-age."""
+
+    def __init__(self, certs_url=GOOGLE_CERTS_URL, session=None, timeout=5, default_max_age=3600, min_refresh_interval=30):
+        self.certs_url = certs_url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self._certs = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        response = self.session.get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        now = time.monotonic()
+        self._certs = response.json()
+        self._fetched_at = now
+        self._expires_at = now + max_age
+
+    def get_certs(self, kid=None):
+        certs = self._certs
+        now = time.monotonic()
+        if now < self._expires_at and (kid is None or kid in certs):
+            return certs
+        with self._lock:
+            now = time.monotonic()
+            expired = now >= self._expires_at
+            # An unknown kid usually means the keys were rotated early, refetch but not in a tight loop
+            unknown_kid = kid is not None and kid not in self._certs
+            if expired or (unknown_kid and now - self._fetched_at >= self.min_refresh_interval):
+                self._fetch()
+            return self._certs
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens locally and keeps bounded caches of the results.
+
+    ``account_lookup`` is called with the raw token to fetch the account record
+    (it is what tells us whether the user is disabled). Its result is reused for
+    ``disabled_staleness`` seconds per user. ``async_account_lookup`` is the
+    coroutine equivalent used by ``authenticate_async``.
+    """
+
+    def __init__(self, project_id, account_lookup=None, certs_url=GOOGLE_CERTS_URL, session=None,
+                 cache_size=10000, disabled_staleness=300, clock_skew=5, async_account_lookup=None):
+        self.project_id = project_id
+        self.issuer = ISSUER_PREFIX + project_id
+        self.account_lookup = account_lookup
+        self.async_account_lookup = async_account_lookup
+        self.disabled_staleness = disabled_staleness
+        self.clock_skew = clock_skew
+        self.keys = PublicKeyCache(certs_url, session=session)
+        self._tokens = TTLCache(maxsize=cache_size)
+        self._accounts = TTLCache(maxsize=cache_size, ttl=disabled_staleness)
+
+    @staticmethod
+    def _token_key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def verify(self, token):
+        key = self._token_key(token)
+        claims = self._tokens.get(key)
+        if claims is not None:
+            return claims
+
+        try:
+            header = jwt.decode_header(token)
+        except (ValueError, TypeError) as e:
+            raise InvalidTokenError(f'Malformed token: {e}')
+        if header.get('alg') != 'RS256':
+            raise InvalidTokenError('Invalid token algorithm')
+        kid = header.get('kid')
+        if not kid:
+            raise InvalidTokenError('Token has no "kid" claim')
+
+        certs = self.keys.get_certs(kid)
+        if kid not in certs:
+            raise InvalidTokenError('Token was signed by an unknown key')
+        try:
+            claims = jwt.decode(token, certs=certs, audience=self.project_id,
+                                clock_skew_in_seconds=self.clock_skew)
+        except (ValueError, google_auth_exceptions.GoogleAuthError) as e:
+            raise InvalidTokenError(str(e))
+
+        if claims.get('iss') != self.issuer:
+            raise InvalidTokenError('Invalid token issuer')
+        if not isinstance(claims.get('sub'), str) or not claims['sub']:
+            raise InvalidTokenError('Token has no subject')
+
+        # Never keep a token around past its own expiry
+        self._tokens.set(key, claims, ttl=claims['exp'] - time.time())
+        return claims
+
+    def get_account(self, token, claims):
+        uid = claims['sub']
+        account = self._accounts.get(uid)
+        if account is None:
+            account = self.account_lookup(token)
+            if not account:
+                raise InvalidTokenError('Invalid token')
+            self._accounts.set(uid, account)
+        return account
+
+    def invalidate(self, uid):
+        self._accounts.pop(uid)
+
+    def authenticate(self, token):
+        try:
+            claims = self.verify(token)
+            user = self.get_account(token, claims)
+        except Exception as e:
+            return False, str(e)
+        if user.get("disabled"):
+            return False, "User is disabled"
+        return True, user
+
+    async def authenticate_async(self, token):
+        try:
+            claims = self._tokens.get(self._token_key(token))
+            if claims is None:
+                # A cache miss may have to refetch the signing keys, keep that off the event loop
+                claims = await asyncio.to_thread(self.verify, token)
+            user = self._accounts.get(claims['sub'])
+            if user is None:
+                user = await self.async_account_lookup(token)
+                if not user:
+                    raise InvalidTokenError('Invalid token')
+                self._accounts.set(claims['sub'], user)
+        except Exception as e:
+            return False, str(e)
+        if user.get("disabled"):
+            return False, "User is disabled"
+        return True, user
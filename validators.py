@@ -0,0 +1,95 @@
+# validators.py
+
+# JSON Schema validators are compiled once and reused, jsonschema.validate() would re-check the
+# meta-schema and build a new validator on every call.
+import threading
+
+from jsonschema.validators import validator_for
+
+from helpers import resolve_schema_path
+from schemas import TODO_SCHEMA, SIGNUP_SCHEMA, SERVICE_SCHEMA
+
+_validators = {}
+_lock = threading.Lock()
+
+
+def compile_schema(schema):
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema, format_checker=cls.FORMAT_CHECKER)
+
+
+def get_validator(schema):
+    # Memoized by identity, the schema is stored alongside so its id can't be reused
+    entry = _validators.get(id(schema))
+    if entry is None:
+        with _lock:
+            entry = _validators.get(id(schema))
+            if entry is None:
+                entry = (schema, compile_schema(schema))
+                _validators[id(schema)] = entry
+    return entry[1]
+
+
+def validation_errors(validator, instance):
+    # Every error in the instance, not only the first one validate() would raise
+    errors = sorted(validator.iter_errors(instance), key=lambda e: list(map(str, e.absolute_path)))
+    return [
+        {
+            "path": ".".join(str(part) for part in error.absolute_path),
+            "message": error.message,
+        }
+        for error in errors
+    ]
+
+
+def field_errors(schema, field_values):
+    # PATCH validates each changed value against the part of the schema at its field path only
+    errors = []
+    for field_path, value in field_values.items():
+        validator = get_validator(resolve_schema_path(schema, field_path))
+        for error in validation_errors(validator, value):
+            path = f"{field_path}.{error['path']}" if error['path'] else field_path
+            errors.append({"path": path, "message": error["message"]})
+    return errors
+
+
+TODO_VALIDATOR = get_validator(TODO_SCHEMA)
+SIGNUP_VALIDATOR = get_validator(SIGNUP_SCHEMA)
+SERVICE_VALIDATOR = get_validator(SERVICE_SCHEMA)
+
+
+# The 400 bodies of the create routes, shared by app.py and asgi.py, None when the request is valid
+def signup_error_body(data):
+    # Null values are treated as missing so they are reported as required properties
+    errors = validation_errors(SIGNUP_VALIDATOR, {k: v for k, v in data.items() if v is not None})
+    if not errors:
+        return None
+    return {
+        'message': 'Invalid request body',
+        'errors': errors,
+        "RequiredPropertiesForSignUp": SIGNUP_SCHEMA.get('required')
+    }
+
+
+def service_error_body(service_body):
+    errors = validation_errors(SERVICE_VALIDATOR, service_body)
+    if not errors:
+        return None
+    return {
+        "message": 'Invalid request body',
+        "errors": errors,
+        "RequiredSchema": SERVICE_SCHEMA,
+        "status": 400
+    }
+
+
+def todo_error_body(todo_body):
+    errors = validation_errors(TODO_VALIDATOR, todo_body)
+    if not errors:
+        return None
+    return {
+        "message": 'Invalid request body',
+        "errors": errors,
+        "RequiredSchema": TODO_SCHEMA
+    }